@@ -1,14 +1,31 @@
+import io
 import os
-import subprocess
+import sys
 import shutil
+import time
 import tempfile
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
-from zipfile import ZipFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_file
+from ocr_common.metrics import instrument_flask, register_callback, stage, timed_iter
+from worker_pool import get_worker_pool, count_pages, pool_queue_depth, worker_rss, DEFAULT_TEXT_LAYER
+from streaming import (STREAM_FORMATS, MEDIA_TYPES, STREAM_HEADERS, ZIP_HEADERS, pages_cache_key, iter_zip,
+                       tee_to_cache, cache_zip, parse_page_range, select_pages, format_event, start_event,
+                       done_event, page_event, iter_page_events, cancel_pending)
 
 app = Flask(__name__)
 
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10 MB
+# Prometheus metrics on /metrics, including the worker queue and worker memory
+instrument_flask(app, 'deepdoc')
+register_callback('ocr_queue_depth', 'Work waiting for or running on a worker', pool_queue_depth, label_names=('queue',))
+register_callback('deepdoc_worker_resident_memory_bytes', 'Resident set size of each DeepDoc worker', worker_rss,
+                  label_names=('worker',))
+
+# Werkzeug spools uploads to disk in chunks, so large PDFs never sit in memory
+MAX_UPLOAD_MB = int(os.environ.get('DEEPDOC_MAX_UPLOAD_MB', '1024'))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 ALLOWED_EXTENSIONS = {'pdf'}
 
@@ -16,56 +33,175 @@ ALLOWED_EXTENSIONS = {'pdf'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Function to save the uploaded PDF into a fresh temporary directory;
+# returns (temp_dir, filename, path, error_response)
+def save_upload():
+    if 'file' not in request.files:
+        return None, None, None, (jsonify({"error": "No file part"}), 400)
+    file = request.files['file']
+    if file.filename == '':
+        return None, None, None, (jsonify({"error": "No selected file"}), 400)
+    if not allowed_file(file.filename):
+        return None, None, None, (jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400)
+    filename = secure_filename(file.filename)
+    temp_dir = tempfile.mkdtemp()
+    input_file_path = os.path.join(temp_dir, filename)
+    with stage('save_upload'):
+        file.save(input_file_path)
+    return temp_dir, filename, input_file_path, None
+
+# Function to read the optional 1-based 'pages' selection, e.g. 1-3,7
+def requested_pages():
+    # The multipart body is read and spooled on first access to request.form
+    with stage('upload'):
+        form = request.form
+    return parse_page_range(request.args.get('pages', form.get('pages')))
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"File too large, the limit is {MAX_UPLOAD_MB} MB"}), 413
+
 @app.route('/process-pdf/', methods=['POST', 'GET'])
 def process_pdf():
     if request.method == 'GET':
         return 'GET method'
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    file = request.files['file']
+    try:
+        page_indices = requested_pages()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    temp_dir, filename, input_file_path, error = save_upload()
+    if error is not None:
+        return error
+    streaming = False
+
+    try:
+        # Repeat uploads are answered from the result cache; output names
+        # inside the zip depend on the input file name, so it is part of the key
+        cache = get_result_cache()
+        with stage('hash'):
+            content_digest = digest_file(input_file_path)
+        cache_key = make_key('deepdoc', content_digest, script='t_ocr', text_layer=DEFAULT_TEXT_LAYER,
+                             filename=filename, pages=page_indices)
+        cached_zip = cache.get(cache_key)
+        if cached_zip is not None:
+            return send_file(io.BytesIO(cached_zip), as_attachment=True, download_name='recognized_content.zip')
 
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
+        try:
+            with stage('count_pages'):
+                document_pages = count_pages(input_file_path)
+            page_indices = select_pages(page_indices, document_pages)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        output_folder = os.path.join(temp_dir, 'recognized_content')
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Fan the pages out over the warm workers and wait for all of them
+        futures = get_worker_pool().run_pages(input_file_path, output_folder, page_indices)
+        events = [page_event(page_index, future, len(futures)) for page_index, future in zip(page_indices, futures)]
+        errors = [event for event in events if event['event'] == 'error']
+        if errors:
+            return jsonify({"error": f"Script error on page {errors[0]['page'] + 1}: {errors[0]['error']}"}), 500
+        cache.put(pages_cache_key(cache_key), events)
+
+        # Zip straight into the response instead of building the archive first
+        chunks = tee_to_cache(timed_iter('zip', iter_zip(output_folder, events)), cache, cache_key)
+        response = Response(stream_with_context(chunks), mimetype='application/zip', headers=ZIP_HEADERS)
+        response.call_on_close(lambda: shutil.rmtree(temp_dir, ignore_errors=True))
+        streaming = True
+        return response
+
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    finally:
+        if not streaming:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# Endpoint to stream per-page results as pages finish, as NDJSON or
+# server-sent events (?format=sse). When every page succeeds the zip is cached,
+# so /process-pdf/ with the same file returns the aggregate immediately.
+@app.route('/process-pdf/stream', methods=['POST'])
+def process_pdf_stream():
+    fmt = request.args.get('format', request.form.get('format', 'ndjson'))
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(STREAM_FORMATS)}"}), 400
+    try:
+        page_indices = requested_pages()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    temp_dir, filename, input_file_path, error = save_upload()
+    if error is not None:
+        return error
+
+    cache = get_result_cache()
+    with stage('hash'):
+        content_digest = digest_file(input_file_path)
+    cache_key = make_key('deepdoc', content_digest, script='t_ocr', text_layer=DEFAULT_TEXT_LAYER,
+                         filename=filename, pages=page_indices)
+    cached_events = cache.get(pages_cache_key(cache_key))
+    document_pages = None
+    if cached_events is None:
+        try:
+            with stage('count_pages'):
+                document_pages = count_pages(input_file_path)
+            page_indices = select_pages(page_indices, document_pages)
+        except Exception as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return jsonify({"error": f"Could not read PDF: {str(e)}"}), 400
 
-    if file and allowed_file(file.filename):
+    def generate():
+        started = time.time()
+        futures = []
         try:
-            filename = secure_filename(file.filename)
-            temp_dir = tempfile.mkdtemp()
-            input_file_path = os.path.join(temp_dir, filename)
-            file.save(input_file_path)
+            if cached_events is not None:
+                yield format_event(start_event(len(cached_events)), fmt)
+                for event in cached_events:
+                    yield format_event(event, fmt)
+                yield format_event(done_event(len(cached_events), [], started), fmt)
+                return
 
             output_folder = os.path.join(temp_dir, 'recognized_content')
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-
-            result = subprocess.run(
-                ['python', 'ragflow/deepdoc/vision/t_ocr.py', '--inputs', input_file_path, '--output_dir', output_folder],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            os.makedirs(output_folder, exist_ok=True)
+            pages = len(page_indices)
+            yield format_event(start_event(pages, document_pages), fmt)
+            futures = get_worker_pool().run_pages(input_file_path, output_folder, page_indices)
+            events, failed = [], []
+            for event in iter_page_events(futures, pages, page_indices):
+                events.append(event)
+                if event['event'] == 'error':
+                    failed.append(event['page'])
+                yield format_event(event, fmt)
+
+            if not failed:
+                cache_zip(cache, cache_key, output_folder, events)
+                cache.put(pages_cache_key(cache_key), sorted(events, key=lambda event: event['page']))
+            yield format_event(done_event(pages, failed, started), fmt)
 
-            if result.returncode != 0:
-                return jsonify({"error": f"Script error: {result.stderr}"}), 500
-
-            zip_file_path = os.path.join(temp_dir, 'recognized_content.zip')
-            with ZipFile(zip_file_path, 'w') as zip_file:
-                for foldername, subfolders, filenames in os.walk(output_folder):
-                    for filename in filenames:
-                        file_path = os.path.join(foldername, filename)
-                        zip_file.write(file_path, os.path.relpath(file_path, output_folder))
+        finally:
+            # Pages not yet on a worker when the client disconnects are dropped
+            cancel_pending(futures)
 
-            return send_file(zip_file_path, as_attachment=True, download_name='recognized_content.zip')
+    response = Response(stream_with_context(generate()), mimetype=MEDIA_TYPES[fmt], headers=STREAM_HEADERS)
+    # The temporary directory lives until the response is closed, even if it was never read
+    response.call_on_close(lambda: shutil.rmtree(temp_dir, ignore_errors=True))
+    return response
 
-        except Exception as e:
-            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-        finally:
-            shutil.rmtree(temp_dir)
+# Endpoint to report result cache hit/miss counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats())
 
-    else:
-        return jsonify({"error": "Invalid file type. Only PDF files are allowed."}), 400
+# Endpoint to report whether a DeepDoc worker has its models loaded
+@app.route('/ready', methods=['GET'])
+def ready():
+    pool = get_worker_pool()
+    return jsonify(pool.status()), 200 if pool.is_ready() else 503
 
 
 if __name__ == '__main__':
+    # Start loading models before the first request arrives
+    get_worker_pool()
     app.run(host='0.0.0.0', port=8000, debug=False)
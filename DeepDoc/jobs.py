@@ -0,0 +1,312 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache
+from worker_pool import get_worker_pool, count_pages
+from streaming import CACHE_ZIP_MAX_BYTES, write_zip, parse_page_range, select_pages, page_event, cancel_pending
+
+# Queued DeepDoc jobs. Uploads are written to a per-job directory and tracked
+# in SQLite, so jobs survive a restart; a dispatcher runs at most
+# DEEPDOC_MAX_ACTIVE_JOBS at a time, each fanning its pages out over the
+# worker pool. Finished jobs and their files are removed after DEEPDOC_JOB_TTL.
+#   DEEPDOC_JOB_DIR          job directories and the jobs.sqlite3 database
+#   DEEPDOC_MAX_ACTIVE_JOBS  documents processed at the same time
+#   DEEPDOC_JOB_TTL          seconds a finished job and its result are kept
+JOB_DIR = os.environ.get('DEEPDOC_JOB_DIR', os.path.expanduser('~/.cache/deepdoc_jobs'))
+MAX_ACTIVE_JOBS = int(os.environ.get('DEEPDOC_MAX_ACTIVE_JOBS', '2'))
+JOB_TTL_SECONDS = int(os.environ.get('DEEPDOC_JOB_TTL', str(24 * 3600)))
+EXPIRE_INTERVAL_SECONDS = 60
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+INPUT_NAME = 'document.pdf'
+RESULT_NAME = 'recognized_content.zip'
+COLUMNS = ('id', 'status', 'filename', 'cache_key', 'page_range', 'pages', 'pages_done', 'error', 'created', 'started',
+           'finished')
+
+
+# Function to tell whether a process id belongs to a live process
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# SQLite-backed job records and their work directories
+class JobStore:
+    def __init__(self, root=JOB_DIR, ttl_seconds=JOB_TTL_SECONDS):
+        self.root = root
+        self.path = os.path.join(root, 'jobs.sqlite3')
+        self.ttl = ttl_seconds
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+
+    # SQLite connections must not cross a fork, each process opens its own
+    def _db(self):
+        if self.connection is None or self.pid != os.getpid():
+            os.makedirs(self.root, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, cache_key TEXT, page_range TEXT, pages INTEGER, '
+                'pages_done INTEGER NOT NULL DEFAULT 0, error TEXT, '
+                'created REAL NOT NULL, started REAL, finished REAL, owner INTEGER)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)')
+            # Databases created before page ranges and owners were recorded lack the columns
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(jobs)')]
+            if 'page_range' not in columns:
+                self.connection.execute('ALTER TABLE jobs ADD COLUMN page_range TEXT')
+            if 'owner' not in columns:
+                self.connection.execute('ALTER TABLE jobs ADD COLUMN owner INTEGER')
+            self.pid = os.getpid()
+        return self.connection
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def input_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), INPUT_NAME)
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), RESULT_NAME)
+
+    def _to_job(self, row):
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job['expires'] = job['finished'] + self.ttl if job['finished'] else None
+        return job
+
+    # Function to move an uploaded file into a new job and queue it; a cached
+    # result makes the job finished at once
+    def create(self, filename, input_file, cache_key=None, result=None, page_range=None):
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        now = time.time()
+        if result is None:
+            shutil.move(input_file, self.input_path(job_id))
+            status, finished = 'queued', None
+        else:
+            with open(self.result_path(job_id), 'wb') as f:
+                f.write(result)
+            status, finished = 'done', now
+        with self.lock:
+            db = self._db()
+            db.execute('INSERT INTO jobs (id, status, filename, cache_key, page_range, created, finished) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)', (job_id, status, filename, cache_key, page_range, now, finished))
+            db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self.lock:
+            row = self._db().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row)
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.lock:
+            db = self._db()
+            db.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', list(fields.values()) + [job_id])
+            db.commit()
+
+    # Function to move the oldest queued job to running, owned by this
+    # process, or return None. Another API process sharing the database may
+    # claim the same row first, then the next one is tried.
+    def claim_next(self):
+        with self.lock:
+            db = self._db()
+            while True:
+                row = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                claimed = db.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, owner = ? WHERE id = ? AND status = 'queued'",
+                    (time.time(), os.getpid(), row[0])).rowcount
+                db.commit()
+                if claimed == 1:
+                    break
+        return self.get(row[0])
+
+    # Function to mark a job finished, unless it was cancelled meanwhile
+    def finish(self, job_id, status, error=None):
+        with self.lock:
+            db = self._db()
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status = 'running'",
+                       (status, error, time.time(), job_id))
+            db.commit()
+
+    # Function to cancel a queued or running job; returns the job, or None if unknown
+    def cancel(self, job_id):
+        with self.lock:
+            db = self._db()
+            db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                       (time.time(), job_id))
+            db.commit()
+        return self.get(job_id)
+
+    # Jobs whose owning process is gone start over; those another live
+    # process is running are left alone. This process has just started, so
+    # a job recorded under its own pid belonged to an earlier process.
+    def requeue_running(self):
+        with self.lock:
+            db = self._db()
+            rows = db.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall()
+            orphaned = [(job_id, owner) for job_id, owner in rows
+                        if owner is None or owner == os.getpid() or not pid_alive(owner)]
+            db.executemany("UPDATE jobs SET status = 'queued', pages_done = 0, started = NULL, owner = NULL "
+                           "WHERE id = ? AND status = 'running' AND owner IS ?", orphaned)
+            db.commit()
+        return len(orphaned)
+
+    # Function to delete finished jobs older than the TTL with their files
+    def expire(self, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        with self.lock:
+            db = self._db()
+            expired = [row[0] for row in db.execute(
+                f"SELECT id FROM jobs WHERE status IN {FINISHED_STATES} AND finished < ?", (cutoff,))]
+            db.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in expired])
+            db.commit()
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return len(expired)
+
+    def counts(self):
+        with self.lock:
+            rows = self._db().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+
+# Dispatcher that runs queued jobs with bounded concurrency
+class JobRunner:
+    def __init__(self, store, max_active=MAX_ACTIVE_JOBS, cache=None):
+        self.store = store
+        self.max_active = max(1, max_active)
+        self.cache = cache
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return self
+            self.store.requeue_running()
+            self.thread = threading.Thread(target=self._dispatch, daemon=True)
+            self.thread.start()
+        return self
+
+    # Function to queue an uploaded file, answering it from the result cache when possible
+    def submit(self, filename, input_file, cache_key=None, page_range=None):
+        cached = self.cache.get(cache_key) if self.cache is not None and cache_key else None
+        job = self.store.create(filename, input_file, cache_key, result=cached, page_range=page_range)
+        if job['status'] == 'queued':
+            self.wakeup.set()
+        return job
+
+    def cancel(self, job_id):
+        job = self.store.cancel(job_id)
+        with self.lock:
+            futures = self.active.get(job_id, [])
+        cancel_pending(futures)
+        return job
+
+    def _dispatch(self):
+        last_expired = 0
+        while True:
+            if time.time() - last_expired > EXPIRE_INTERVAL_SECONDS:
+                self.store.expire()
+                last_expired = time.time()
+            # Cleared before claiming so a submit during the scan is not missed
+            self.wakeup.clear()
+            while True:
+                with self.lock:
+                    if len(self.active) >= self.max_active:
+                        break
+                    job = self.store.claim_next()
+                    if job is None:
+                        break
+                    self.active[job['id']] = []
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+            self.wakeup.wait(timeout=5)
+
+    def _run(self, job):
+        job_id = job['id']
+        input_path = self.store.input_path(job_id)
+        output_folder = os.path.join(self.store.job_dir(job_id), 'recognized_content')
+        try:
+            page_indices = select_pages(parse_page_range(job['page_range']), count_pages(input_path))
+            pages = len(page_indices)
+            self.store.update(job_id, pages=pages, pages_done=0)
+            os.makedirs(output_folder, exist_ok=True)
+            futures = get_worker_pool().run_pages(input_path, output_folder, page_indices)
+            with self.lock:
+                self.active[job_id] = futures
+            # A job cancelled before its futures were registered is cancelled here
+            if self.store.get(job_id)['status'] == 'cancelled':
+                cancel_pending(futures)
+
+            pages_done, errors = 0, []
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    errors.append(str(future.exception()))
+                pages_done += 1
+                self.store.update(job_id, pages_done=pages_done)
+
+            if self.store.get(job_id)['status'] == 'cancelled':
+                return
+            if errors:
+                self.store.finish(job_id, 'failed', errors[0])
+                return
+            events = [page_event(page_index, future, pages) for page_index, future in zip(page_indices, futures)]
+            result_path = self.store.result_path(job_id)
+            # The zip goes straight to disk; small ones are also kept in the result cache
+            size = write_zip(result_path, output_folder, events)
+            if size <= CACHE_ZIP_MAX_BYTES and self.cache is not None and job['cache_key']:
+                with open(result_path, 'rb') as f:
+                    self.cache.put(job['cache_key'], f.read())
+            self.store.finish(job_id, 'done')
+
+        except Exception as e:
+            self.store.finish(job_id, 'failed', str(e))
+
+        finally:
+            # Only the zip is kept until the job expires
+            shutil.rmtree(output_folder, ignore_errors=True)
+            if os.path.exists(input_path):
+                os.remove(input_path)
+            with self.lock:
+                self.active.pop(job_id, None)
+            self.wakeup.set()
+
+
+job_runner = None
+
+# Function to get the process-wide job runner, started on first use
+def get_job_runner():
+    global job_runner
+    if job_runner is None:
+        job_runner = JobRunner(JobStore(), cache=get_result_cache()).start()
+    return job_runner
+
+# Function to report queued and running jobs, for /metrics
+def job_queue_depth():
+    if job_runner is None:
+        return {}
+    counts = job_runner.store.counts()
+    return {('jobs_queued',): counts.get('queued', 0), ('jobs_running',): counts.get('running', 0)}
@@ -1,9 +1,112 @@
 import streamlit as st
 import os
-import subprocess
+import sys
 import tempfile
-import shutil
-from zipfile import ZipFile
+import threading
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_bytes
+from worker_pool import DeepDocWorkerPool, count_pages, DEFAULT_TEXT_LAYER
+from streaming import iter_page_events, zip_folder, parse_page_range, select_pages
+
+# Processed documents kept in memory across reruns and sessions, bounded by
+# count and by the total size of their zips
+RESULT_CACHE_ENTRIES = int(os.environ.get('ST_RESULT_CACHE_ENTRIES', '32'))
+RESULT_CACHE_MB = int(os.environ.get('ST_RESULT_CACHE_MB', '512'))
+
+# Keep one pool of warm DeepDoc workers across Streamlit reruns
+@st.cache_resource
+def load_worker_pool():
+    return DeepDocWorkerPool().start()
+
+
+# LRU of processed documents (page events and zip) shared by every session,
+# so reruns and repeated downloads reuse them; the newest entry is always kept
+class ProcessedDocuments:
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, max_mb=RESULT_CACHE_MB):
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 1024 * 1024
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            document = self.entries.get(key)
+            if document is not None:
+                self.entries.move_to_end(key)
+            return document
+
+    def put(self, key, document):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous['zip'])
+            self.entries[key] = document
+            self.size += len(document['zip'])
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped['zip'])
+
+
+@st.cache_resource
+def processed_documents():
+    return ProcessedDocuments()
+
+# Function to show the outcome of one page
+def show_page(event):
+    if event['event'] == 'error':
+        st.write(f"Error output for page {event['page'] + 1}:")
+        st.text(event['error'])
+    else:
+        source = 'text layer' if event['source'] == 'text_layer' else 'OCR'
+        with st.expander(f"Page {event['page'] + 1} ({source})"):
+            st.text(event['text'])
+
+# Function to run the pages of an upload through the warm workers, showing
+# each one as it finishes; input and outputs live in a temporary directory
+# that is removed once the zip is built in memory. page_indices is the
+# selected pages, None for every page
+def process_document(pdf_data, cache_key, page_indices=None):
+    # Repeat uploads are answered from the result cache
+    cache = get_result_cache()
+    zip_data = cache.get(cache_key)
+    if zip_data is not None:
+        st.write("Loaded previously processed results from cache.")
+        return {'events': [], 'zip': zip_data, 'failed': []}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file_path = os.path.join(temp_dir, 'document.pdf')
+        with open(input_file_path, 'wb') as f:
+            f.write(pdf_data)
+        output_folder = os.path.join(temp_dir, 'recognized_content')
+        os.makedirs(output_folder)
+
+        # Fan the pages out over the warm workers and show each one as it finishes
+        failed, events = [], []
+        try:
+            page_indices = select_pages(page_indices, count_pages(input_file_path))
+            futures = load_worker_pool().run_pages(input_file_path, output_folder, page_indices)
+        except Exception as e:
+            futures = []
+            failed.append(None)
+            st.write("Error output:")
+            st.text(str(e))
+        progress = st.progress(0.0, text=f"Processing {len(futures)} page(s)...")
+        for done, event in enumerate(iter_page_events(futures), start=1):
+            events.append(event)
+            progress.progress(done / len(futures), text=f"Processed {done} of {len(futures)} page(s)")
+            if event['event'] == 'error':
+                failed.append(event['page'])
+            show_page(event)
+
+        # Zip the recognized_content folder
+        zip_data = zip_folder(output_folder, events)
+
+    if not failed:
+        cache.put(cache_key, zip_data)
+    return {'events': sorted(events, key=lambda event: event['page']), 'zip': zip_data, 'failed': failed}
 
 # Streamlit page title
 st.title('DeepDoc Web App V1.0')
@@ -13,60 +116,50 @@ uploaded_file = st.file_uploader("Upload PDF File", type="pdf")
 
 # Check if a file has been uploaded
 if uploaded_file is not None:
-    # Save the uploaded file to a temporary directory
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        input_file_path = tmp_file.name
+    pdf_data = uploaded_file.getvalue()
 
-    # Get the directory of the input file
-    input_dir = os.path.dirname(input_file_path)
+    # Optional 1-based page selection, part of the cache key like in the API
+    pages = st.text_input("Pages (optional, e.g. 1-3,7)")
+    try:
+        page_indices = parse_page_range(pages)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    cache_key = make_key('deepdoc', digest_bytes(pdf_data), script='t_ocr', text_layer=DEFAULT_TEXT_LAYER,
+                         pages=page_indices)
 
-    # Set the output folder to 'recognized_content'
-    output_folder = os.path.join(input_dir, 'recognized_content')
-
-    # Display the uploaded file name and the fixed output folder
+    # Display the uploaded file name
     st.write(f"Uploaded file: {uploaded_file.name}")
-    st.write(f"Fixed output folder: {output_folder}")
-
-    # Button to trigger the processing script
-    if st.button("Start Processing"):
-        # If the output folder does not exist, create it
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-
-        # Call the trans.py script
-        result = subprocess.run(
-            ['python', 'ragflow/deepdoc/vision/t_ocr.py', '--inputs', input_file_path, '--output_dir', output_folder],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
 
-        # Display the script output
-        st.write("Script output:")
-        st.text(result.stdout)
+    # Results of this session's last document come first, then documents any
+    # session processed successfully; reruns and downloads skip processing
+    session_document = st.session_state.get('deepdoc_document')
+    if session_document is not None and session_document[0] == cache_key:
+        document = session_document[1]
+    else:
+        document = processed_documents().get(cache_key)
+    shown = False
 
-        # Display errors (if any)
-        if result.stderr:
-            st.write("Error output:")
-            st.text(result.stderr)
+    # Button to trigger the processing, offered again when pages failed
+    if (document is None or document['failed']) and st.button("Start Processing"):
+        document = process_document(pdf_data, cache_key, page_indices)
+        st.session_state['deepdoc_document'] = (cache_key, document)
+        if not document['failed']:
+            processed_documents().put(cache_key, document)
+        shown = True
 
-        # Zip the recognized_content folder
-        zip_file_path = os.path.join(input_dir, 'recognized_content.zip')
-        with ZipFile(zip_file_path, 'w') as zip_file:
-            for foldername, subfolders, filenames in os.walk(output_folder):
-                for filename in filenames:
-                    file_path = os.path.join(foldername, filename)
-                    zip_file.write(file_path, os.path.relpath(file_path, output_folder))
+    if document is not None:
+        if not shown:
+            for event in document['events']:
+                show_page(event)
 
         # Provide a download button for the user to download the zip file
-        with open(zip_file_path, 'rb') as f:
-            st.download_button(
-                label="Download Processed Results",
-                data=f,
-                file_name='recognized_content.zip',
-                mime='application/zip'
-            )
+        st.download_button(
+            label="Download Processed Results",
+            data=document['zip'],
+            file_name='recognized_content.zip',
+            mime='application/zip'
+        )
 
 # Prompt if no file is uploaded
 else:
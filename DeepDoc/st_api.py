@@ -1,66 +1,247 @@
 import os
-import subprocess
+import sys
+import asyncio
+import hashlib
+import time
 import shutil
 import tempfile
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
-from zipfile import ZipFile
+from fastapi.responses import Response, JSONResponse, StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key
+from ocr_common.metrics import instrument_fastapi, register_callback, stage, timed_iter
+from worker_pool import get_worker_pool, count_pages, pool_queue_depth, worker_rss, DEFAULT_TEXT_LAYER
+from jobs import get_job_runner, job_queue_depth
+from streaming import (STREAM_FORMATS, MEDIA_TYPES, STREAM_HEADERS, ZIP_HEADERS, CHUNK_SIZE, pages_cache_key,
+                       iter_zip, tee_to_cache, cache_zip, parse_page_range, select_pages, format_event,
+                       start_event, done_event, page_event, cancel_pending)
 
 # Initialize FastAPI app
 app = FastAPI()
 
-# Define the route for uploading the PDF file and processing it
-@app.post("/deepdoc-api/")
-async def deepdoc_api(file: UploadFile = File(...)):
-    # Ensure the uploaded file is a PDF
+# Prometheus metrics on /metrics, including the page and job queues and worker memory
+instrument_fastapi(app, 'deepdoc')
+register_callback('ocr_queue_depth', 'Work waiting for or running on a worker',
+                  lambda: dict(pool_queue_depth(), **job_queue_depth()), label_names=('queue',))
+register_callback('deepdoc_worker_resident_memory_bytes', 'Resident set size of each DeepDoc worker', worker_rss,
+                  label_names=('worker',))
+
+MAX_UPLOAD_MB = int(os.environ.get('DEEPDOC_MAX_UPLOAD_MB', '1024'))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+# Start loading the DeepDoc models and resume queued jobs before the first request arrives
+@app.on_event("startup")
+async def start_workers():
+    get_worker_pool()
+    get_job_runner()
+
+# Function to return ZIP bytes as a downloadable response
+def zip_response(zip_data, background=None):
+    return Response(content=zip_data, media_type='application/zip', headers=ZIP_HEADERS, background=background)
+
+# Function to stream an upload into its own temporary directory in chunks,
+# hashing it on the way, so the PDF is never held in memory as a whole; every
+# request gets separate input and output paths since pages of concurrent
+# requests are processed side by side
+async def save_upload(file, parent_dir=None):
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are allowed.")
+    temp_dir = tempfile.mkdtemp(dir=parent_dir)
+    input_file_path = os.path.join(temp_dir, 'document.pdf')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(input_file_path, 'wb') as f, stage('save_upload'):
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File too large, the limit is {MAX_UPLOAD_MB} MB")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    output_folder = os.path.join(temp_dir, 'recognized_content')
+    os.makedirs(output_folder)
+    return temp_dir, input_file_path, output_folder, digest.hexdigest()
+
+# Function to parse the optional 1-based 'pages' selection, e.g. 1-3,7
+def requested_pages(pages):
+    try:
+        return parse_page_range(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Function to build the result cache key of an upload
+def upload_cache_key(content_digest, page_indices):
+    return make_key('deepdoc', content_digest, script='t_ocr', text_layer=DEFAULT_TEXT_LAYER, pages=page_indices)
+
+# Function to count the document's pages and check the selection against them
+async def document_pages(input_file_path, page_indices):
+    try:
+        with stage('count_pages'):
+            total = await run_in_threadpool(count_pages, input_file_path)
+        return total, select_pages(page_indices, total)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
 
+# Function to wait for one page without blocking the event loop
+async def wait_page(page_index, future):
+    try:
+        await asyncio.wrap_future(future)
+    except Exception:
+        pass
+    return page_index, future
+
+# Define the route for uploading the PDF file and processing it
+@app.post("/deepdoc-api/")
+async def deepdoc_api(file: UploadFile = File(...), pages: str = None):
+    page_indices = requested_pages(pages)
+    temp_dir, input_file_path, output_folder, content_digest = await save_upload(file)
+    cleanup = BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
     try:
-        # Save the uploaded PDF to a temporary directory
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(await file.read())
-            input_file_path = tmp_file.name
-
-        # Define the output folder in the same directory as input file
-        input_dir = os.path.dirname(input_file_path)
-        output_folder = os.path.join(input_dir, 'recognized_content')
-
-        # Ensure the output folder exists
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-
-        # Call the trans.py script
-        result = subprocess.run(
-            ['python', 'ragflow/deepdoc/vision/t_ocr.py', '--inputs', input_file_path, '--output_dir', output_folder],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        # Check for errors in the script execution
-        if result.returncode != 0:
-            raise HTTPException(status_code=500, detail=f"Script error: {result.stderr}")
-
-        # Create a ZIP file from the output folder
-        zip_file_path = os.path.join(input_dir, 'recognized_content.zip')
-        with ZipFile(zip_file_path, 'w') as zip_file:
-            for foldername, subfolders, filenames in os.walk(output_folder):
-                for filename in filenames:
-                    file_path = os.path.join(foldername, filename)
-                    zip_file.write(file_path, os.path.relpath(file_path, output_folder))
-
-        # Return the ZIP file as a downloadable response
-        return FileResponse(zip_file_path, filename='recognized_content.zip')
+        # Repeat uploads are answered from the result cache; its SQLite
+        # lookups and writes run off the event loop
+        cache = get_result_cache()
+        cache_key = upload_cache_key(content_digest, page_indices)
+        cached_zip = await run_in_threadpool(cache.get, cache_key)
+        if cached_zip is not None:
+            return zip_response(cached_zip, cleanup)
+
+        # Fan the pages out over the warm workers and wait for all of them
+        total, page_indices = await document_pages(input_file_path, page_indices)
+        futures = get_worker_pool().run_pages(input_file_path, output_folder, page_indices)
+        await asyncio.gather(*[wait_page(page_index, future) for page_index, future in zip(page_indices, futures)])
+        events = [page_event(page_index, future, len(futures)) for page_index, future in zip(page_indices, futures)]
+        errors = [event for event in events if event['event'] == 'error']
+        if errors:
+            raise HTTPException(status_code=500, detail=f"Script error on page {errors[0]['page'] + 1}: {errors[0]['error']}")
+        await run_in_threadpool(cache.put, pages_cache_key(cache_key), events)
+
+        # Zip straight into the response instead of building the archive first;
+        # the work directory is removed once the response has been sent
+        return StreamingResponse(tee_to_cache(timed_iter('zip', iter_zip(output_folder, events)), cache, cache_key),
+                                 media_type='application/zip', headers=ZIP_HEADERS, background=cleanup)
+
+    except HTTPException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
 
     except Exception as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+# Define the route streaming per-page results as pages finish, as NDJSON or
+# server-sent events (?format=sse). When every page succeeds the zip is
+# cached, so /deepdoc-api/ with the same file returns the aggregate immediately.
+@app.post("/deepdoc-api/stream")
+async def deepdoc_api_stream(file: UploadFile = File(...), format: str = 'ndjson', pages: str = None):
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}")
+    page_indices = requested_pages(pages)
+    temp_dir, input_file_path, output_folder, content_digest = await save_upload(file)
+    cleanup = BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+
+    cache = get_result_cache()
+    cache_key = upload_cache_key(content_digest, page_indices)
+    cached_events = await run_in_threadpool(cache.get, pages_cache_key(cache_key))
+    if cached_events is not None:
+        async def replay():
+            started = time.time()
+            yield format_event(start_event(len(cached_events)), format)
+            for event in cached_events:
+                yield format_event(event, format)
+            yield format_event(done_event(len(cached_events), [], started), format)
+        return StreamingResponse(replay(), media_type=MEDIA_TYPES[format], headers=STREAM_HEADERS, background=cleanup)
+
+    try:
+        total, page_indices = await document_pages(input_file_path, page_indices)
+    except HTTPException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    async def generate():
+        started = time.time()
+        futures = []
+        try:
+            yield format_event(start_event(len(page_indices), total), format)
+            futures = get_worker_pool().run_pages(input_file_path, output_folder, page_indices)
+            events, failed = [], []
+            waits = [wait_page(page_index, future) for page_index, future in zip(page_indices, futures)]
+            for next_page in asyncio.as_completed(waits):
+                page_index, future = await next_page
+                event = page_event(page_index, future, len(page_indices))
+                events.append(event)
+                if event['event'] == 'error':
+                    failed.append(page_index)
+                yield format_event(event, format)
+
+            if not failed:
+                await run_in_threadpool(cache_zip, cache, cache_key, output_folder, events)
+                await run_in_threadpool(cache.put, pages_cache_key(cache_key), sorted(events, key=lambda event: event['page']))
+            yield format_event(done_event(len(page_indices), failed, started), format)
+
+        finally:
+            # Pages not yet on a worker when the client disconnects are dropped
+            cancel_pending(futures)
+
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[format], headers=STREAM_HEADERS, background=cleanup)
+
+# Function to look up a job or fail with 404; expired jobs are gone as well
+def find_job(job_id):
+    job = get_job_runner().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+# Define the route queueing a PDF as a background job; poll /jobs/{id} and
+# download /jobs/{id}/result once its status is 'done'
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), pages: str = None):
+    page_indices = requested_pages(pages)
+    runner = get_job_runner()
+    # Uploads are staged next to the job directories so they can be moved in place
+    temp_dir, input_file_path, output_folder, content_digest = await save_upload(file, runner.store.root)
+    try:
+        # Writing the job record happens off the event loop
+        return await run_in_threadpool(runner.submit, file.filename, input_file_path,
+                                       upload_cache_key(content_digest, page_indices), pages)
     finally:
-        # Cleanup: remove temporary files and directories
-        if os.path.exists(input_file_path):
-            os.remove(input_file_path)
-        if os.path.exists(output_folder):
-            shutil.rmtree(output_folder)
-        if os.path.exists(zip_file_path):
-            os.remove(zip_file_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+# Define the route reporting a job's status and page progress
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return await run_in_threadpool(find_job, job_id)
+
+# Define the route returning a finished job's ZIP
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = await run_in_threadpool(find_job, job_id)
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(get_job_runner().store.result_path(job_id), media_type='application/zip',
+                        filename='recognized_content.zip')
+
+# Define the route cancelling a queued or running job
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    await run_in_threadpool(find_job, job_id)
+    return await run_in_threadpool(get_job_runner().cancel, job_id)
+
+# Endpoint to report result cache hit/miss counters
+@app.get("/cache/stats")
+async def cache_stats():
+    return await run_in_threadpool(get_result_cache().stats)
+
+# Endpoint to report whether a DeepDoc worker has its models loaded
+@app.get("/ready")
+async def ready():
+    pool = get_worker_pool()
+    return JSONResponse(pool.status(), status_code=200 if pool.is_ready() else 503)
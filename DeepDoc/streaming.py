@@ -0,0 +1,174 @@
+import io
+import os
+import sys
+import json
+import time
+import tempfile
+from zipfile import ZipFile
+from concurrent.futures import as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.metrics import record_stages, stage
+
+# Per-page DeepDoc results are streamed as soon as each page finishes, either
+# as NDJSON (one JSON object per line) or as server-sent events. Every event
+# has an 'event' field:
+#   start   {'pages': n, 'document_pages': total}
+#   page    {'page': i, 'pages': n, 'source': 'text_layer' or 'ocr', 'text': ...,
+#            'boxes': [...], 'width', 'height', 'image', 'timings': {stage: seconds}}
+#   error   {'page': i, 'pages': n, 'error': ...}
+#   done    {'pages': n, 'failed': [...], 'elapsed_ms': ...}
+STREAM_FORMATS = ('ndjson', 'sse')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+# Keep proxies from buffering the stream until it ends
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+ZIP_HEADERS = {'Content-Disposition': 'attachment; filename="recognized_content.zip"'}
+CHUNK_SIZE = 1024 * 1024
+# Zips larger than this are streamed but not stored in the result cache
+CACHE_ZIP_MAX_BYTES = int(os.environ.get('DEEPDOC_CACHE_ZIP_MAX_MB', '64')) * 1024 * 1024
+
+# Function to derive the key of the per-page results cached next to a zip
+def pages_cache_key(zip_cache_key):
+    return zip_cache_key + ':pages'
+
+# Write-only stream that hands what ZipFile writes to a generator in pieces
+class ZipSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+# Function to zip an output folder on the fly. Only about CHUNK_SIZE bytes are
+# held at a time, however large the folder; with page events, a pages.json
+# summary records how each page was read (text layer or OCR).
+def iter_zip(output_folder, events=None):
+    sink = ZipSink()
+    with ZipFile(sink, 'w') as zip_file:
+        for foldername, subfolders, filenames in os.walk(output_folder):
+            for filename in sorted(filenames):
+                file_path = os.path.join(foldername, filename)
+                with open(file_path, 'rb') as src, zip_file.open(os.path.relpath(file_path, output_folder), 'w') as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        dst.write(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+        if events is not None:
+            zip_file.writestr('pages.json', json.dumps(page_summary(events), indent=1))
+    yield from sink.drain()
+
+# Function to zip an output folder into bytes
+def zip_folder(output_folder, events=None):
+    return b''.join(iter_zip(output_folder, events))
+
+# Function to pass zip chunks through, keeping a copy for the result cache
+# as long as the zip stays under the cache limit
+def tee_to_cache(chunks, cache, cache_key, limit=None):
+    limit = CACHE_ZIP_MAX_BYTES if limit is None else limit
+    kept, size = [], 0
+    for chunk in chunks:
+        if kept is not None:
+            size += len(chunk)
+            if size <= limit:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        cache.put(cache_key, b''.join(kept))
+
+# Function to write a folder's zip to a file, returning its size
+def write_zip(path, output_folder, events=None):
+    with open(path, 'wb') as f, stage('zip'):
+        for chunk in iter_zip(output_folder, events):
+            f.write(chunk)
+        return f.tell()
+
+# Function to cache a folder's zip unless it is too large to keep
+def cache_zip(cache, cache_key, output_folder, events=None):
+    with tempfile.TemporaryFile() as f, stage('zip'):
+        for chunk in iter_zip(output_folder, events):
+            f.write(chunk)
+        if f.tell() > CACHE_ZIP_MAX_BYTES:
+            return False
+        f.seek(0)
+        cache.put(cache_key, f.read())
+    return True
+
+# Function to parse a 1-based page selection such as "1-3,7" into sorted
+# 0-based indices; an empty selection means every page
+def parse_page_range(spec):
+    if spec is None or not str(spec).strip():
+        return None
+    pages = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        first, dash, last = part.partition('-')
+        if not first.strip().isdigit() or (dash and not last.strip().isdigit()):
+            raise ValueError(f"Invalid page range '{part}', expected e.g. 1-3,7")
+        first = int(first)
+        last = int(last) if last else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}', pages start at 1")
+        pages.update(range(first - 1, last))
+    return sorted(pages)
+
+# Function to check a page selection against the document; None selects every page
+def select_pages(page_indices, page_count):
+    if page_indices is None:
+        return list(range(page_count))
+    if page_indices[-1] >= page_count:
+        raise ValueError(f"Page {page_indices[-1] + 1} is out of range, the document has {page_count} page(s)")
+    return page_indices
+
+# Function to list each page's source and output image, without the text
+def page_summary(events):
+    return [{key: event[key] for key in ('page', 'source', 'width', 'height', 'image') if key in event}
+            for event in sorted(events, key=lambda event: event['page'])]
+
+# Function to encode one event as an NDJSON line or a server-sent event
+def format_event(event, fmt='ndjson'):
+    data = json.dumps(event)
+    if fmt == 'sse':
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + '\n'
+
+def start_event(pages, document_pages=None):
+    return {'event': 'start', 'pages': pages, 'document_pages': document_pages or pages}
+
+def done_event(pages, failed, started):
+    return {'event': 'done', 'pages': pages, 'failed': sorted(failed),
+            'elapsed_ms': round((time.time() - started) * 1000, 1)}
+
+# Function to turn a finished page future into a page or error event,
+# recording the worker's stage timings
+def page_event(page_index, future, pages):
+    try:
+        result = future.result()
+    except Exception as e:
+        return {'event': 'error', 'page': page_index, 'pages': pages, 'error': str(e)}
+    record_stages(result.get('timings', {}))
+    return dict(result, event='page', pages=pages)
+
+# Function to yield page events in completion order; page_indices gives the
+# page of each future when only some pages were submitted
+def iter_page_events(futures, pages=None, page_indices=None):
+    pages = len(futures) if pages is None else pages
+    page_indices = range(len(futures)) if page_indices is None else page_indices
+    page_of = dict(zip(futures, page_indices))
+    for future in as_completed(page_of):
+        yield page_event(page_of[future], future, pages)
+
+# Function to cancel page jobs a client no longer waits for; pages not yet
+# handed to a worker are dropped, pages already on a worker finish
+def cancel_pending(futures):
+    for future in futures:
+        future.cancel()
@@ -0,0 +1,425 @@
+import os
+import sys
+import time
+import queue
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.metrics import record_stage, process_rss_bytes
+
+# Persistent DeepDoc workers: each process imports ragflow's deepdoc and loads
+# the OCR models once, then serves jobs from its own queue. Jobs wait in the
+# parent and are handed out one per idle worker, so a cancelled future is
+# dropped before any worker sees it. A worker that dies (segfault, OOM kill)
+# fails only the job it was running, a job it had not started yet goes back
+# to the queue, and the worker is replaced after RESTART_DELAY_SECONDS.
+#   DEEPDOC_WORKERS       number of worker processes
+#   DEEPDOC_RAGFLOW_DIR   ragflow checkout, defaults to ./ragflow like the old t_ocr.py call
+DEFAULT_WORKERS = int(os.environ.get('DEEPDOC_WORKERS', '2'))
+RAGFLOW_DIR = os.path.abspath(os.environ.get('DEEPDOC_RAGFLOW_DIR', 'ragflow'))
+RESTART_DELAY_SECONDS = 1.0
+ZOOMIN = 3
+# A worker that gets no page for this long closes the document it has open
+PDF_IDLE_CLOSE_SECONDS = 2.0
+
+# Born-digital pages are read from their embedded text layer instead of being OCR'd
+#   DEEPDOC_TEXT_LAYER            auto (use a usable text layer) or off (always OCR)
+#   DEEPDOC_TEXT_LAYER_MIN_CHARS  fewer readable characters than this means a scanned page
+TEXT_LAYER_MODES = ('auto', 'off')
+DEFAULT_TEXT_LAYER = os.environ.get('DEEPDOC_TEXT_LAYER', 'auto')
+TEXT_LAYER_MIN_CHARS = int(os.environ.get('DEEPDOC_TEXT_LAYER_MIN_CHARS', '20'))
+TEXT_LAYER_MAX_UNMAPPED = 0.1
+
+
+# Function to load the models inside a worker, the same imports t_ocr.py does
+def load_models(ragflow_dir):
+    sys.path.insert(0, ragflow_dir)
+    from deepdoc.vision import OCR
+    # Page rendering is imported up front too, so the first page does not pay for it
+    import pdfplumber
+    return OCR()
+
+# Function to write the annotated image and text of a page, the same outputs t_ocr.py produces
+def save_page(image, boxes, output_path, label):
+    from deepdoc.vision.seeit import draw_box
+    annotated = draw_box(image, boxes, [label], 1.)
+    annotated.save(output_path, quality=95)
+    with open(output_path + '.txt', 'w+', encoding='utf-8') as f:
+        f.write('\n'.join([box['text'] for box in boxes]))
+
+# Function to recognise one page image and save its outputs
+def ocr_page(ocr, image, output_path):
+    import numpy as np
+    lines = [(line[0], line[1][0]) for line in ocr(np.array(image))]
+    boxes = [{
+        'text': text,
+        'bbox': [float(box[0][0]), float(box[0][1]), float(box[1][0]), float(box[-1][1])],
+        'type': 'ocr',
+        'score': 1} for box, text in lines if box[0][0] <= box[1][0] and box[0][1] <= box[-1][1]]
+    save_page(image, boxes, output_path, 'ocr')
+    return boxes
+
+# Function to process a whole PDF or image into output_dir
+def ocr_file(ocr, input_path, output_dir):
+    from deepdoc.vision import init_in_out
+    images, outputs = init_in_out(SimpleNamespace(inputs=input_path, output_dir=output_dir))
+    for image, output_path in zip(images, outputs):
+        ocr_page(ocr, image, output_path)
+    return outputs
+
+# Function to count the pages of a PDF without rendering them
+def count_pages(input_path):
+    import pdfplumber
+    with pdfplumber.open(input_path) as pdf:
+        return len(pdf.pages)
+
+# The PDF a worker is currently reading pages from, so consecutive pages of
+# one document do not reparse it
+open_pdf = {'path': None, 'pdf': None}
+
+# Function to get one page of a PDF, reusing the open document
+def pdf_page(input_path, page_index):
+    import pdfplumber
+    if open_pdf['path'] != input_path:
+        close_pdf()
+        open_pdf['pdf'] = pdfplumber.open(input_path)
+        open_pdf['path'] = input_path
+    return open_pdf['pdf'].pages[page_index]
+
+# Function to close the open document and drop the pages it parsed
+def close_pdf():
+    if open_pdf['pdf'] is not None:
+        open_pdf['pdf'].close()
+    open_pdf['pdf'] = open_pdf['path'] = None
+
+# Function to render a page the way init_in_out does (72 dpi x ZOOMIN)
+def render_page(page):
+    return page.to_image(resolution=72 * ZOOMIN).annotated.convert('RGB')
+
+# Function to read a page's lines from its embedded text layer, in rendered
+# image coordinates. Returns None when the layer is missing or unusable
+# (scans, image-only pages, fonts without a unicode mapping), so the page is
+# OCR'd instead.
+def text_layer_boxes(page, min_chars=TEXT_LAYER_MIN_CHARS):
+    chars = [char['text'] for char in page.chars]
+    readable = sum(1 for text in chars if len(text) == 1 and text.isprintable() and not text.isspace() and text != '\ufffd')
+    if readable < min_chars:
+        return None
+    # pdfplumber reports glyphs it cannot map to unicode as (cid:N)
+    unmapped = sum(1 for text in chars if text.startswith('(cid:'))
+    if unmapped > TEXT_LAYER_MAX_UNMAPPED * len(chars):
+        return None
+    return [{
+        'text': line['text'],
+        'bbox': [round(line[key] * ZOOMIN, 2) for key in ('x0', 'top', 'x1', 'bottom')],
+        'type': 'text',
+        'score': 1} for line in page.extract_text_lines(return_chars=False) if line['text'].strip()]
+
+# Function to process a single PDF page; output names match init_in_out's so
+# the aggregated folder is the same as a whole-file run. Pages with a usable
+# text layer skip OCR, 'source' says which path a page took.
+def ocr_pdf_page(ocr, input_path, page_index, output_dir, text_layer=None):
+    timings = {}
+    start = time.perf_counter()
+    page = pdf_page(input_path, page_index)
+    # pdfplumber keeps a page's parsed objects until it is closed
+    try:
+        boxes = text_layer_boxes(page) if (text_layer or DEFAULT_TEXT_LAYER) == 'auto' else None
+        timings['parse'] = time.perf_counter() - start
+        start = time.perf_counter()
+        image = render_page(page)
+        timings['render'] = time.perf_counter() - start
+    finally:
+        page.close()
+    output_name = os.path.basename(input_path) + f'_{page_index}.jpg'
+    output_path = os.path.join(output_dir, output_name)
+    start = time.perf_counter()
+    if boxes is None:
+        boxes = ocr_page(ocr, image, output_path)
+        source = 'ocr'
+    else:
+        save_page(image, boxes, output_path, 'text')
+        source = 'text_layer'
+    # ragflow's OCR runs detection and recognition in one call, so 'ocr' covers both and the saving
+    timings['ocr' if source == 'ocr' else 'save'] = time.perf_counter() - start
+    return {
+        'page': page_index,
+        'source': source,
+        'width': image.width,
+        'height': image.height,
+        'text': '\n'.join([box['text'] for box in boxes]),
+        'timings': {name: round(seconds, 4) for name, seconds in timings.items()},
+        'boxes': boxes,
+        'image': output_name,
+    }
+
+TASKS = {
+    'ocr_file': ocr_file,
+    'ocr_pdf_page': ocr_pdf_page,
+}
+
+# Worker process entry point
+def worker_main(worker_id, ragflow_dir, tasks, results):
+    try:
+        ocr = load_models(ragflow_dir)
+    except Exception:
+        results.put(('failed', worker_id, traceback.format_exc()))
+        return
+    results.put(('ready', worker_id, os.getpid()))
+    while True:
+        try:
+            task = tasks.get(timeout=PDF_IDLE_CLOSE_SECONDS if open_pdf['pdf'] is not None else None)
+        except queue.Empty:
+            # No further pages came, so the document's job is over
+            close_pdf()
+            continue
+        if task is None:
+            break
+        job_id, kind, args = task
+        results.put(('started', worker_id, job_id))
+        try:
+            results.put(('done', job_id, TASKS[kind](ocr, *args)))
+        except Exception:
+            results.put(('error', job_id, traceback.format_exc()))
+
+
+# Pool of warm worker processes with futures-based dispatch
+class DeepDocWorkerPool:
+    def __init__(self, workers=DEFAULT_WORKERS, ragflow_dir=RAGFLOW_DIR):
+        self.size = max(1, workers)
+        self.ragflow_dir = ragflow_dir
+        # Spawned workers start clean instead of inheriting the web server's state
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue()
+        self.processes = {}
+        self.task_queues = {}
+        self.ready_workers = set()
+        self.running = {}
+        self.futures = {}
+        self.submitted = {}
+        # Jobs not yet handed to a worker, and the job handed to each busy worker
+        self.pending = deque()
+        self.assigned = {}
+        # Dead workers and when they are due to be replaced
+        self.restart_at = {}
+        self.lock = threading.Lock()
+        self.next_job_id = 0
+        self.last_error = None
+        self.restarts = 0
+        self.monitor = None
+        self.stopping = False
+
+    def start(self):
+        with self.lock:
+            if self.monitor is not None:
+                return self
+            for worker_id in range(self.size):
+                self._spawn(worker_id)
+            self.monitor = threading.Thread(target=self._monitor, daemon=True)
+            self.monitor.start()
+        return self
+
+    # Each worker gets a fresh task queue, a dead worker's may hold a task it never read
+    def _spawn(self, worker_id):
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main, args=(worker_id, self.ragflow_dir, tasks, self.results), daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+        self.task_queues[worker_id] = tasks
+
+    def submit(self, kind, *args):
+        future = Future()
+        with self.lock:
+            job_id = self.next_job_id
+            self.next_job_id += 1
+            self.futures[job_id] = future
+            self.submitted[job_id] = time.perf_counter()
+            self.pending.append((job_id, kind, args))
+            self._dispatch()
+        return future
+
+    # Function to hand pending jobs to idle live workers, skipping cancelled
+    # ones; a handed-out future is marked running and can no longer be
+    # cancelled. Callers must hold self.lock
+    def _dispatch(self):
+        idle = [worker_id for worker_id in self.processes
+                if worker_id not in self.assigned and worker_id not in self.restart_at]
+        while self.pending and idle:
+            job_id, kind, args = task = self.pending.popleft()
+            future = self.futures.get(job_id)
+            # A job put back after its worker died is already marked running
+            if future is None or (not future.running() and not future.set_running_or_notify_cancel()):
+                self.futures.pop(job_id, None)
+                self.submitted.pop(job_id, None)
+                continue
+            worker_id = idle.pop(0)
+            self.assigned[worker_id] = task
+            self.task_queues[worker_id].put(task)
+
+    # Function to run t_ocr's processing of one file on a warm worker
+    def run_file(self, input_path, output_dir):
+        return self.submit('ocr_file', input_path, output_dir)
+
+    # Function to fan the pages of a PDF out over all workers; the futures
+    # are in page order and complete independently
+    def run_pages(self, input_path, output_dir, pages=None, text_layer=None):
+        if pages is None:
+            pages = range(count_pages(input_path))
+        return [self.submit('ocr_pdf_page', input_path, page_index, output_dir, text_layer) for page_index in pages]
+
+    def _resolve(self, job_id, result=None, error=None):
+        with self.lock:
+            future = self.futures.pop(job_id, None)
+            self.submitted.pop(job_id, None)
+            for worker_id, running_job in list(self.running.items()):
+                if running_job == job_id:
+                    del self.running[worker_id]
+            # The worker is free for the next pending job
+            for worker_id, task in list(self.assigned.items()):
+                if task[0] == job_id:
+                    del self.assigned[worker_id]
+                    self._dispatch()
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(error))
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == 'ready':
+            with self.lock:
+                self.ready_workers.add(message[1])
+        elif kind == 'failed':
+            self.last_error = message[2]
+            print(f"DeepDoc worker {message[1]} failed to load models:\n{message[2]}")
+        elif kind == 'started':
+            with self.lock:
+                self.running[message[1]] = message[2]
+                submitted = self.submitted.pop(message[2], None)
+            # Time a job waited for a free worker
+            if submitted is not None:
+                record_stage('queue_wait', time.perf_counter() - submitted)
+        elif kind == 'done':
+            self._resolve(message[1], result=message[2])
+        elif kind == 'error':
+            self._resolve(message[1], error=message[2])
+
+    # Collect worker messages and replace workers that died
+    def _monitor(self):
+        while not self.stopping:
+            try:
+                self._handle(self.results.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+    # Function to notice dead workers and replace them once their restart is
+    # due; restarts are scheduled rather than slept for, so dispatching and
+    # result collection carry on meanwhile
+    def _check_workers(self):
+        with self.lock:
+            dead = [worker_id for worker_id, process in self.processes.items()
+                    if worker_id not in self.restart_at and not process.is_alive()]
+        if dead:
+            # Messages a worker sent just before dying say which job it was on
+            while True:
+                try:
+                    self._handle(self.results.get_nowait())
+                except queue.Empty:
+                    break
+        for worker_id in dead:
+            self._worker_died(worker_id)
+        now = time.monotonic()
+        with self.lock:
+            due = [worker_id for worker_id, at in self.restart_at.items() if at <= now and not self.stopping]
+            for worker_id in due:
+                del self.restart_at[worker_id]
+                self.restarts += 1
+                self._spawn(worker_id)
+                print(f"Restarted DeepDoc worker {worker_id}")
+            if due:
+                self._dispatch()
+
+    # Function to settle the job a dead worker held: a job it had started
+    # may be what crashed it and fails, one it had not started goes back to
+    # the front of the queue unless the worker never got its models loaded
+    def _worker_died(self, worker_id):
+        with self.lock:
+            process = self.processes[worker_id]
+            started = self.running.pop(worker_id, None)
+            task = self.assigned.pop(worker_id, None)
+            was_ready = worker_id in self.ready_workers
+            self.ready_workers.discard(worker_id)
+            # A worker that cannot even load its models would otherwise restart in a tight loop
+            self.restart_at[worker_id] = time.monotonic() + RESTART_DELAY_SECONDS
+            if task is not None and started is None and was_ready:
+                self.pending.appendleft(task)
+                task = None
+            self._dispatch()
+        if task is not None:
+            reason = 'crashed' if started is not None else 'died before starting the job'
+            self._resolve(task[0], error=f'DeepDoc worker {worker_id} {reason} (exit code {process.exitcode})')
+
+    def is_ready(self):
+        with self.lock:
+            return bool(self.ready_workers)
+
+    def status(self):
+        with self.lock:
+            return {
+                'workers': self.size,
+                'ready': len(self.ready_workers),
+                'busy': len(self.running),
+                'queued': len(self.pending) + len(self.assigned) - len(self.running),
+                'restarts': self.restarts,
+                'last_error': self.last_error,
+            }
+
+    # Function to map live worker ids to their process ids, for per-worker metrics
+    def worker_pids(self):
+        with self.lock:
+            return {worker_id: process.pid for worker_id, process in self.processes.items() if process.is_alive()}
+
+    def close(self):
+        with self.lock:
+            self.stopping = True
+        # Wait for the monitor so no worker is respawned during shutdown
+        if self.monitor is not None:
+            self.monitor.join()
+        for tasks in self.task_queues.values():
+            tasks.put(None)
+        for process in self.processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+worker_pool = None
+
+# Function to get the process-wide pool, started on first use
+def get_worker_pool():
+    global worker_pool
+    if worker_pool is None:
+        worker_pool = DeepDocWorkerPool().start()
+    return worker_pool
+
+# Function to report pages waiting for and running on workers, for /metrics
+def pool_queue_depth():
+    if worker_pool is None:
+        return {}
+    status = worker_pool.status()
+    return {('pages_queued',): status['queued'], ('pages_running',): status['busy']}
+
+# Function to report each worker's resident memory, for /metrics
+def worker_rss():
+    if worker_pool is None:
+        return None
+    return {(str(worker_id),): process_rss_bytes(pid) for worker_id, pid in worker_pool.worker_pids().items()}
@@ -0,0 +1,156 @@
+import os
+import sys
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser, MultiPartException
+from easyocr_core import SUPPORTED_LANGUAGES, ocr_image_bytes
+from reader_cache import reader_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache
+from ocr_common.preprocessing import get_pipeline, list_pipelines
+from ocr_common.metrics import instrument_fastapi, register_callback, stage
+
+# Initialize FastAPI app
+app = FastAPI()
+instrument_fastapi(app, 'easyocr')
+
+# readtext runs on a bounded worker pool; at most MAX_QUEUE requests wait for
+# a free worker, anything beyond that is rejected with 429 instead of queueing
+MAX_WORKERS = int(os.environ.get('EASYOCR_WORKERS', '2'))
+MAX_QUEUE = int(os.environ.get('EASYOCR_MAX_QUEUE', '8'))
+RETRY_AFTER_SECONDS = int(os.environ.get('EASYOCR_RETRY_AFTER', '2'))
+MAX_UPLOAD_BYTES = int(os.environ.get('EASYOCR_MAX_UPLOAD_MB', '20')) * 1024 * 1024
+# Room a multipart body may take around the image (boundaries, part headers, form fields)
+MULTIPART_OVERHEAD = 64 * 1024
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+in_flight = 0
+
+# Function to validate the requested languages against SUPPORTED_LANGUAGES
+def parse_langs(value):
+    langs = [lang.strip() for lang in value.split(',') if lang.strip()]
+    if not langs:
+        raise HTTPException(status_code=400, detail="At least one language is required.")
+    unsupported = [lang for lang in langs if lang not in SUPPORTED_LANGUAGES]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported languages: {', '.join(unsupported)}")
+    return langs
+
+# Function to reject a body whose declared length is over the limit before reading any of it
+def check_content_length(request, limit):
+    length = request.headers.get('content-length', '')
+    if length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail="Upload too large.")
+
+# Function to pass body chunks through, failing as soon as they exceed the
+# limit; chunked uploads declare no length, so the count is what enforces it
+async def limit_stream(chunks, limit):
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail="Upload too large.")
+        yield chunk
+
+# Function to append chunks to one buffer, enforcing the upload limit as they arrive
+async def read_chunks(chunks):
+    data = bytearray()
+    async for chunk in limit_stream(chunks, MAX_UPLOAD_BYTES):
+        data.extend(chunk)
+    return data
+
+# Function to parse a multipart body with the image as its only file. The
+# body is read through the byte limit and the file part is spooled by
+# Starlette (to disk past 1 MB), then read once, capped at the upload limit.
+async def read_multipart(request):
+    check_content_length(request, MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD)
+    parser = MultiPartParser(request.headers, limit_stream(request.stream(), MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD),
+                             max_files=1, max_fields=8)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    try:
+        upload = form.get('image')
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="No image file provided")
+        image_data = await upload.read(MAX_UPLOAD_BYTES + 1)
+        if len(image_data) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Upload too large.")
+        return image_data, form.get('langs'), form.get('preprocess')
+    finally:
+        await form.close()
+
+# Endpoint to list supported languages
+@app.get("/languages")
+async def list_languages():
+    return SUPPORTED_LANGUAGES
+
+# Endpoint to list the preprocessing presets and the default pipeline
+@app.get("/preprocess")
+async def list_preprocessing():
+    return list_pipelines('easyocr')
+
+# Endpoint to perform OCR. Accepts either multipart/form-data with an 'image'
+# file and optional 'langs'/'preprocess' fields, or the raw image as the request
+# body with ?langs=en,fr; raw bodies are streamed straight into the decode buffer.
+@app.post("/ocr")
+async def ocr_service(request: Request, langs: str = 'en', preprocess: str = ''):
+    global in_flight
+    # Reject before reading the body so a full queue costs no memory
+    if in_flight >= MAX_WORKERS + MAX_QUEUE:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests in flight, retry later."},
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    in_flight += 1
+    try:
+        content_type = request.headers.get('content-type', '')
+        with stage('upload'):
+            if content_type.startswith('multipart/form-data'):
+                image_data, form_langs, form_preprocess = await read_multipart(request)
+                langs = form_langs or langs
+                preprocess = form_preprocess or preprocess
+            else:
+                check_content_length(request, MAX_UPLOAD_BYTES)
+                image_data = await read_chunks(request.stream())
+        if not image_data:
+            raise HTTPException(status_code=400, detail="No image file provided")
+
+        lang_list = parse_langs(langs)
+        try:
+            pipeline = get_pipeline('easyocr', preprocess)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        loop = asyncio.get_running_loop()
+        try:
+            # The context goes along so stage timings land in this request's breakdown
+            text = await loop.run_in_executor(executor, contextvars.copy_context().run, ocr_image_bytes,
+                                              image_data, lang_list, pipeline)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        return {"recognized_text": text}
+    finally:
+        in_flight -= 1
+
+# Endpoint to report result cache hit/miss counters
+@app.get("/cache/stats")
+async def cache_stats():
+    return get_result_cache().stats()
+
+# Requests waiting for a free readtext worker, and reader reuse, on /metrics
+register_callback('ocr_queue_depth', 'Work waiting for or running on a worker',
+                  lambda: {('readtext',): max(in_flight - MAX_WORKERS, 0)}, label_names=('queue',))
+register_callback('ocr_model_cache_lookups_total', 'Engine and model cache lookups by outcome',
+                  lambda: {('hit',): reader_cache.hits, ('miss',): reader_cache.misses}, 'counter', ('result',))
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5002)
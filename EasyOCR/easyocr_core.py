@@ -0,0 +1,58 @@
+import os
+import sys
+from reader_cache import reader_cache, normalize_langs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_bytes
+from ocr_common.preprocessing import get_pipeline
+from ocr_common.layout import paragraph_text, LAYOUT_VERSION
+from ocr_common.metrics import record_stages, stage
+
+# List of supported languages (you can update this list based on your needs)
+SUPPORTED_LANGUAGES = {
+    'af': 'Afrikaans', 'ar': 'Arabic', 'az': 'Azerbaijani', 'bg': 'Bulgarian',
+    'cs': 'Czech', 'da': 'Danish', 'de': 'German', 'en': 'English',
+    'es': 'Spanish', 'fa': 'Persian', 'fr': 'French', 'ga': 'Irish',
+    'he': 'Hebrew', 'hi': 'Hindi', 'hr': 'Croatian', 'hu': 'Hungarian',
+    'id': 'Indonesian', 'it': 'Italian', 'ja': 'Japanese', 'ko': 'Korean',
+    'mn': 'Mongolian', 'ms': 'Malay', 'nl': 'Dutch', 'no': 'Norwegian',
+    'pl': 'Polish', 'pt': 'Portuguese', 'ro': 'Romanian', 'ru': 'Russian',
+    'sl': 'Slovenian', 'sq': 'Albanian', 'sr': 'Serbian', 'sv': 'Swedish',
+    'th': 'Thai', 'tr': 'Turkish', 'uk': 'Ukrainian', 'ur': 'Urdu',
+    'vi': 'Vietnamese', 'zh-cn': 'Chinese Simplified', 'zh-tw': 'Chinese Traditional'
+}
+
+# Function to decode and preprocess the image, raising ValueError when it cannot be decoded
+def preprocess_image(image_data, preprocess=None):
+    return get_pipeline('easyocr', preprocess).run(image_data)
+
+# Function to run inference using EasyOCR and preserve paragraph formatting
+def inference_with_formatting(img_array, langs):
+    reader = reader_cache.get(langs)  # Reused across reruns and sessions
+    # readtext runs detection and recognition in one call
+    with stage('recognition'):
+        results = reader.readtext(img_array)
+    with stage('layout'):
+        return format_paragraphs(results)
+
+# Function to run the whole pipeline on encoded image bytes, answering repeats from the result cache
+def ocr_image_bytes(image_data, langs, preprocess=None):
+    pipeline = get_pipeline('easyocr', preprocess)
+    cache = get_result_cache()
+    cache_key = make_key('easyocr', digest_bytes(image_data), langs=normalize_langs(langs), preprocess=pipeline.spec,
+                         layout=LAYOUT_VERSION)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    timings = {}
+    try:
+        binary_image = pipeline.run(image_data, timings)
+    finally:
+        record_stages(timings)
+    text = inference_with_formatting(binary_image, langs)
+    cache.put(cache_key, text)
+    return text
+
+# Function to group readtext results into paragraphs in reading order
+def format_paragraphs(results):
+    return paragraph_text([bbox for bbox, _, _ in results], [text for _, text, _ in results])
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+import easyocr
+
+# Cap on resident readers and language sets to load at startup,
+# e.g. EASYOCR_WARMUP_LANGS="en;ch_sim,en"
+DEFAULT_MAX_READERS = int(os.environ.get('EASYOCR_MAX_READERS', '4'))
+DEFAULT_WARMUP_LANGS = os.environ.get('EASYOCR_WARMUP_LANGS', '')
+
+# Function to normalise a language list into the cache key
+def normalize_langs(langs):
+    if isinstance(langs, str):
+        langs = langs.split(',')
+    return tuple(sorted({lang.strip() for lang in langs if lang.strip()}))
+
+# Function to parse the warm-up setting into a list of language keys
+def parse_warmup_langs(value):
+    return [normalize_langs(combo) for combo in value.split(';') if combo.strip()]
+
+
+# Process-wide LRU cache of easyocr.Reader instances keyed by language set.
+# Every reader uses the same language-agnostic CRAFT detector, so only the
+# first one loads it and the others borrow it. Readers load outside the cache
+# lock, so hits are never held up by a load; concurrent requests for the same
+# language set wait on that set's lock and load it once.
+class ReaderCache:
+    def __init__(self, max_readers=DEFAULT_MAX_READERS, **reader_options):
+        self.max_readers = max_readers
+        self.reader_options = reader_options
+        self.readers = OrderedDict()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        # Held while the reader that owns the detector is created
+        self.detector_lock = threading.Lock()
+        self.detector_owner = None
+        self.hits = 0
+        self.misses = 0
+
+    def _create_reader(self, key):
+        with self.detector_lock:
+            donor = self.detector_owner
+            if donor is None:
+                reader = easyocr.Reader(list(key), **self.reader_options)
+                self.detector_owner = reader
+                return reader
+        # Skip loading another copy of the detector weights
+        reader = easyocr.Reader(list(key), detector=False, **self.reader_options)
+        for attribute in ('detect_network', 'get_textbox', 'get_detector', 'detector'):
+            if hasattr(donor, attribute):
+                setattr(reader, attribute, getattr(donor, attribute))
+        return reader
+
+    def get(self, langs):
+        key = normalize_langs(langs)
+        if not key:
+            raise ValueError('At least one language is required')
+        with self.lock:
+            reader = self.readers.get(key)
+            if reader is not None:
+                self.readers.move_to_end(key)
+                self.hits += 1
+                return reader
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another request may have loaded it while this one waited
+            with self.lock:
+                reader = self.readers.get(key)
+                if reader is not None:
+                    self.readers.move_to_end(key)
+                    self.hits += 1
+                    return reader
+                self.misses += 1
+            try:
+                reader = self._create_reader(key)
+            except BaseException:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+                raise
+            with self.lock:
+                self.key_locks.pop(key, None)
+                self.readers[key] = reader
+                # The detector owner may be evicted too; the detector itself stays
+                # alive as long as any reader still references it
+                while len(self.readers) > self.max_readers:
+                    self.readers.popitem(last=False)
+            return reader
+
+    def warm_up(self, combos):
+        for langs in combos:
+            try:
+                self.get(langs)
+            except Exception as e:
+                print(f"Failed to warm up EasyOCR reader for {','.join(langs)}: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.readers.clear()
+
+
+# Shared by every Streamlit session and API request in this process
+reader_cache = ReaderCache()
+reader_cache.warm_up(parse_warmup_langs(DEFAULT_WARMUP_LANGS))
@@ -0,0 +1,84 @@
+from flask import Flask, request, jsonify
+import os
+import sys
+from cascade import Cascade, create_tiers, DEFAULT_ENGINES, DEFAULT_MIN_CONFIDENCE
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_bytes
+from ocr_common.preprocessing import get_pipeline, list_pipelines
+from ocr_common.layout import LAYOUT_VERSION
+from ocr_common.metrics import instrument_flask, record_stages, stage
+
+app = Flask(__name__)
+instrument_flask(app, 'gateway')
+
+# Load every configured engine once; the cascade escalates through them in order
+cascade = Cascade(create_tiers(DEFAULT_ENGINES), DEFAULT_MIN_CONFIDENCE)
+
+# Endpoint to list the engines in escalation order
+@app.route('/engines', methods=['GET'])
+def list_engines():
+    return jsonify({'engines': cascade.engine_names(), 'min_confidence': cascade.min_confidence,
+                    'thresholds': cascade.thresholds})
+
+# Endpoint to list the preprocessing presets and the default pipeline
+@app.route('/preprocess', methods=['GET'])
+def list_preprocessing():
+    return jsonify(list_pipelines('cascade'))
+
+# Endpoint to perform OCR through the engine cascade
+@app.route('/ocr', methods=['POST'])
+def ocr_service():
+    # The multipart body is parsed on first access to request.files
+    with stage('upload'):
+        files = request.files
+    if 'image' not in files:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    try:
+        min_confidence = float(request.form.get('min_confidence', cascade.min_confidence))
+    except ValueError:
+        return jsonify({'error': 'min_confidence must be a number'}), 400
+    try:
+        pipeline = get_pipeline('cascade', request.form.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    options = {
+        'tesseract_langs': request.form.get('tesseract_langs', 'eng'),
+        'easyocr_langs': request.form.get('easyocr_langs', 'en'),
+    }
+
+    image_data = files['image'].read()
+
+    # Repeat uploads are answered from the result cache
+    cache = get_result_cache()
+    cache_key = make_key('cascade', digest_bytes(image_data), engines=cascade.engine_names(),
+                         min_confidence=min_confidence, thresholds=cascade.thresholds, preprocess=pipeline.spec,
+                         layout=LAYOUT_VERSION, **options)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    timings = {}
+    try:
+        binary_image = pipeline.run(image_data, timings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        record_stages(timings)
+
+    try:
+        result = cascade.run(binary_image, min_confidence=min_confidence, **options)
+        cache.put(cache_key, result)
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Endpoint to report result cache hit/miss counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats())
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5003)
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from cascade import create_tiers, DEFAULT_ENGINES, CALIBRATION_PATH
+
+# Measure, for every cascade engine, the raw confidence from which its reads
+# are as accurate as the target CER over the benchmark corpus, and store it
+# where the gateway reads its per-engine thresholds. The engines' scores are
+# on different scales, so one shared threshold would escalate too much for
+# one engine and too little for another. Run it with the models the gateway serves.
+# Usage: python calibrate_cascade.py [--engines tesseract,easyocr] [--target-cer 0.05]
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCH_DIR)
+from accuracy import cer
+from corpus import build_corpus
+from run_benchmarks import git_commit, DEFAULT_CORPUS_DIR
+from ocr_common.preprocessing import get_pipeline
+from ocr_common.layout import paragraph_text
+
+# Function to read every sample with one engine, as (mean confidence, CER) pairs
+def measure(tier, samples, corpus_dir, pipeline):
+    measured = []
+    for sample in samples:
+        with open(os.path.join(corpus_dir, sample['file']), 'rb') as f:
+            image = pipeline.run(f.read())
+        lines = [(box, text, float(confidence)) for box, text, confidence in tier.recognize(image, {}) if text.strip()]
+        confidence = sum(line[2] for line in lines) / len(lines) if lines else 0.0
+        text = paragraph_text([line[0] for line in lines], [line[1] for line in lines]) if lines else ''
+        measured.append((confidence, cer(sample['text'], text)))
+    return measured
+
+# Function to find the lowest confidence whose reads at or above it average
+# at most target_cer, None when even the most confident reads miss it
+def find_threshold(measured, target_cer):
+    threshold = None
+    total = 0.0
+    for count, (confidence, error) in enumerate(sorted(measured, key=lambda pair: -pair[0]), 1):
+        total += error
+        if total / count <= target_cer:
+            threshold = confidence
+    return threshold
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', default=DEFAULT_ENGINES)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--target-cer', type=float, default=0.05)
+    parser.add_argument('--out', default=CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus)
+    manifest = build_corpus(corpus_dir, args.seed)
+    print(f"Corpus: {len(manifest['samples'])} samples in {corpus_dir}", file=sys.stderr)
+    pipeline = get_pipeline('cascade')
+
+    thresholds, summary = {}, {}
+    for tier in create_tiers(args.engines):
+        measured = measure(tier, manifest['samples'], corpus_dir, pipeline)
+        threshold = find_threshold(measured, args.target_cer)
+        kept = [error for confidence, error in measured if threshold is not None and confidence >= threshold]
+        summary[tier.name] = {'threshold': threshold, 'samples_at_or_above': len(kept),
+                              'cer_at_or_above': round(sum(kept) / len(kept), 4) if kept else None}
+        if threshold is None:
+            print(f"{tier.name}: no confidence reaches CER {args.target_cer}, keeping the shared threshold", file=sys.stderr)
+            continue
+        thresholds[tier.name] = round(threshold, 4)
+        print(f"{tier.name}: threshold {threshold:.4f}, {len(kept)}/{len(measured)} samples at or above it", file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version()},
+        'corpus': {'signature': manifest['signature'], 'samples': len(manifest['samples'])},
+        'target_cer': args.target_cer,
+        'thresholds': thresholds,
+        'engines': summary,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Thresholds written to {args.out}", file=sys.stderr)
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# The gateway reuses each engine's own modules, so their directories go on the path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for engine_dir in ('TesseractOCR', 'PaddleOCR', 'EasyOCR'):
+    path = os.path.join(ROOT_DIR, engine_dir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from ocr_common.layout import analyze, layout_paragraphs
+from ocr_common.metrics import record_stages, stage
+
+# Engines from cheapest to most expensive, and the confidence below which a
+# region is handed to the next engine, e.g. CASCADE_ENGINES="tesseract,easyocr"
+DEFAULT_ENGINES = os.environ.get('CASCADE_ENGINES', 'tesseract,paddle_slim,paddle_server,easyocr')
+DEFAULT_MIN_CONFIDENCE = float(os.environ.get('CASCADE_MIN_CONFIDENCE', '0.80'))
+CROP_PADDING = int(os.environ.get('CASCADE_CROP_PADDING', '4'))
+
+# The engines' scores are not on one scale, so each engine has its own raw
+# score that counts as DEFAULT_MIN_CONFIDENCE. calibrate_cascade.py measures
+# them over the benchmark corpus; CASCADE_THRESHOLDS="tesseract:0.9,easyocr:0.4"
+# overrides single engines. Engines with neither use the shared threshold.
+CALIBRATION_PATH = os.environ.get(
+    'CASCADE_CALIBRATION', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cascade_calibration.json'))
+
+# (det, rec) model pairs for the Paddle tiers, names from model_cache; tiers
+# whose models are not on disk are skipped
+PADDLE_TIERS = {
+    'paddle_slim': ('PP-OCRv2_slim_quant', 'en_number_mobile_v2.0_slim'),
+    'paddle_server': ('en_server_v2.0', 'en_server_v2.0'),
+}
+
+
+# Tesseract through the pooled engines, confidences are per text line
+class TesseractTier:
+    name = 'tesseract'
+
+    def __init__(self):
+        from engine_pool import TesseractEnginePool, parse_warmup_langs, DEFAULT_WARMUP_LANGS
+        self.pool = TesseractEnginePool()
+        self.pool.warm_up(parse_warmup_langs(DEFAULT_WARMUP_LANGS))
+
+    def recognize(self, image, options):
+        return self.pool.image_to_lines(image, options.get('tesseract_langs', 'eng'))
+
+
+# One det/rec pair from the Paddle model cache; all Paddle tiers share the cache
+class PaddleTier:
+    model_cache = None
+    cache_lock = threading.Lock()
+
+    def __init__(self, name, det, rec):
+        from model_store import ensure_models
+        from model_cache import ModelCache, list_models
+        with PaddleTier.cache_lock:
+            if PaddleTier.model_cache is None:
+                ensure_models()
+                PaddleTier.model_cache = ModelCache()
+        # Fail at startup, so create_tiers skips the tier, rather than on the first escalated region
+        models = list_models()
+        missing = [f'{kind} {name}' for kind, name in (('det', det), ('rec', rec)) if not models[kind].get(name)]
+        if missing:
+            raise FileNotFoundError(f"Model files not on disk: {', '.join(missing)}")
+        self.name = name
+        self.det = det
+        self.rec = rec
+        self.model_cache.get(det, rec)
+
+    def recognize(self, image, options):
+        with self.model_cache.use(self.det, self.rec) as entry:
+            return [(box, text, score) for box, (text, score) in entry.batcher.ocr(image, cls=True)[0]]
+
+
+# EasyOCR readers from the shared reader cache
+class EasyOCRTier:
+    name = 'easyocr'
+
+    def __init__(self):
+        from reader_cache import reader_cache
+        self.reader_cache = reader_cache
+
+    def recognize(self, image, options):
+        reader = self.reader_cache.get(options.get('easyocr_langs', 'en'))
+        return [([[float(x), float(y)] for x, y in box], text, float(prob)) for box, text, prob in reader.readtext(image)]
+
+
+# Function to build one tier by name
+def create_tier(name):
+    if name == 'tesseract':
+        return TesseractTier()
+    if name == 'easyocr':
+        return EasyOCRTier()
+    if name in PADDLE_TIERS:
+        det, rec = PADDLE_TIERS[name]
+        return PaddleTier(name, det, rec)
+    raise KeyError(f"Unknown engine '{name}', choose from {['tesseract', 'easyocr'] + sorted(PADDLE_TIERS)}")
+
+# Function to build the configured tiers, skipping engines that are not installed
+def create_tiers(names=DEFAULT_ENGINES):
+    tiers = []
+    for name in [name.strip() for name in names.split(',') if name.strip()]:
+        try:
+            start = time.perf_counter()
+            tiers.append(create_tier(name))
+            print(f"Cascade engine {name} ready in {time.perf_counter() - start:.3f}s")
+        except KeyError:
+            raise
+        except Exception as e:
+            print(f"Cascade engine {name} unavailable, skipping: {e}")
+    return tiers
+
+# Function to read the per-engine thresholds: measured ones first, then the
+# CASCADE_THRESHOLDS overrides
+def load_thresholds(path=CALIBRATION_PATH, overrides=None):
+    thresholds = {}
+    try:
+        with open(path, 'r') as f:
+            thresholds.update(json.load(f).get('thresholds', {}))
+    except (OSError, ValueError):
+        pass
+    overrides = os.environ.get('CASCADE_THRESHOLDS', '') if overrides is None else overrides
+    for item in [item.strip() for item in overrides.split(',') if item.strip()]:
+        name, _, value = item.partition(':')
+        try:
+            thresholds[name.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid CASCADE_THRESHOLDS entry '{item}', expected engine:value")
+    return thresholds
+
+# Function to map an engine's raw score onto the shared scale: the engine's
+# own threshold lands on the shared one, and the ranges below and above it
+# are stretched linearly onto [0, shared] and [shared, 1]
+def calibrate(confidence, threshold, shared):
+    if threshold is None or threshold == shared:
+        return confidence
+    if confidence < threshold:
+        return confidence / threshold * shared if threshold > 0 else shared
+    if threshold >= 1:
+        return shared
+    return min(shared + (confidence - threshold) / (1 - threshold) * (1 - shared), 1.0)
+
+# Function to crop the axis-aligned bounds of a region, with a little margin
+def crop_region(image, box, padding=CROP_PADDING):
+    h, w = image.shape[:2]
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    x0 = max(int(min(xs)) - padding, 0)
+    y0 = max(int(min(ys)) - padding, 0)
+    x1 = min(int(max(xs)) + padding, w)
+    y1 = min(int(max(ys)) + padding, h)
+    return image[y0:y1, x0:x1]
+
+# Function to order regions by the shared layout: column by column, top to
+# bottom, then left to right within a line
+def reading_order(regions):
+    layout = analyze([region['box'] for region in regions])
+    return [regions[index] for index in layout['order']]
+
+def mean_confidence(regions):
+    return sum(region['confidence'] for region in regions) / len(regions) if regions else 0.0
+
+
+# Runs the cheapest engine on the whole image, then re-reads only the regions
+# still uncertain with each heavier engine in turn; the next engine reads the
+# whole page only when the previous one found no text at all. Region
+# confidences are calibrated per engine ('engine_confidence' keeps the raw
+# score), and a heavier read replaces a region only when it is more confident.
+class Cascade:
+    def __init__(self, tiers, min_confidence=DEFAULT_MIN_CONFIDENCE, thresholds=None):
+        if not tiers:
+            raise ValueError('The cascade needs at least one engine')
+        self.tiers = tiers
+        self.min_confidence = min_confidence
+        self.thresholds = load_thresholds() if thresholds is None else thresholds
+
+    def engine_names(self):
+        return [tier.name for tier in self.tiers]
+
+    def to_regions(self, lines, engine):
+        threshold = self.thresholds.get(engine)
+        return [{'box': [[float(x), float(y)] for x, y in box], 'text': text,
+                 'confidence': calibrate(float(confidence), threshold, self.min_confidence),
+                 'engine_confidence': float(confidence), 'engine': engine}
+                for box, text, confidence in lines if text.strip()]
+
+    def run(self, image, min_confidence=None, **options):
+        threshold = self.min_confidence if min_confidence is None else min_confidence
+        timings = {}
+        regions = []
+        page_engines = []
+        tier_index = 0
+
+        # Whole-page pass: a page an engine finds no text on goes to the next engine
+        while tier_index < len(self.tiers) and not regions:
+            tier = self.tiers[tier_index]
+            start = time.perf_counter()
+            regions = self.to_regions(tier.recognize(image, options), tier.name)
+            timings[tier.name] = timings.get(tier.name, 0.0) + time.perf_counter() - start
+            page_engines.append(tier.name)
+            tier_index += 1
+
+        # Region pass: each heavier engine only sees the crops still below the threshold
+        for tier in self.tiers[tier_index:]:
+            uncertain = [region for region in regions if region['confidence'] < threshold]
+            if not uncertain:
+                break
+            start = time.perf_counter()
+            for region in uncertain:
+                crop = crop_region(image, region['box'])
+                if crop.size == 0:
+                    continue
+                candidates = self.to_regions(tier.recognize(crop, options), tier.name)
+                if not candidates:
+                    continue
+                confidence = mean_confidence(candidates)
+                if confidence > region['confidence']:
+                    region['text'] = ' '.join(candidate['text'] for candidate in reading_order(candidates))
+                    region['confidence'] = confidence
+                    region['engine_confidence'] = sum(c['engine_confidence'] for c in candidates) / len(candidates)
+                    region['engine'] = tier.name
+            timings[tier.name] = timings.get(tier.name, 0.0) + time.perf_counter() - start
+
+        with stage('layout'):
+            layout = analyze([region['box'] for region in regions])
+            paragraphs = layout_paragraphs([region['text'] for region in regions], layout)
+            regions = [regions[index] for index in layout['order']]
+        record_stages({f'tier_{name}': seconds for name, seconds in timings.items()})
+        engines_used = {}
+        for region in regions:
+            engines_used[region['engine']] = engines_used.get(region['engine'], 0) + 1
+        return {
+            'recognized_text': '\n\n'.join(paragraphs),
+            'regions': regions,
+            'engines_used': engines_used,
+            'page_engines': page_engines,
+            'low_confidence_regions': sum(1 for region in regions if region['confidence'] < threshold),
+            'timings': {name: round(seconds, 4) for name, seconds in timings.items()},
+        }
@@ -1,132 +1,154 @@
 from flask import Flask, request, jsonify
-from paddleocr import PaddleOCR
-import shutil
-import uuid
 import os
-import cv2
-import urllib.request
-import tarfile
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+import sys
+import time
+from model_store import ensure_models, is_complete
+from model_cache import ModelCache, list_models, resolve_models, DET_MODELS, REC_MODELS
+from tiling import TILING_MODES, DEFAULT_TILING, tiles_needed
+from profiles import resolve_profile, list_profiles
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_bytes
+from ocr_common.preprocessing import get_pipeline, list_pipelines, encoded_size
+from ocr_common.layout import paragraph_text, LAYOUT_VERSION
+from ocr_common.metrics import instrument_flask, register_callback, record_stages, stage
 
 app = Flask(__name__)
-
-# Clean the cache to avoid corrupted files issue
-cache_dir = os.path.expanduser('~/.paddleocr')
-
-def remove_readonly(func, path, _):
-    os.chmod(path, 0o777)
-    func(path)
-
-if os.path.exists(cache_dir):
-    try:
-        shutil.rmtree(cache_dir, onerror=remove_readonly)
-    except PermissionError as e:
-        print(f"PermissionError encountered while deleting cache directory: {e}")
-
-# Model download links
-model_urls = {
-    'det': 'https://paddleocr.bj.bcebos.com/dygraph_v2.0/en/en_ppocr_server_v2.0_det_infer.tar',
-    'rec': 'https://paddleocr.bj.bcebos.com/dygraph_v2.0/en/en_ppocr_server_v2.0_rec_infer.tar',
-    'cls': 'https://paddleocr.bj.bcebos.com/dygraph_v2.0/ch/ch_ppocr_mobile_v2.0_cls_infer.tar'
-}
-
-# Download and extract models
-def download_and_extract(url, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    filename = url.split('/')[-1]
-    filepath = os.path.join(output_dir, filename)
-    
-    if not os.path.exists(filepath):
-        print(f"Downloading {filename}...")
-        urllib.request.urlretrieve(url, filepath)
-        print(f"Downloaded {filename}")
-
-    print(f"Extracting {filename}...")
-    with tarfile.open(filepath, 'r') as tar:
-        tar.extractall(path=output_dir)
-    print(f"Extracted {filename}")
-
-# Check and download models
-def check_and_download_models():
-    model_dirs = {
-        'det': 'ch_ppstructure_mobile_v2.0_SLANet_infer',
-        'rec': 'models/rec/en_PP-OCRv4_rec_infer'
-    }
-    for key, model_dir in model_dirs.items():
-        if not os.path.exists(model_dir):
-            download_and_extract(model_urls[key], model_dir)
-
-# Perform model check and download
-check_and_download_models()
-
-# Global variable for caching the OCR model
-ocr_model_cache = None
-
-# Function to load the OCR model with caching
-def load_ocr_model():
-    global ocr_model_cache
-    if ocr_model_cache is not None:
-        return ocr_model_cache
-    
-    det_model_dir = 'models/det/ch_ppstructure_mobile_v2.0_SLANet_infer'
-    rec_model_dir = 'models/rec/en_PP-OCRv4_rec_infer'
-    
-    ocr_model_cache = PaddleOCR(
-        use_angle_cls=True, 
-        lang='en', 
-        det_model_dir=det_model_dir, 
-        rec_model_dir=rec_model_dir
-    )
-    return ocr_model_cache
-
-# Load the OCR model initially
-load_ocr_model()
-
-# Function to preprocess the image for better OCR results
-def preprocess_image(image_path):
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    _, binary_image = cv2.threshold(image, 150, 255, cv2.THRESH_BINARY_INV)
-    binary_image = cv2.cvtColor(binary_image, cv2.COLOR_GRAY2RGB)  # Convert back to RGB
-    return binary_image
-
-# Function to run inference using the cached OCR model
-def inference(img_path):
-    ocr = load_ocr_model()
-    image = cv2.imread(img_path)  # Read the processed image
-    result = ocr.ocr(image, cls=True)  # Pass image array directly
-    
-    # Extract text from OCR result and merge it into a single paragraph
-    merged_text = ""
-    for line in result[0]:  # result[0] contains the OCR text lines
-        merged_text += line[1][0] + " "  # line[1][0] is the recognized text
-
-    merged_text = merged_text.strip()  # Remove trailing spaces
-    return merged_text
+instrument_flask(app, 'paddleocr')
+
+# Extract bundled model archives once; the ~/.paddleocr cache is kept between runs
+ensure_models()
+
+# LRU cache of model pipelines, each loaded on first request
+model_cache = ModelCache()
+
+# Load the default OCR model initially
+start = time.perf_counter()
+model_cache.get()
+print(f"Default OCR model ready in {time.perf_counter() - start:.3f}s")
+
+# Function to decode and preprocess the upload with the requested pipeline
+def preprocess_image(image_data, preprocess=None):
+    return get_pipeline('paddleocr', preprocess).run(image_data)  # Single channel, expanded to BGR by the batcher
+
+# Function to run inference using the cached OCR model for the chosen det/rec/cls and backend;
+# a profile from resolve_profile supplies the models not chosen and the speed/quality settings
+def inference(image, det_model=None, rec_model=None, cls_model=None, backend=None, tiling=None, profile=None):
+    profile = profile or {}
+    # Crops are recognised in shared batches
+    with model_cache.use(det_model or profile.get('det'), rec_model or profile.get('rec'), cls_model, backend) as entry:
+        result = entry.batcher.ocr(image, cls=profile.get('cls', True), tiling=tiling,
+                                   det_limit=profile.get('det_limit'), rec_batch=profile.get('rec_batch'))
+
+    # Rebuild paragraphs in reading order; result[0] holds the (box, (text, confidence)) lines
+    lines = result[0] or []
+    with stage('layout'):
+        return paragraph_text([line[0] for line in lines], [line[1][0] for line in lines])
+
+# Endpoint to list the selectable models
+@app.route('/models', methods=['GET'])
+def list_available_models():
+    return jsonify(list_models())
+
+# Function to tell whether the models a profile names are on disk; None
+# stands for the server default, which is loaded the same way as for
+# requests without a profile and so is not checked
+def models_available(det, rec):
+    return (det is None or is_complete(DET_MODELS[det])) and (rec is None or is_complete(REC_MODELS[rec]['dir']))
+
+# Endpoint to list the request profiles with their settings, whether their
+# models are on disk and the latency/accuracy bench_profiles.py measured
+@app.route('/profiles', methods=['GET'])
+def list_request_profiles():
+    return jsonify(list_profiles(models_available))
+
+# Endpoint to list the preprocessing presets and the default pipeline
+@app.route('/preprocess', methods=['GET'])
+def list_preprocessing():
+    return jsonify(list_pipelines('paddleocr'))
 
 @app.route('/ocr', methods=['POST'])
 def ocr_service():
-    if 'image' not in request.files:
+    # The multipart body is parsed on first access to request.files
+    with stage('upload'):
+        files = request.files
+    if 'image' not in files:
         return jsonify({'error': 'No image file provided'}), 400
 
-    image_file = request.files['image']
-
-    with TemporaryDirectory() as temp_dir:
-        unique_filename = os.path.join(temp_dir, str(uuid.uuid4()) + '.jpg')
-        image_file.save(unique_filename)
-
-        # Preprocess the image
-        binary_image = preprocess_image(unique_filename)
-        processed_image_path = unique_filename.replace('.jpg', '_processed.jpg')
-        cv2.imwrite(processed_image_path, binary_image)
-
-        # Run OCR
-        try:
-            paragraph_text = inference(processed_image_path)
-            return jsonify({'recognized_text': paragraph_text})
+    # Models named in the form take precedence over those of the profile
+    try:
+        profile = resolve_profile(request.form.get('profile'))
+        det_model, rec_model, cls_model, backend = resolve_models(
+            request.form.get('det_model') or (profile and profile['det']),
+            request.form.get('rec_model') or (profile and profile['rec']),
+            request.form.get('cls_model'), request.form.get('backend'))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+    if profile and not models_available(None if request.form.get('det_model') else profile['det'],
+                                        None if request.form.get('rec_model') else profile['rec']):
+        return jsonify({'error': f"Profile '{profile['name']}' needs models that are not on disk, see /profiles"}), 400
+    tiling = request.form.get('tiling', DEFAULT_TILING)
+    if tiling not in TILING_MODES:
+        return jsonify({'error': f"Unknown tiling mode '{tiling}', choose from {list(TILING_MODES)}"}), 400
+
+    image_data = files['image'].read()
+
+    # Tiling is decided from the size the page will have after preprocessing,
+    # predicted from the encoded header, and the profile's detector limit;
+    # pages that will be tiled are decoded at full resolution instead of the
+    # detector-sized default
+    try:
+        tiled_pipeline = get_pipeline('paddleocr_tiled', request.form.get('preprocess'))
+        size = encoded_size(image_data)
+        use_tiles = tiling == 'on' or (tiling == 'auto' and size is not None and tiles_needed(
+            tiled_pipeline.output_side(max(size)), 'auto', profile and profile['det_limit']))
+        pipeline = tiled_pipeline if use_tiles else get_pipeline('paddleocr', request.form.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Repeat uploads are answered from the result cache
+    cache = get_result_cache()
+    cache_key = make_key('paddleocr', digest_bytes(image_data), det=det_model, rec=rec_model,
+                         cls=cls_model, backend=backend, preprocess=pipeline.spec, tiled=use_tiles,
+                         layout=LAYOUT_VERSION, profile=profile)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return jsonify({'recognized_text': cached})
+
+    # Decode and preprocess the upload in memory
+    timings = {}
+    try:
+        binary_image = pipeline.run(image_data, timings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        record_stages(timings)
 
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+    # Run OCR
+    try:
+        paragraph_text = inference(binary_image, det_model, rec_model, cls_model, backend,
+                                   'on' if use_tiles else 'off', profile)
+        cache.put(cache_key, paragraph_text)
+        return jsonify({'recognized_text': paragraph_text})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Function to count requests waiting for the recognition batchers of the loaded models
+def recognition_queue_depth():
+    with model_cache.lock:
+        entries = list(model_cache.entries.values())
+    return {('recognition',): sum(entry.batcher.queue_depth() for entry in entries)}
+
+register_callback('ocr_queue_depth', 'Work waiting for or running on a worker', recognition_queue_depth,
+                  label_names=('queue',))
+register_callback('ocr_model_cache_lookups_total', 'Engine and model cache lookups by outcome',
+                  lambda: {('hit',): model_cache.hits, ('miss',): model_cache.misses}, 'counter', ('result',))
+
+# Endpoint to report result cache hit/miss counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats())
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from tiling import TiledDetector
+from profiles import angle_cls_flags
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.metrics import stage
+
+# Micro-batching limits, a batch is flushed when either one is reached
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get('PADDLE_MAX_BATCH_SIZE', '32'))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get('PADDLE_MAX_WAIT_MS', '10'))
+
+# Function to sort detected boxes top to bottom, left to right
+def sorted_boxes(dt_boxes):
+    boxes = sorted(dt_boxes, key=lambda x: (x[0][1], x[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+# Function to cut a perspective-corrected text crop out of the image
+def get_rotate_crop_image(img, points):
+    points = np.asarray(points, dtype=np.float32)
+    crop_width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    crop_height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    crop_width, crop_height = max(crop_width, 1), max(crop_height, 1)
+    pts_std = np.float32([[0, 0], [crop_width, 0], [crop_width, crop_height], [0, crop_height]])
+    matrix = cv2.getPerspectiveTransform(points, pts_std)
+    dst_img = cv2.warpPerspective(
+        img, matrix, (crop_width, crop_height),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    # Vertical text is rotated so the recogniser reads it left to right
+    if dst_img.shape[0] * 1.0 / dst_img.shape[1] >= 1.5:
+        dst_img = np.rot90(dst_img)
+    return dst_img
+
+# Function to temporarily set an attribute on some predictor objects, putting
+# the previous values back afterwards
+@contextmanager
+def overridden(objects, name, value):
+    saved = [(obj, getattr(obj, name)) for obj in objects]
+    try:
+        for obj, _ in saved:
+            setattr(obj, name, value)
+        yield
+    finally:
+        for obj, previous in saved:
+            setattr(obj, name, previous)
+
+# Function to find where a detector keeps its input size limit: the ONNX
+# detector holds it, Paddle's has it on the resize step of its preprocess ops
+def resize_limit_holders(detector):
+    holders = [op for op in getattr(detector, 'preprocess_op', None) or [] if hasattr(op, 'limit_side_len')]
+    if hasattr(detector, 'limit_side_len'):
+        holders.append(detector)
+    return holders
+
+# Function to get the recogniser's batch size setting, named differently by the two backends
+def batch_size_attribute(recognizer):
+    return 'rec_batch_num' if hasattr(recognizer, 'rec_batch_num') else 'batch_num'
+
+
+# Collects text crops from concurrent requests and runs cls/rec on shared batches
+class RecognitionBatcher:
+    def __init__(self, ocr, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.pipeline = ocr
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        # The detector predictor is not safe to call from several threads
+        self.det_lock = threading.Lock()
+        # Large pages are detected tile by tile on a pool of extra predictors
+        self.tiler = TiledDetector(ocr)
+        self.start_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    # The worker thread is started lazily so the batcher survives a fork;
+    # callers must hold start_lock
+    def _ensure_started(self):
+        if self.thread is None or self.pid != os.getpid():
+            if self.pid != os.getpid():
+                self.queue = queue.Queue()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    # use_cls is True or False for all crops, or a list with one flag per crop;
+    # rec_batch caps the recogniser's batch size for the shared batch
+    def submit(self, crops, use_cls=True, rec_batch=None):
+        future = Future()
+        with self.start_lock:
+            self._ensure_started()
+            self.queue.put((crops, use_cls, future, rec_batch))
+        return future
+
+    # Stop the worker thread once the queued work is done
+    def close(self):
+        self.queue.put(None)
+        self.tiler.close()
+
+    # Function to gather requests until the batch is full or the wait expires
+    def _collect_batch(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Handle the close request after this batch
+                self.queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                with self.start_lock:
+                    if self.queue.empty():
+                        self.thread = None
+                        return
+                continue
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process_batch(self, batch):
+        crops = [crop for item in batch for crop in item[0]]
+
+        # Angle classification only for the crops of requests that asked for it
+        if getattr(self.pipeline, 'use_angle_cls', False):
+            cls_positions = []
+            offset = 0
+            for crop_list, use_cls, _, _ in batch:
+                flags = use_cls if isinstance(use_cls, list) else [use_cls] * len(crop_list)
+                cls_positions.extend(offset + index for index, flag in enumerate(flags) if flag)
+                offset += len(crop_list)
+            if cls_positions:
+                with stage('angle_classification'):
+                    rotated, _, _ = self.pipeline.text_classifier([crops[i] for i in cls_positions])
+                for position, crop in zip(cls_positions, rotated):
+                    crops[position] = crop
+
+        # The smallest batch size any request asked for applies to the whole
+        # batch; only this thread calls the recogniser, so setting it is safe
+        recognizer = self.pipeline.text_recognizer
+        rec_batches = [item[3] for item in batch if item[3]]
+        with stage('recognition'):
+            if not crops:
+                rec_res = []
+            elif rec_batches:
+                with overridden([recognizer], batch_size_attribute(recognizer), min(rec_batches)):
+                    rec_res, _ = recognizer(crops)
+            else:
+                rec_res, _ = recognizer(crops)
+
+        # Route results back to each request in submission order
+        offset = 0
+        for crop_list, _, future, _ in batch:
+            future.set_result(rec_res[offset:offset + len(crop_list)])
+            offset += len(crop_list)
+
+    # det_limit replaces the detector's input size limit for this call; tiles
+    # are detected at their own size
+    def detect(self, image, tiling=None, det_limit=None):
+        if self.tiler.should_tile(image, tiling, det_limit):
+            return sorted_boxes(self.tiler.detect(image))
+        detector = self.pipeline.text_detector
+        with self.det_lock:
+            if det_limit:
+                holders = resize_limit_holders(detector)
+                with overridden(holders, 'limit_side_len', det_limit), \
+                        overridden([h for h in holders if hasattr(h, 'limit_type')], 'limit_type', 'max'):
+                    dt_boxes, _ = detector(image)
+            else:
+                dt_boxes, _ = detector(image)
+        if dt_boxes is None:
+            return []
+        return sorted_boxes(dt_boxes)
+
+    # Same contract as PaddleOCR.ocr for a single image; cls may also be
+    # 'always', 'never' or 'auto' (see profiles.py), det_limit and rec_batch
+    # override the detector input size and recognition batch size
+    def ocr(self, image, cls=True, tiling=None, det_limit=None, rec_batch=None):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        with stage('detection'):
+            dt_boxes = self.detect(image, tiling, det_limit)
+        with stage('crop'):
+            crops = [get_rotate_crop_image(image, box) for box in dt_boxes]
+        use_cls = angle_cls_flags(dt_boxes, cls)
+        # Classification and recognition run on the batcher thread, shared with
+        # other requests; a request sees the time until its batch is done
+        with stage('recognition_wait'):
+            rec_res = self.submit(crops, use_cls, rec_batch).result() if crops else []
+
+        drop_score = getattr(self.pipeline, 'drop_score', 0.5)
+        lines = []
+        for box, (text, score) in zip(dt_boxes, rec_res):
+            if score >= drop_score:
+                lines.append([np.asarray(box).tolist(), (text, score)])
+        return [lines]
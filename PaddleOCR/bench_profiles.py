@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from profiles import PROFILES, PROFILE_RESULTS_PATH
+
+# Measure latency and accuracy of every request profile over the benchmark
+# corpus and store them where the /profiles endpoint reads them, so clients
+# can pick a point on the speed/quality curve. Each profile runs in its own
+# process through benchmarks/run_benchmarks.py; run it on the serving hardware.
+# Usage: python bench_profiles.py [--profiles fast,accurate] [--out profiles_measured.json]
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCH_DIR)
+from corpus import build_corpus
+from run_benchmarks import run_worker, git_commit, DEFAULT_CORPUS_DIR
+
+# Function to keep the numbers a client needs to choose a profile
+def summarize(result):
+    total = result['latency']['total']
+    return {
+        'images_per_sec': result['images_per_sec'],
+        'p50_ms': total['p50_ms'],
+        'p95_ms': total['p95_ms'],
+        'p99_ms': total['p99_ms'],
+        'cer': result['cer'],
+        'wer': result['wer'],
+        'cer_by_rotation': result['cer_by_variation']['rotation'],
+        'peak_rss_mb': result['peak_rss_mb'],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--out', default=PROFILE_RESULTS_PATH)
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus)
+    manifest = build_corpus(corpus_dir, args.seed)
+    print(f"Corpus: {len(manifest['samples'])} samples in {corpus_dir}", file=sys.stderr)
+
+    measured = {}
+    for name in [name.strip() for name in args.profiles.split(',') if name.strip()]:
+        if name not in PROFILES:
+            sys.exit(f"Unknown profile '{name}', choose from {list(PROFILES)}")
+        print(f"Running profile {name}", file=sys.stderr)
+        result = run_worker(['--worker', json.dumps({'engine': 'paddle', 'profile': name}),
+                             '--corpus', corpus_dir, '--warmup', str(args.warmup)])
+        if result is None:
+            print("  failed, see output above (are its models bundled?)", file=sys.stderr)
+            continue
+        measured[name] = summarize(result)
+
+    if not measured:
+        sys.exit("No profile could be measured")
+
+    print(f"{'profile':>10} {'images/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'CER':>8} {'WER':>8}")
+    for name, numbers in measured.items():
+        print(f"{name:>10} {numbers['images_per_sec']:>10} {numbers['p50_ms']:>10.1f} {numbers['p95_ms']:>10.1f} "
+              f"{numbers['cer']:>8.4f} {numbers['wer']:>8.4f}")
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpu_count': os.cpu_count()},
+        'corpus': {'signature': manifest['signature'], 'samples': len(manifest['samples'])},
+        'profiles': measured,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Measurements written to {args.out}", file=sys.stderr)
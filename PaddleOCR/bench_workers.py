@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import uuid
+import signal
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Measure PaddleAPI throughput against the number of pre-forked workers
+# Usage: python bench_workers.py image.jpg --workers 1 2 4 8 --duration 30
+
+# Function to build a multipart/form-data body with one image field
+def encode_multipart(image_path):
+    boundary = uuid.uuid4().hex
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{os.path.basename(image_path)}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+# Function to wait until the server answers on /models
+def wait_ready(base_url, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/models', timeout=2).read()
+            return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(1)
+    return False
+
+# Function to sum the proportional set size of the master and its workers
+def total_pss_mb(master_pid):
+    pids = [master_pid]
+    try:
+        pids += [int(p) for p in open(f'/proc/{master_pid}/task/{master_pid}/children').read().split()]
+    except OSError:
+        return None
+    total = 0
+    for pid in pids:
+        try:
+            for line in open(f'/proc/{pid}/smaps_rollup'):
+                if line.startswith('Pss:'):
+                    total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+def post_image(url, body, content_type):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - start
+
+# Function to keep `concurrency` requests in flight for `duration` seconds
+def drive_load(url, body, content_type, concurrency, duration):
+    deadline = time.monotonic() + duration
+    latencies = []
+
+    def client():
+        while time.monotonic() < deadline:
+            latencies.append(post_image(url, body, content_type))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return latencies
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='Request threads per worker')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--port', type=int, default=5101)
+    args = parser.parse_args()
+
+    body, content_type = encode_multipart(args.image)
+    base_url = f'http://127.0.0.1:{args.port}'
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"{'workers':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'PSS MB':>8}")
+    for workers in args.workers:
+        env = dict(os.environ, PADDLE_WORKERS=str(workers), PADDLE_WORKER_THREADS=str(args.threads),
+                   PADDLE_BIND=f'127.0.0.1:{args.port}')
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'PaddleAPI:app'],
+                                  cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(base_url):
+                print(f"{workers:>8} server did not start")
+                continue
+            post_image(base_url + '/ocr', body, content_type)  # warm-up
+            latencies = np.array(drive_load(base_url + '/ocr', body, content_type, workers * args.threads, args.duration))
+            pss = total_pss_mb(server.pid)
+            print(f"{workers:>8} {len(latencies) / args.duration:>8.2f} {np.percentile(latencies, 50) * 1000:>8.0f} "
+                  f"{np.percentile(latencies, 95) * 1000:>8.0f} {pss if pss is not None else float('nan'):>8.0f}")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
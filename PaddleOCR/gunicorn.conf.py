@@ -0,0 +1,35 @@
+import gc
+import os
+
+# Pre-fork production server for PaddleAPI:
+#   PADDLE_WORKERS=4 gunicorn -c gunicorn.conf.py PaddleAPI:app
+# The app (and the default model) is imported once in the master, then
+# workers are forked and share the model weights copy-on-write.
+
+cores = os.cpu_count() or 1
+workers = int(os.environ.get('PADDLE_WORKERS', cores))
+os.environ['PADDLE_WORKERS'] = str(workers)
+
+# Each worker gets its share of the cores for intra-op parallelism; this has
+# to be set before paddle is imported by the preloaded app
+intra_op_threads = os.environ.setdefault('PADDLE_CPU_THREADS', str(max(1, cores // workers)))
+for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+    os.environ.setdefault(name, intra_op_threads)
+
+bind = os.environ.get('PADDLE_BIND', '0.0.0.0:5001')
+preload_app = os.environ.get('PADDLE_PRELOAD', '1') == '1'
+
+# Request threads per worker let concurrent requests meet in the recognition batcher
+worker_class = 'gthread'
+threads = int(os.environ.get('PADDLE_WORKER_THREADS', '4'))
+timeout = int(os.environ.get('PADDLE_WORKER_TIMEOUT', '120'))
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the GC's reach so collections
+    # in the workers do not touch (and copy) the shared pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    if preload_app:
+        import PaddleAPI
+        PaddleAPI.model_cache.reset_after_fork()
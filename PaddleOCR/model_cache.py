@@ -0,0 +1,268 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from paddleocr import PaddleOCR
+from model_store import MODELS_DIR, model_path, is_complete, onnx_model_path
+from batching import RecognitionBatcher, DEFAULT_MAX_BATCH_SIZE
+
+CHAR_DICT_DIR = os.path.join(MODELS_DIR, 'char_dict')
+
+# Detectors bundled under models/det
+DET_MODELS = {
+    'SLANet_mobile_v2.0': model_path('det', 'ch_ppstructure_mobile_v2.0_SLANet_infer'),
+    'mobile_v2.0': model_path('det', 'ch_ppocr_mobile_v2.0_det_infer'),
+    'server_v2.0': model_path('det', 'ch_ppocr_server_v2.0_det_infer'),
+    'en_server_v2.0': model_path('det', 'en_ppocr_server_v2.0_det_infer'),
+    'PP-OCRv2_slim_quant': model_path('det', 'ch_PP-OCRv2_det_slim_quant_infer'),
+    'en_PP-OCRv3': model_path('det', 'en_PP-OCRv3_det_infer'),
+    'PP-OCRv4': model_path('det', 'ch_PP-OCRv4_det_infer'),
+}
+
+# Recognisers bundled under models/rec, with the dictionary and input shape each was trained with
+REC_MODELS = {
+    'en_PP-OCRv4': {'dir': model_path('rec', 'en_PP-OCRv4_rec_infer'), 'char_dict': 'en_dict.txt', 'ocr_version': 'PP-OCRv4'},
+    'en_PP-OCRv3': {'dir': model_path('rec', 'en_PP-OCRv3_rec_infer'), 'char_dict': 'en_dict.txt', 'ocr_version': 'PP-OCRv3'},
+    'en_server_v2.0': {'dir': model_path('rec', 'en_ppocr_server_v2.0_rec_infer'), 'char_dict': 'en_dict.txt', 'ocr_version': 'PP-OCR'},
+    'ch_mobile_v2.0': {'dir': model_path('rec', 'ch_ppocr_mobile_v2.0_rec_infer'), 'char_dict': 'ppocr_keys_v1.txt', 'ocr_version': 'PP-OCR'},
+    'en_number_mobile_v2.0': {'dir': model_path('rec', 'en_number_mobile_v2.0_rec_infer'), 'char_dict': 'en_dict.txt', 'ocr_version': 'PP-OCR'},
+    'en_number_mobile_v2.0_slim': {'dir': model_path('rec', 'en_number_mobile_v2.0_rec_slim_infer'), 'char_dict': 'en_dict.txt', 'ocr_version': 'PP-OCR'},
+}
+
+# Angle classifiers; 'none' disables angle classification entirely
+CLS_MODELS = {
+    'mobile_v2.0': model_path('cls', 'ch_ppocr_mobile_v2.0_cls_infer'),
+    'none': None,
+}
+
+# Inference backends: the native Paddle predictor or ONNX Runtime on exported models
+BACKENDS = ('paddle', 'onnx')
+
+DEFAULT_BACKEND = os.environ.get('PADDLE_BACKEND', 'paddle')
+DEFAULT_DET_MODEL = os.environ.get('PADDLE_DET_MODEL', 'SLANet_mobile_v2.0')
+DEFAULT_REC_MODEL = os.environ.get('PADDLE_REC_MODEL', 'en_PP-OCRv4')
+DEFAULT_CLS_MODEL = os.environ.get('PADDLE_CLS_MODEL', 'mobile_v2.0')
+
+# Intra-op threads per predictor; with several pre-forked workers each one gets
+# its share of the cores so workers x threads matches the machine
+SERVER_WORKERS = int(os.environ.get('PADDLE_WORKERS', '1'))
+DEFAULT_CPU_THREADS = int(os.environ.get('PADDLE_CPU_THREADS', max(1, (os.cpu_count() or 1) // SERVER_WORKERS)))
+
+# Cache limits: resident set size budget and a hard cap on loaded pipelines
+DEFAULT_RSS_BUDGET_MB = int(os.environ.get('PADDLE_MODEL_CACHE_MB', '2048'))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('PADDLE_MODEL_CACHE_SIZE', '4'))
+
+# Function to read the current resident set size of this process in bytes
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+# Function to list the catalogue with on-disk availability, for the /models endpoint
+def list_models():
+    return {
+        'det': {name: is_complete(path) for name, path in DET_MODELS.items()},
+        'rec': {name: is_complete(spec['dir']) for name, spec in REC_MODELS.items()},
+        'cls': {name: path is None or is_complete(path) for name, path in CLS_MODELS.items()},
+        'backends': list(BACKENDS),
+        'defaults': {'det': DEFAULT_DET_MODEL, 'rec': DEFAULT_REC_MODEL, 'cls': DEFAULT_CLS_MODEL, 'backend': DEFAULT_BACKEND},
+    }
+
+# Function to validate a (det, rec, cls, backend) choice, filling in defaults
+def resolve_models(det=None, rec=None, cls=None, backend=None):
+    requested_cls = cls
+    det = det or DEFAULT_DET_MODEL
+    rec = rec or DEFAULT_REC_MODEL
+    cls = cls or DEFAULT_CLS_MODEL
+    if det not in DET_MODELS:
+        raise KeyError(f"Unknown det model '{det}', choose from {sorted(DET_MODELS)}")
+    if rec not in REC_MODELS:
+        raise KeyError(f"Unknown rec model '{rec}', choose from {sorted(REC_MODELS)}")
+    if cls not in CLS_MODELS:
+        raise KeyError(f"Unknown cls model '{cls}', choose from {sorted(CLS_MODELS)}")
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise KeyError(f"Unknown backend '{backend}', choose from {list(BACKENDS)}")
+    if backend == 'onnx':
+        for kind, name, model_dir in (('det', det, DET_MODELS[det]), ('rec', rec, REC_MODELS[rec]['dir'])):
+            if not os.path.exists(onnx_model_path(model_dir)):
+                raise KeyError(f"{kind} model '{name}' has no ONNX export, run onnx_convert.py or use backend=paddle")
+        # A classifier without an export is skipped when it is only the
+        # default, and refused when the request named it
+        if cls != 'none' and not os.path.exists(onnx_model_path(CLS_MODELS[cls])):
+            if requested_cls:
+                raise KeyError(f"cls model '{cls}' has no ONNX export, use cls_model=none or backend=paddle")
+            cls = 'none'
+    return det, rec, cls, backend
+
+# Function to get the recogniser input shape from the OCR version it belongs to
+def rec_image_shape(rec):
+    if REC_MODELS[rec]['ocr_version'] in ('PP-OCRv3', 'PP-OCRv4'):
+        return (3, 48, 320)
+    return (3, 32, 320)
+
+# Function to build an ONNX Runtime pipeline from the exported artifacts
+def create_onnx_ocr(det, rec, cls, **kwargs):
+    from onnx_engine import OnnxOCR  # onnxruntime is only needed for this backend
+    rec_spec = REC_MODELS[rec]
+    cls_file = onnx_model_path(CLS_MODELS[cls]) if cls != 'none' else None
+    options = dict(rec_batch_num=DEFAULT_MAX_BATCH_SIZE, cls_batch_num=DEFAULT_MAX_BATCH_SIZE)
+    options.update(kwargs)
+    return OnnxOCR(
+        onnx_model_path(DET_MODELS[det]),
+        onnx_model_path(rec_spec['dir']),
+        os.path.join(CHAR_DICT_DIR, rec_spec['char_dict']),
+        cls_model_file=cls_file,
+        rec_image_shape=rec_image_shape(rec),
+        **options
+    )
+
+# Function to build a PaddleOCR pipeline for one model combination
+def create_ocr(det, rec, cls, backend='paddle', **kwargs):
+    if backend == 'onnx':
+        return create_onnx_ocr(det, rec, cls, **kwargs)
+    rec_spec = REC_MODELS[rec]
+    cls_dir = CLS_MODELS[cls]
+    options = dict(
+        use_angle_cls=cls != 'none',
+        lang='en',
+        ocr_version=rec_spec['ocr_version'],
+        det_model_dir=DET_MODELS[det],
+        rec_model_dir=rec_spec['dir'],
+        rec_char_dict_path=os.path.join(CHAR_DICT_DIR, rec_spec['char_dict']),
+        rec_batch_num=DEFAULT_MAX_BATCH_SIZE,
+        cls_batch_num=DEFAULT_MAX_BATCH_SIZE,
+        cpu_threads=DEFAULT_CPU_THREADS,
+    )
+    # Without a local copy PaddleOCR fetches the same classifier into ~/.paddleocr
+    if cls_dir is not None and is_complete(cls_dir):
+        options['cls_model_dir'] = cls_dir
+    options.update(kwargs)
+    return PaddleOCR(**options)
+
+
+# A loaded pipeline, the scheduler that batches its recognition, and the
+# resident memory its load added. An evicted entry is retired and closed once
+# the requests still using it are done.
+class ModelEntry:
+    def __init__(self, key, ocr, size_bytes=0):
+        self.key = key
+        self.ocr = ocr
+        self.size_bytes = size_bytes
+        self.batcher = RecognitionBatcher(ocr)
+        self.users = 0
+        self.retired = False
+
+    def close(self):
+        self.batcher.close()
+
+
+# LRU cache of PaddleOCR pipelines, created on first use. Each entry is
+# charged the RSS growth measured while it loaded, and the sum of those sizes
+# is kept within the budget; the process RSS itself does not drop right after
+# an eviction, so it cannot tell when to stop evicting.
+class ModelCache:
+    def __init__(self, rss_budget_mb=DEFAULT_RSS_BUDGET_MB, max_entries=DEFAULT_MAX_ENTRIES, **ocr_options):
+        self.rss_budget = rss_budget_mb * 1024 * 1024
+        self.max_entries = max_entries
+        self.ocr_options = ocr_options
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Loads run one at a time, so each one's RSS growth is its own
+        self.load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+    # Function to borrow a pipeline for one request; it is not closed by an
+    # eviction until the request gives it back
+    @contextmanager
+    def use(self, det=None, rec=None, cls=None, backend=None):
+        entry = self.get(det, rec, cls, backend, hold=True)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+
+    def release(self, entry):
+        with self.lock:
+            entry.users -= 1
+            close = entry.retired and entry.users == 0
+        if close:
+            entry.close()
+
+    # Function to look up or load a pipeline; with hold the caller counts as a
+    # user of the entry and must release it
+    def get(self, det=None, rec=None, cls=None, backend=None, hold=False):
+        key = resolve_models(det, rec, cls, backend)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                entry.users += hold
+                return entry
+
+        # Loading happens outside the cache lock so hits are never blocked by it
+        with self.load_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    entry.users += hold
+                    return entry
+                self.misses += 1
+            # The tile workers' detectors are built here too, so they are charged to the entry
+            start = time.perf_counter()
+            rss_before = current_rss_bytes()
+            entry = ModelEntry(key, create_ocr(*key, **self.ocr_options))
+            entry.batcher.tiler.preload()
+            rss_after = current_rss_bytes()
+            size = max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else 0
+            entry.size_bytes = size
+            print(f"Loaded det={key[0]} rec={key[1]} cls={key[2]} backend={key[3]} in {time.perf_counter() - start:.3f}s "
+                  f"({size / (1024 * 1024):.0f} MB)")
+            with self.lock:
+                self.entries[key] = entry
+                entry.users += hold
+                self._evict()
+            return entry
+
+    # Function to take an entry out of the cache, closing it unless a request
+    # is still using it; callers must hold the lock
+    def _retire(self, entry):
+        entry.retired = True
+        if entry.users == 0:
+            entry.close()
+
+    # Drop least recently used pipelines while over budget, never the newest one
+    def _evict(self):
+        total = sum(entry.size_bytes for entry in self.entries.values())
+        while len(self.entries) > 1 and (total > self.rss_budget or len(self.entries) > self.max_entries):
+            key, entry = self.entries.popitem(last=False)
+            total -= entry.size_bytes
+            self._retire(entry)
+            print(f"Evicted det={key[0]} rec={key[1]} cls={key[2]} backend={key[3]}")
+
+    # ONNX Runtime sessions own thread pools that do not survive a fork, so
+    # forked workers drop them and load their own on first use; Paddle
+    # predictors are kept and shared with the master copy-on-write
+    def reset_after_fork(self):
+        with self.lock:
+            for key in [key for key in self.entries if key[3] == 'onnx']:
+                self.entries.pop(key)
+            self.load_lock = threading.Lock()
+            self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            for entry in self.entries.values():
+                self._retire(entry)
+            self.entries.clear()
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import tarfile
+import argparse
+import urllib.request
+
+# Local model store rooted at PaddleOCR/models, archives live in models/<kind>/tar
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+ONNX_DIR = os.path.join(MODELS_DIR, 'onnx')
+MANIFEST_PATH = os.path.join(MODELS_DIR, 'manifest.json')
+MARKER_NAME = '.extracted.json'
+MODEL_FILES = ('inference.pdmodel', 'inference.pdiparams')
+
+# Downloads are opt-in, by default the store works fully offline
+ALLOW_DOWNLOAD = os.environ.get('PADDLE_ALLOW_DOWNLOAD', '0') == '1'
+
+# Function to get the absolute path of a model directory, e.g. model_path('det', 'en_PP-OCRv3_det_infer')
+def model_path(kind, name):
+    return os.path.join(MODELS_DIR, kind, name)
+
+# Function to get where the ONNX export of a model directory lives, e.g. models/onnx/det/<name>.onnx
+def onnx_model_path(model_dir):
+    kind = os.path.basename(os.path.dirname(model_dir))
+    return os.path.join(ONNX_DIR, kind, os.path.basename(model_dir) + '.onnx')
+
+# Function to check that a model directory has everything the predictor needs
+def is_complete(model_dir):
+    return all(os.path.exists(os.path.join(model_dir, f)) for f in MODEL_FILES)
+
+# Function to compute the sha256 of a file in chunks
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {'archives': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Function to read the marker left behind by a previous extraction
+def read_marker(target_dir):
+    marker_path = os.path.join(target_dir, MARKER_NAME)
+    if not os.path.exists(marker_path):
+        return None
+    try:
+        with open(marker_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function to extract an archive, skipping macOS resource forks and unsafe paths
+def extract_archive(archive_path, output_dir):
+    root = os.path.realpath(output_dir)
+    with tarfile.open(archive_path, 'r') as tar:
+        members = []
+        for member in tar.getmembers():
+            if os.path.basename(member.name).startswith('._'):
+                continue
+            destination = os.path.realpath(os.path.join(output_dir, member.name))
+            if not destination.startswith(root + os.sep):
+                raise ValueError(f"Unsafe path in {archive_path}: {member.name}")
+            if not (member.isfile() or member.isdir()):
+                continue
+            members.append(member)
+        tar.extractall(path=output_dir, members=members)
+
+# Function to make sure one manifest entry is extracted, extracting at most once
+def ensure_archive(relative_path, entry):
+    archive_path = os.path.join(MODELS_DIR, relative_path)
+    target_dir = os.path.join(MODELS_DIR, entry['target'])
+
+    if not os.path.exists(archive_path):
+        if is_complete(target_dir):
+            return 'present'
+        if not entry.get('url'):
+            print(f"Model archive missing: {relative_path}")
+            return 'missing'
+        if not ALLOW_DOWNLOAD:
+            return 'missing'
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        print(f"Downloading {entry['url']}...")
+        urllib.request.urlretrieve(entry['url'], archive_path)
+
+    # A matching marker means this exact archive was already extracted,
+    # comparing size and mtime avoids re-hashing on every start
+    stat = os.stat(archive_path)
+    marker = read_marker(target_dir)
+    if marker and marker.get('size') == stat.st_size and marker.get('mtime') == stat.st_mtime and is_complete(target_dir):
+        return 'cached'
+
+    checksum = sha256_file(archive_path)
+    if entry.get('sha256') and checksum != entry['sha256']:
+        print(f"Checksum mismatch for {relative_path}, expected {entry['sha256']} got {checksum}")
+        return 'corrupt'
+
+    print(f"Extracting {relative_path}...")
+    extract_archive(archive_path, os.path.dirname(target_dir))
+    with open(os.path.join(target_dir, MARKER_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'sha256': checksum, 'size': stat.st_size, 'mtime': stat.st_mtime}, f)
+    return 'extracted'
+
+# Function to bring the whole store up to date, returns {archive: status}
+def ensure_models(manifest_path=MANIFEST_PATH):
+    start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    statuses = {}
+    for relative_path, entry in manifest.get('archives', {}).items():
+        try:
+            statuses[relative_path] = ensure_archive(relative_path, entry)
+        except (OSError, tarfile.TarError, ValueError) as e:
+            print(f"Failed to prepare {relative_path}: {e}")
+            statuses[relative_path] = 'error'
+    elapsed = time.perf_counter() - start
+    print(f"Model store ready in {elapsed:.3f}s ({len(statuses)} archives)")
+    return statuses
+
+# Function to rebuild the manifest from the archives on disk
+def build_manifest(manifest_path=MANIFEST_PATH):
+    manifest = load_manifest(manifest_path)
+    archives = manifest.setdefault('archives', {})
+    for kind in sorted(os.listdir(MODELS_DIR)):
+        tar_dir = os.path.join(MODELS_DIR, kind, 'tar')
+        if not os.path.isdir(tar_dir):
+            continue
+        for filename in sorted(os.listdir(tar_dir)):
+            if not filename.endswith('.tar'):
+                continue
+            relative_path = f"{kind}/tar/{filename}"
+            entry = archives.setdefault(relative_path, {})
+            entry['target'] = f"{kind}/{filename[:-len('.tar')]}"
+            entry['sha256'] = sha256_file(os.path.join(tar_dir, filename))
+            entry['size'] = os.path.getsize(os.path.join(tar_dir, filename))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the local PaddleOCR model store')
+    parser.add_argument('--build-manifest', action='store_true', help='Recompute archive hashes into manifest.json')
+    args = parser.parse_args()
+
+    if args.build_manifest:
+        build_manifest()
+        print(f"Wrote {MANIFEST_PATH}")
+    statuses = ensure_models()
+    for relative_path, status in sorted(statuses.items()):
+        print(f"{status:>10}  {relative_path}")
+    sys.exit(1 if any(s in ('corrupt', 'error') for s in statuses.values()) else 0)
@@ -0,0 +1,61 @@
+import os
+import sys
+import argparse
+import subprocess
+from model_store import MODELS_DIR, is_complete, onnx_model_path
+
+# Convert the bundled Paddle inference models to ONNX with paddle2onnx
+# Usage: python onnx_convert.py [--kinds det cls rec] [--force]
+
+# Function to list every complete Paddle model directory of the given kinds
+def find_models(kinds):
+    model_dirs = []
+    for kind in kinds:
+        kind_dir = os.path.join(MODELS_DIR, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for name in sorted(os.listdir(kind_dir)):
+            model_dir = os.path.join(kind_dir, name)
+            if os.path.isdir(model_dir) and is_complete(model_dir):
+                model_dirs.append(model_dir)
+    return model_dirs
+
+# Function to check whether the ONNX artifact is newer than its Paddle weights
+def is_up_to_date(model_dir, onnx_file):
+    if not os.path.exists(onnx_file):
+        return False
+    return os.path.getmtime(onnx_file) >= os.path.getmtime(os.path.join(model_dir, 'inference.pdiparams'))
+
+def convert(model_dir, onnx_file, opset_version=11):
+    os.makedirs(os.path.dirname(onnx_file), exist_ok=True)
+    command = [
+        'paddle2onnx',
+        '--model_dir', model_dir,
+        '--model_filename', 'inference.pdmodel',
+        '--params_filename', 'inference.pdiparams',
+        '--save_file', onnx_file,
+        '--opset_version', str(opset_version),
+        '--enable_onnx_checker', 'True',
+    ]
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export PaddleOCR models to ONNX')
+    parser.add_argument('--kinds', nargs='+', default=['det', 'cls', 'rec'])
+    parser.add_argument('--opset', type=int, default=11)
+    parser.add_argument('--force', action='store_true', help='Re-export even when the artifact is up to date')
+    args = parser.parse_args()
+
+    failures = 0
+    for model_dir in find_models(args.kinds):
+        onnx_file = onnx_model_path(model_dir)
+        if not args.force and is_up_to_date(model_dir, onnx_file):
+            print(f"up to date  {onnx_file}")
+            continue
+        result = convert(model_dir, onnx_file, args.opset)
+        if result.returncode != 0:
+            failures += 1
+            print(f"failed      {model_dir}\n{result.stdout}")
+        else:
+            print(f"converted   {onnx_file}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,224 @@
+import os
+import math
+import time
+import cv2
+import numpy as np
+import pyclipper
+import onnxruntime as ort
+
+# Intra-op threads per ONNX Runtime session, defaults to this worker's share of the cores
+ONNX_THREADS = int(os.environ.get('PADDLE_ONNX_THREADS', max(1, (os.cpu_count() or 1) // int(os.environ.get('PADDLE_WORKERS', '1')))))
+
+# Function to open a CPU inference session for an exported model
+def create_session(model_file):
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(f"ONNX model not found: {model_file}, run onnx_convert.py first")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ONNX_THREADS
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_file, sess_options=options, providers=['CPUExecutionProvider'])
+
+# Function to load a PaddleOCR character dictionary, index 0 is the CTC blank
+def load_character_dict(dict_path, use_space_char=True):
+    characters = []
+    with open(dict_path, 'rb') as f:
+        for line in f.readlines():
+            characters.append(line.decode('utf-8').strip('\n').strip('\r\n'))
+    if use_space_char:
+        characters.append(' ')
+    return ['blank'] + characters
+
+# Function to normalise a crop for the cls/rec models: scale to [-1, 1], pad on the right
+def resize_norm_crop(img, img_h, img_w, max_w):
+    h, w = img.shape[:2]
+    resized_w = min(max_w, int(math.ceil(img_h * w / float(h))))
+    resized = cv2.resize(img, (resized_w, img_h)).astype(np.float32)
+    resized = resized.transpose((2, 0, 1)) / 255.0
+    resized = (resized - 0.5) / 0.5
+    padded = np.zeros((3, img_h, img_w), dtype=np.float32)
+    padded[:, :, :resized_w] = resized
+    return padded
+
+
+# DB text detector with the same pre/post-processing as PaddleOCR's TextDetector
+class OnnxTextDetector:
+    def __init__(self, model_file, limit_side_len=960, thresh=0.3, box_thresh=0.6,
+                 unclip_ratio=1.5, max_candidates=1000, min_size=3):
+        self.session = create_session(model_file)
+        self.input_name = self.session.get_inputs()[0].name
+        self.limit_side_len = limit_side_len
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.unclip_ratio = unclip_ratio
+        self.max_candidates = max_candidates
+        self.min_size = min_size
+        self.mean = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape((1, 1, 3))
+        self.std = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape((1, 1, 3))
+
+    def preprocess(self, img):
+        h, w = img.shape[:2]
+        ratio = 1.0
+        if max(h, w) > self.limit_side_len:
+            ratio = float(self.limit_side_len) / max(h, w)
+        resize_h = max(int(round(h * ratio / 32) * 32), 32)
+        resize_w = max(int(round(w * ratio / 32) * 32), 32)
+        resized = cv2.resize(img, (resize_w, resize_h))
+        normalized = (resized.astype(np.float32) / 255.0 - self.mean) / self.std
+        return normalized.transpose((2, 0, 1))[np.newaxis, :], (h, w, resize_h, resize_w)
+
+    # Function to get the minimum-area box of a contour, points ordered clockwise from top-left
+    def get_mini_boxes(self, contour):
+        bounding_box = cv2.minAreaRect(contour)
+        points = sorted(list(cv2.boxPoints(bounding_box)), key=lambda x: x[0])
+        if points[1][1] > points[0][1]:
+            index_1, index_4 = 0, 1
+        else:
+            index_1, index_4 = 1, 0
+        if points[3][1] > points[2][1]:
+            index_2, index_3 = 2, 3
+        else:
+            index_2, index_3 = 3, 2
+        box = [points[index_1], points[index_2], points[index_3], points[index_4]]
+        return np.array(box), min(bounding_box[1])
+
+    # Function to score a box by the mean probability inside it
+    def box_score_fast(self, bitmap, box):
+        h, w = bitmap.shape[:2]
+        xmin = int(np.clip(np.floor(box[:, 0].min()), 0, w - 1))
+        xmax = int(np.clip(np.ceil(box[:, 0].max()), 0, w - 1))
+        ymin = int(np.clip(np.floor(box[:, 1].min()), 0, h - 1))
+        ymax = int(np.clip(np.ceil(box[:, 1].max()), 0, h - 1))
+        mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+        shifted = box.copy()
+        shifted[:, 0] -= xmin
+        shifted[:, 1] -= ymin
+        cv2.fillPoly(mask, shifted.reshape(1, -1, 2).astype(np.int32), 1)
+        return cv2.mean(bitmap[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+    # Function to grow a shrunk text kernel back to the full text region
+    def unclip(self, box):
+        area = cv2.contourArea(box.astype(np.float32))
+        length = cv2.arcLength(box.astype(np.float32), True)
+        if length == 0:
+            return None
+        distance = area * self.unclip_ratio / length
+        offset = pyclipper.PyclipperOffset()
+        offset.AddPath(box.astype(np.int64).tolist(), pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
+        expanded = offset.Execute(distance)
+        if len(expanded) != 1:
+            return None
+        return np.array(expanded[0])
+
+    def postprocess(self, pred, shape):
+        src_h, src_w, resize_h, resize_w = shape
+        bitmap = (pred > self.thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap * 255, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours[:self.max_candidates]:
+            points, sside = self.get_mini_boxes(contour)
+            if sside < self.min_size:
+                continue
+            if self.box_score_fast(pred, points) < self.box_thresh:
+                continue
+            expanded = self.unclip(points)
+            if expanded is None:
+                continue
+            box, sside = self.get_mini_boxes(expanded.reshape(-1, 1, 2).astype(np.float32))
+            if sside < self.min_size + 2:
+                continue
+            box[:, 0] = np.clip(np.round(box[:, 0] / resize_w * src_w), 0, src_w - 1)
+            box[:, 1] = np.clip(np.round(box[:, 1] / resize_h * src_h), 0, src_h - 1)
+            width = int(np.linalg.norm(box[0] - box[1]))
+            height = int(np.linalg.norm(box[0] - box[3]))
+            if width <= 3 or height <= 3:
+                continue
+            boxes.append(box.astype(np.float32))
+        return np.array(boxes)
+
+    def __call__(self, img):
+        start = time.perf_counter()
+        tensor, shape = self.preprocess(img)
+        pred = self.session.run(None, {self.input_name: tensor})[0]
+        dt_boxes = self.postprocess(pred[0, 0], shape)
+        return dt_boxes, time.perf_counter() - start
+
+
+# 0/180 degree text angle classifier
+class OnnxTextClassifier:
+    def __init__(self, model_file, image_shape=(3, 48, 192), batch_num=6, thresh=0.9):
+        self.session = create_session(model_file)
+        self.input_name = self.session.get_inputs()[0].name
+        self.image_shape = image_shape
+        self.batch_num = batch_num
+        self.thresh = thresh
+        self.labels = ['0', '180']
+
+    def __call__(self, img_list):
+        start = time.perf_counter()
+        img_list = list(img_list)
+        _, img_h, img_w = self.image_shape
+        # Similar aspect ratios in one batch keep the padding small
+        order = np.argsort([img.shape[1] / float(img.shape[0]) for img in img_list])
+        cls_res = [['', 0.0]] * len(img_list)
+        for begin in range(0, len(img_list), self.batch_num):
+            indices = order[begin:begin + self.batch_num]
+            batch = np.stack([resize_norm_crop(img_list[i], img_h, img_w, img_w) for i in indices])
+            probs = self.session.run(None, {self.input_name: batch})[0]
+            for i, prob in zip(indices, probs):
+                label = self.labels[int(prob.argmax())]
+                score = float(prob.max())
+                cls_res[i] = [label, score]
+                if '180' in label and score > self.thresh:
+                    img_list[i] = cv2.rotate(img_list[i], cv2.ROTATE_180)
+        return img_list, cls_res, time.perf_counter() - start
+
+
+# CRNN/SVTR recogniser with greedy CTC decoding
+class OnnxTextRecognizer:
+    def __init__(self, model_file, char_dict_path, image_shape=(3, 48, 320), batch_num=6):
+        self.session = create_session(model_file)
+        self.input_name = self.session.get_inputs()[0].name
+        self.characters = load_character_dict(char_dict_path)
+        self.image_shape = image_shape
+        self.batch_num = batch_num
+
+    def ctc_decode(self, preds):
+        indices = preds.argmax(axis=2)
+        probs = preds.max(axis=2)
+        results = []
+        for index_row, prob_row in zip(indices, probs):
+            keep = index_row != 0
+            keep[1:] &= index_row[1:] != index_row[:-1]
+            text = ''.join(self.characters[i] for i in index_row[keep])
+            score = float(prob_row[keep].mean()) if keep.any() else 0.0
+            results.append((text, score))
+        return results
+
+    def __call__(self, img_list):
+        start = time.perf_counter()
+        _, img_h, img_w = self.image_shape
+        order = np.argsort([img.shape[1] / float(img.shape[0]) for img in img_list])
+        rec_res = [('', 0.0)] * len(img_list)
+        for begin in range(0, len(img_list), self.batch_num):
+            indices = order[begin:begin + self.batch_num]
+            # The batch is padded to the widest crop, never narrower than the model default
+            max_wh_ratio = max([img_w / float(img_h)] + [img_list[i].shape[1] / float(img_list[i].shape[0]) for i in indices])
+            batch_w = int(img_h * max_wh_ratio)
+            batch = np.stack([resize_norm_crop(img_list[i], img_h, batch_w, batch_w) for i in indices])
+            preds = self.session.run(None, {self.input_name: batch})[0]
+            for i, result in zip(indices, self.ctc_decode(preds)):
+                rec_res[i] = result
+        return rec_res, time.perf_counter() - start
+
+
+# Drop-in for the parts of PaddleOCR used by RecognitionBatcher, running on ONNX Runtime
+class OnnxOCR:
+    def __init__(self, det_model_file, rec_model_file, char_dict_path, cls_model_file=None,
+                 rec_image_shape=(3, 48, 320), rec_batch_num=6, cls_batch_num=6,
+                 det_limit_side_len=960, drop_score=0.5):
+        self.text_detector = OnnxTextDetector(det_model_file, limit_side_len=det_limit_side_len)
+        self.text_recognizer = OnnxTextRecognizer(rec_model_file, char_dict_path, rec_image_shape, rec_batch_num)
+        self.use_angle_cls = cls_model_file is not None
+        self.text_classifier = OnnxTextClassifier(cls_model_file, batch_num=cls_batch_num) if self.use_angle_cls else None
+        self.drop_score = drop_score
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+from batching import RecognitionBatcher
+from model_cache import create_ocr, resolve_models
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from accuracy import levenshtein
+
+# Compare the ONNX Runtime backend against native Paddle on a folder of images:
+# latency per image for both, and the character error rate between their outputs
+# Usage: python onnx_parity.py path/to/images [--det NAME --rec NAME --cls NAME] [--max-cer 0.02]
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+# Function to compute the character error rate between the two backends' texts
+def character_error_rate(reference, hypothesis):
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return levenshtein(reference, hypothesis) / len(reference)
+
+# Function to run one backend over all images, returning texts and latencies
+def run_backend(batcher, images):
+    texts, latencies = [], []
+    for image in images:
+        start = time.perf_counter()
+        result = batcher.ocr(image, cls=True)
+        latencies.append(time.perf_counter() - start)
+        texts.append(' '.join(line[1][0] for line in result[0]))
+    return texts, latencies
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_dir')
+    parser.add_argument('--det')
+    parser.add_argument('--rec')
+    parser.add_argument('--cls')
+    parser.add_argument('--max-cer', type=float, default=0.02, help='Fail when the mean CER between backends exceeds this')
+    args = parser.parse_args()
+
+    names = sorted(n for n in os.listdir(args.image_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+    images = [cv2.imread(os.path.join(args.image_dir, n)) for n in names]
+    if not images:
+        sys.exit(f"No images found in {args.image_dir}")
+
+    # Both backends use the classifier the ONNX side can load
+    try:
+        det, rec, cls, _ = resolve_models(args.det, args.rec, args.cls, 'onnx')
+    except KeyError as e:
+        sys.exit(e.args[0])
+    results = {}
+    for backend in ('paddle', 'onnx'):
+        batcher = RecognitionBatcher(create_ocr(det, rec, cls, backend))
+        batcher.ocr(images[0], cls=True)  # warm-up
+        results[backend] = run_backend(batcher, images)
+        batcher.close()
+
+    cers = [character_error_rate(p, o) for p, o in zip(results['paddle'][0], results['onnx'][0])]
+    for name, cer in zip(names, cers):
+        if cer > args.max_cer:
+            print(f"mismatch  {name}  CER={cer:.4f}")
+
+    print(f"{'backend':>8} {'mean ms':>10} {'p95 ms':>10} {'images/s':>10}")
+    for backend, (_, latencies) in results.items():
+        latencies = np.array(latencies) * 1000
+        print(f"{backend:>8} {latencies.mean():>10.1f} {np.percentile(latencies, 95):>10.1f} {1000 / latencies.mean():>10.2f}")
+    mean_cer = float(np.mean(cers))
+    print(f"mean CER between backends: {mean_cer:.4f} over {len(images)} images")
+    sys.exit(1 if mean_cer > args.max_cer else 0)
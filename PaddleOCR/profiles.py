@@ -0,0 +1,86 @@
+import os
+import json
+import numpy as np
+
+# Named speed/quality trade-offs a request can pick with the 'profile' form
+# field; det_model/rec_model/cls_model fields still override the profile's models.
+#   det_limit  longest side of the detector input in pixels, larger finds smaller text
+#   cls        angle classification: 'always', 'never', or 'auto'. The classifier
+#              only tells upright from upside-down text. 'auto' runs it on the
+#              boxes standing on end, whose crops are turned by 90 degrees in one
+#              fixed direction and so come out upside down for text running the
+#              other way; upside-down pages need 'always'
+#   rec_batch  crops per recognition pass; crops are padded to the widest one
+#              in their pass, so smaller passes trade throughput for accuracy
+#   det, rec   models from model_cache, None for the server default; a
+#              profile whose own models are not on disk is refused
+# Without a profile (PADDLE_PROFILE unset) requests keep the detector's own
+# limit, always classify and use the default models and batch size.
+PROFILES = {
+    'fast': {'det_limit': 640, 'cls': 'never', 'rec_batch': 32,
+             'det': 'PP-OCRv2_slim_quant', 'rec': 'en_number_mobile_v2.0_slim'},
+    'balanced': {'det_limit': 960, 'cls': 'auto', 'rec_batch': 16, 'det': None, 'rec': None},
+    'accurate': {'det_limit': 1536, 'cls': 'always', 'rec_batch': 6, 'det': 'en_PP-OCRv3', 'rec': 'en_number_mobile_v2.0'},
+}
+CLS_MODES = ('always', 'never', 'auto')
+DEFAULT_PROFILE = os.environ.get('PADDLE_PROFILE', '') or None
+
+# Where bench_profiles.py stores its measurements
+PROFILE_RESULTS_PATH = os.environ.get(
+    'PADDLE_PROFILE_RESULTS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles_measured.json'))
+
+# Function to look up a profile's settings by name, None for no profile
+def resolve_profile(name=None):
+    name = name or DEFAULT_PROFILE
+    if name is None:
+        return None
+    if name not in PROFILES:
+        raise KeyError(f"Unknown profile '{name}', choose from {list(PROFILES)}")
+    return dict(PROFILES[name], name=name)
+
+# Function to flag the boxes whose crops get_rotate_crop_image turns by 90
+# degrees (at least 1.5 times taller than wide, measured the same way)
+def turned_crops(boxes):
+    points = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    width = np.maximum(np.linalg.norm(points[:, 1] - points[:, 0], axis=1), np.linalg.norm(points[:, 2] - points[:, 3], axis=1))
+    height = np.maximum(np.linalg.norm(points[:, 3] - points[:, 0], axis=1), np.linalg.norm(points[:, 2] - points[:, 1], axis=1))
+    width = np.maximum(width.astype(int), 1)
+    height = np.maximum(height.astype(int), 1)
+    return height >= 1.5 * width
+
+# Function to turn a cls setting into what the batcher takes: True or False
+# for every crop, or one flag per box for 'auto'
+def angle_cls_flags(boxes, mode):
+    if mode is True or mode == 'always':
+        return True
+    if mode is False or mode is None or mode == 'never':
+        return False
+    if mode != 'auto':
+        raise ValueError(f"Unknown angle classification mode '{mode}', choose from {list(CLS_MODES)}")
+    if len(boxes) == 0:
+        return False
+    return turned_crops(boxes).tolist()
+
+# Function to read the latency and accuracy bench_profiles.py measured, if any
+def load_measurements(path=PROFILE_RESULTS_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function to describe the profiles for the /profiles endpoint; available()
+# tells whether a det/rec pair is on disk
+def list_profiles(available=None):
+    measurements = load_measurements() or {}
+    measured = measurements.get('profiles', {})
+    profiles = {}
+    for name, settings in PROFILES.items():
+        profiles[name] = dict(settings, measured=measured.get(name))
+        if available is not None:
+            profiles[name]['available'] = available(settings['det'], settings['rec'])
+    return {
+        'profiles': profiles,
+        'default': DEFAULT_PROFILE,
+        'measured_on': {key: measurements[key] for key in ('commit', 'created', 'host', 'corpus') if key in measurements},
+    }
@@ -0,0 +1,206 @@
+import os
+import copy
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Large scans are split into overlapping tiles that are detected in parallel,
+# so small text is seen at full resolution instead of after the detector's
+# downscale to det_limit_side_len (960 px). Only `workers` tiles are in flight
+# at a time, which bounds detector memory regardless of the page size.
+#   PADDLE_TILING         auto (tile pages larger than PADDLE_TILE_MIN_SIDE), on, or off
+#   PADDLE_TILE_SIZE      tile side in pixels, best kept at the detector limit
+#   PADDLE_TILE_OVERLAP   overlap between neighbouring tiles, must exceed the tallest text line
+#   PADDLE_TILE_WORKERS   tiles detected concurrently, each with its own predictor
+TILING_MODES = ('auto', 'on', 'off')
+DEFAULT_TILING = os.environ.get('PADDLE_TILING', 'auto')
+DEFAULT_TILE_SIZE = int(os.environ.get('PADDLE_TILE_SIZE', '960'))
+DEFAULT_TILE_OVERLAP = int(os.environ.get('PADDLE_TILE_OVERLAP', '96'))
+DEFAULT_TILE_MIN_SIDE = int(os.environ.get('PADDLE_TILE_MIN_SIDE', '2000'))
+DEFAULT_TILE_WORKERS = int(os.environ.get('PADDLE_TILE_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Function to decide whether a page whose longest side is `longest` pixels is
+# detected in tiles; in auto mode a page the detector sees whole at det_limit
+# is not tiled
+def tiles_needed(longest, mode=None, det_limit=None, min_side=DEFAULT_TILE_MIN_SIDE, tile_size=DEFAULT_TILE_SIZE):
+    mode = mode or DEFAULT_TILING
+    if mode == 'on':
+        return longest > tile_size
+    if mode == 'auto':
+        return longest > max(min_side, det_limit or 0)
+    return False
+
+# Function to place tiles along one axis; the last tile is aligned to the edge
+def tile_origins(length, tile_size, overlap):
+    if length <= tile_size:
+        return [0]
+    step = max(tile_size - overlap, 1)
+    origins = list(range(0, length - tile_size, step))
+    return origins + [length - tile_size]
+
+# Function to split the overlap between neighbours down the middle; a box
+# belongs to the tile whose core contains its centre
+def core_bounds(origins, tile_size, length):
+    bounds = [0]
+    for previous, following in zip(origins, origins[1:]):
+        bounds.append((following + min(previous + tile_size, length)) / 2.0)
+    bounds.append(length)
+    return list(zip(bounds, bounds[1:]))
+
+# Function to list (x0, y0, x1, y1) tiles with their core regions
+def make_tiles(height, width, tile_size, overlap):
+    xs = tile_origins(width, tile_size, overlap)
+    ys = tile_origins(height, tile_size, overlap)
+    x_cores = core_bounds(xs, tile_size, width)
+    y_cores = core_bounds(ys, tile_size, height)
+    tiles = []
+    for y, y_core in zip(ys, y_cores):
+        for x, x_core in zip(xs, x_cores):
+            tiles.append(((x, y, min(x + tile_size, width), min(y + tile_size, height)), (x_core[0], y_core[0], x_core[1], y_core[1])))
+    return tiles
+
+def box_rect(box):
+    return float(box[:, 0].min()), float(box[:, 1].min()), float(box[:, 0].max()), float(box[:, 1].max())
+
+def rect_box(rect):
+    x0, y0, x1, y1 = rect
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float32)
+
+# Function to find which rects continue the same text line as rect: they
+# share most of their height and touch or overlap horizontally
+def same_line_mask(rect, rects):
+    min_height = np.minimum(rect[3] - rect[1], rects[:, 3] - rects[:, 1])
+    vertical_overlap = np.minimum(rect[3], rects[:, 3]) - np.maximum(rect[1], rects[:, 1])
+    horizontal_gap = np.maximum(rect[0], rects[:, 0]) - np.minimum(rect[2], rects[:, 2])
+    return (min_height > 0) & (vertical_overlap >= 0.5 * min_height) & (horizontal_gap <= np.maximum(2.0, 0.3 * min_height))
+
+# Function to merge per-tile boxes into page coordinates. Duplicates in the
+# overlaps are dropped by the core rule; lines cut by a tile edge are joined
+# with their continuation from the neighbouring tile.
+def merge_tile_boxes(tiles, tile_boxes, height, width, edge_margin=2):
+    boxes, rects, cut = [], [], []
+    for ((x0, y0, x1, y1), (cx0, cy0, cx1, cy1)), found in zip(tiles, tile_boxes):
+        for box in found:
+            box = np.asarray(box, dtype=np.float32) + np.array([x0, y0], dtype=np.float32)
+            rect = box_rect(box)
+            center_x, center_y = (rect[0] + rect[2]) / 2.0, (rect[1] + rect[3]) / 2.0
+            if not (cx0 <= center_x < cx1 and cy0 <= center_y < cy1):
+                continue
+            boxes.append(box)
+            rects.append(rect)
+            # Touching a tile edge that is not the page edge means the detector saw only part of the text
+            cut.append((x0 > 0 and rect[0] <= x0 + edge_margin) or (x1 < width and rect[2] >= x1 - edge_margin) or
+                       (y0 > 0 and rect[1] <= y0 + edge_margin) or (y1 < height and rect[3] >= y1 - edge_margin))
+    if not boxes:
+        return []
+
+    # Union-find over fragments; only cut boxes start a merge, so whole boxes stay as detected
+    rects = np.array(rects, dtype=np.float32)
+    parent = list(range(len(boxes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in np.flatnonzero(cut):
+        for j in np.flatnonzero(same_line_mask(rects[i], rects)):
+            root_i, root_j = find(i), find(int(j))
+            if root_i != root_j:
+                parent[root_j] = root_i
+
+    groups = {}
+    for i in range(len(boxes)):
+        groups.setdefault(find(i), []).append(i)
+    merged = []
+    for members in groups.values():
+        if len(members) == 1:
+            merged.append(boxes[members[0]])
+            continue
+        group = rects[members]
+        merged.append(rect_box((group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max())))
+    return merged
+
+
+# Parallel tiled text detection for one pipeline
+class TiledDetector:
+    def __init__(self, pipeline, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP,
+                 workers=DEFAULT_TILE_WORKERS, min_side=DEFAULT_TILE_MIN_SIDE):
+        if overlap >= tile_size:
+            raise ValueError('Tile overlap must be smaller than the tile size')
+        self.pipeline = pipeline
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.workers = max(1, workers)
+        self.min_side = min_side
+        self.detectors = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    # Paddle predictors are not thread-safe, so each worker gets its own
+    # TextDetector built from the pipeline's arguments. ONNX Runtime sessions
+    # can be shared between threads, so ONNX workers get a copy of the
+    # detector sharing its session; the settings a request with a det_limit
+    # changes on the pipeline's own detector do not reach the tiles.
+    def _new_detector(self):
+        base = self.pipeline.text_detector
+        args = getattr(self.pipeline, 'args', None)
+        if args is None:
+            return copy.copy(base)
+        return type(base)(args)
+
+    # Function to build every worker's detector up front, so their memory is
+    # measured as part of the pipeline's load
+    def preload(self):
+        with self.lock:
+            while self.created < self.workers:
+                self.created += 1
+                self.detectors.put(self._new_detector())
+
+    def _acquire(self):
+        try:
+            return self.detectors.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.workers:
+                self.created += 1
+                return self._new_detector()
+        return self.detectors.get()
+
+    # The executor's threads do not survive a fork, start a fresh one per process
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+                self.pid = os.getpid()
+            return self.executor
+
+    def should_tile(self, image, mode=None, det_limit=None):
+        return tiles_needed(max(image.shape[:2]), mode, det_limit, self.min_side, self.tile_size)
+
+    def _detect_tile(self, image, tile):
+        x0, y0, x1, y1 = tile
+        detector = self._acquire()
+        try:
+            dt_boxes, _ = detector(np.ascontiguousarray(image[y0:y1, x0:x1]))
+        finally:
+            self.detectors.put(detector)
+        return [] if dt_boxes is None else list(dt_boxes)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        tiles = make_tiles(height, width, self.tile_size, self.overlap)
+        executor = self._get_executor()
+        tile_boxes = list(executor.map(lambda tile: self._detect_tile(image, tile[0]), tiles))
+        return merge_tile_boxes(tiles, tile_boxes, height, width)
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -1,69 +1,262 @@
 from flask import Flask, request, jsonify, send_file
-import pytesseract
-from PIL import Image
-import uuid
 import os
-import base64
-import cv2
-import numpy as np
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+import sys
+import io
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from engine_pool import TesseractEnginePool, parse_warmup_langs, normalize_langs, DEFAULT_WARMUP_LANGS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.result_cache import get_result_cache, make_key, digest_bytes
+from ocr_common.preprocessing import get_pipeline, list_pipelines
+from ocr_common.metrics import instrument_flask, register_callback, record_stages, stage
 
 app = Flask(__name__)
+instrument_flask(app, 'tesseract')
 
 # Path to tessdata directory
 TESSDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tessdata')
 
+# Pool of pre-initialised tesseract engines keyed by language set
+engine_pool = TesseractEnginePool(TESSDATA_DIR)
+engine_pool.warm_up(parse_warmup_langs(DEFAULT_WARMUP_LANGS))
+
+# Batch OCR settings
+BATCH_WORKERS = int(os.environ.get('TESSERACT_BATCH_WORKERS', os.cpu_count() or 1))
+MAX_BATCH_SIZE = int(os.environ.get('TESSERACT_MAX_BATCH_SIZE', '500'))
+# Uncompressed size limits for zip uploads, per image and for the whole archive
+MAX_ARCHIVE_MEMBER_BYTES = int(os.environ.get('TESSERACT_MAX_ARCHIVE_MEMBER_MB', '50')) * 1024 * 1024
+MAX_ARCHIVE_TOTAL_BYTES = int(os.environ.get('TESSERACT_MAX_ARCHIVE_TOTAL_MB', '500')) * 1024 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# Process pool for batch OCR, created on first use, and the images submitted to it but not finished
+batch_executor = None
+batch_executor_lock = threading.Lock()
+batch_pending = 0
+batch_pending_lock = threading.Lock()
+
 # Function to get all language models in tessdata directory
 def get_language_models(tessdata_dir):
     lang_files = [f for f in os.listdir(tessdata_dir) if f.endswith('.traineddata')]
     languages = [os.path.splitext(f)[0] for f in lang_files]
     return languages
 
-# Function to preprocess the image for better OCR results
-def preprocess_image(image_path):
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    _, binary_image = cv2.threshold(image, 150, 255, cv2.THRESH_BINARY_INV)
-    return binary_image
+# Function to decode and preprocess the upload with the requested pipeline
+# (the engine default unless the request names a preset or stage list)
+def preprocess_image(image_data, preprocess=None):
+    return get_pipeline('tesseract', preprocess).run(image_data)
 
 # Function to run inference using multiple language models
-def inference(img_path, langs):
-    image = Image.open(img_path)
-    result = pytesseract.image_to_string(image, lang='+'.join(langs))
+def inference(image, langs):
+    # Engines are reused across requests, no model reload per call
+    result = engine_pool.image_to_string(image, langs)
     return result
 
+# Function to build the result cache key for one image, language set and preprocessing pipeline
+def result_cache_key(image_data, langs, pipeline):
+    return make_key('tesseract', digest_bytes(image_data), langs=normalize_langs(langs), preprocess=pipeline.spec)
+
+# Function to give each batch worker process its own engine pool. The pool
+# inherited from the server through the fork is dropped rather than used,
+# its locks may have been held by another thread at fork time; engines load
+# on a worker's first image instead of warming up a second copy per worker.
+def init_batch_worker():
+    global engine_pool
+    engine_pool = TesseractEnginePool(TESSDATA_DIR)
+
+# Function to get the shared batch process pool
+def get_batch_executor():
+    global batch_executor
+    with batch_executor_lock:
+        if batch_executor is None:
+            batch_executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS, initializer=init_batch_worker)
+        return batch_executor
+
+# Function to replace a pool a crashed worker broke; only the first caller
+# for a given pool shuts it down, the next batch starts a fresh one
+def discard_batch_executor(executor):
+    global batch_executor
+    with batch_executor_lock:
+        if batch_executor is not executor:
+            return
+        batch_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to run the full pipeline on one encoded image inside a worker
+def ocr_image_bytes(image_data, langs, preprocess=None):
+    binary_image = preprocess_image(image_data, preprocess)
+    return inference(binary_image, langs)
+
+# Function to queue one image on the batch pool, counting it until it finishes
+def submit_batch_item(executor, image_data, langs, pipeline):
+    global batch_pending
+    with batch_pending_lock:
+        batch_pending += 1
+    try:
+        future = executor.submit(ocr_image_bytes, image_data, langs, pipeline)
+    except BaseException:
+        with batch_pending_lock:
+            batch_pending -= 1
+        raise
+    future.add_done_callback(finish_batch_item)
+    return future
+
+# Function to queue the uncached images of a request; a pool another request
+# found broken (and shut down) is replaced once before giving up
+def submit_batch(items, cached, langs, pipeline):
+    executor = get_batch_executor()
+    futures = []
+    for (_, data), hit in zip(items, cached):
+        if hit is not None:
+            futures.append(None)
+            continue
+        try:
+            futures.append(submit_batch_item(executor, data, langs, pipeline))
+        except (BrokenProcessPool, RuntimeError):
+            discard_batch_executor(executor)
+            executor = get_batch_executor()
+            futures.append(submit_batch_item(executor, data, langs, pipeline))
+    return executor, futures
+
+def finish_batch_item(future):
+    global batch_pending
+    with batch_pending_lock:
+        batch_pending -= 1
+
+# Function to collect (filename, bytes) pairs from a multipart or zip upload.
+# Archive members are read through the size limits, which are checked against
+# the bytes actually inflated since the sizes in the zip headers can lie.
+def collect_batch_items():
+    items = [(f.filename, f.read()) for f in request.files.getlist('images')]
+    if 'archive' in request.files:
+        total = 0
+        with zipfile.ZipFile(io.BytesIO(request.files['archive'].read())) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if info.file_size > MAX_ARCHIVE_MEMBER_BYTES or total + info.file_size > MAX_ARCHIVE_TOTAL_BYTES:
+                    raise ValueError('Archive too large when uncompressed')
+                with archive.open(info) as member:
+                    data = member.read(MAX_ARCHIVE_MEMBER_BYTES + 1)
+                total += len(data)
+                if len(data) > MAX_ARCHIVE_MEMBER_BYTES or total > MAX_ARCHIVE_TOTAL_BYTES:
+                    raise ValueError('Archive too large when uncompressed')
+                items.append((info.filename, data))
+    return items
+
 # Endpoint to list available language models
 @app.route('/languages', methods=['GET'])
 def list_languages():
     languages = get_language_models(TESSDATA_DIR)
     return jsonify(languages)
 
+# Endpoint to list the preprocessing presets and the default pipeline
+@app.route('/preprocess', methods=['GET'])
+def list_preprocessing():
+    return jsonify(list_pipelines('tesseract'))
+
 # Endpoint to perform OCR
 @app.route('/ocr', methods=['POST'])
 def ocr_service():
-    if 'image' not in request.files:
+    # The multipart body is parsed on first access to request.files
+    with stage('upload'):
+        files = request.files
+    if 'image' not in files:
         return jsonify({'error': 'No image file provided'}), 400
 
     langs = request.form.get('langs', 'eng').split(',')
+    try:
+        pipeline = get_pipeline('tesseract', request.form.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    image_file = request.files['image']
+    image_data = files['image'].read()
 
-    # Save the image temporarily
-    with TemporaryDirectory() as temp_dir:
-        unique_filename = os.path.join(temp_dir, str(uuid.uuid4()) + '.jpg')
-        image_file.save(unique_filename)
+    # Repeat uploads are answered from the result cache
+    cache = get_result_cache()
+    cache_key = result_cache_key(image_data, langs, pipeline)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return jsonify({'recognized_text': cached})
 
-        # Preprocess the image
-        binary_image = preprocess_image(unique_filename)
-        processed_image_path = unique_filename.replace('.jpg', '_processed.jpg')
-        cv2.imwrite(processed_image_path, binary_image)
+    # Decode and preprocess the upload in memory
+    timings = {}
+    try:
+        binary_image = pipeline.run(image_data, timings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        record_stages(timings)
 
-        # Run OCR
-        try:
-            result = inference(processed_image_path, langs)
-            return jsonify({'recognized_text': result})
+    # Run OCR; tesseract does layout analysis and recognition in one call
+    try:
+        with stage('recognition'):
+            result = inference(binary_image, langs)
+        cache.put(cache_key, result)
+        return jsonify({'recognized_text': result})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+# Endpoint to perform OCR on many images, fanned out across cores
+@app.route('/ocr/batch', methods=['POST'])
+def ocr_batch_service():
+    try:
+        with stage('upload'):
+            items = collect_batch_items()
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Invalid zip archive'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+
+    if not items:
+        return jsonify({'error': 'No image files provided'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch too large, at most {MAX_BATCH_SIZE} images are allowed'}), 400
+
+    langs = request.form.get('langs', 'eng').split(',')
+    try:
+        pipeline = get_pipeline('tesseract', request.form.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Only images missing from the result cache are sent to the pool
+    cache = get_result_cache()
+    keys = [result_cache_key(data, langs, pipeline) for _, data in items]
+    cached = [cache.get(key) for key in keys]
+    executor, futures = submit_batch(items, cached, langs, pipeline)
+
+    # Results keep input order; a failed image does not fail the batch
+    results = []
+    for index, ((filename, _), key, hit, future) in enumerate(zip(items, keys, cached, futures)):
+        if hit is not None:
+            results.append({'index': index, 'filename': filename, 'recognized_text': hit})
+            continue
+        try:
+            text = future.result()
+            cache.put(key, text)
+            results.append({'index': index, 'filename': filename, 'recognized_text': text})
+        except BrokenProcessPool as e:
+            # A crashed worker breaks the pool, start a fresh one next time
+            discard_batch_executor(executor)
+            results.append({'index': index, 'filename': filename, 'error': f'Worker crashed: {e}'})
         except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            results.append({'index': index, 'filename': filename, 'error': str(e)})
+
+    return jsonify({'results': results})
+
+# Endpoint to report result cache hit/miss counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_result_cache().stats())
+
+# Queue depth and engine reuse on /metrics
+register_callback('ocr_queue_depth', 'Work waiting for or running on a worker',
+                  lambda: {('batch_images',): batch_pending}, label_names=('queue',))
+register_callback('ocr_model_cache_lookups_total', 'Engine and model cache lookups by outcome',
+                  lambda: {('hit',): engine_pool.hits, ('miss',): engine_pool.misses}, 'counter', ('result',))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
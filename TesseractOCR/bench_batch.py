@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from TesseractAPI import ocr_image_bytes, init_batch_worker, IMAGE_EXTENSIONS
+
+# Measure batch OCR throughput for 1..N worker processes on a folder of images
+# Usage: python bench_batch.py path/to/images --langs eng --max-workers 8
+
+# Function to load every image in a folder as raw bytes
+def load_images(image_dir):
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(image_dir, name), 'rb') as f:
+                images.append(f.read())
+    return images
+
+# Function used to make sure every worker has started
+def worker_ready(_):
+    return os.getpid()
+
+# Function to time one full pass over the images with a given pool size
+def run_pass(images, langs, workers):
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker) as executor:
+        # Warm every worker so engine start-up is not counted
+        list(executor.map(worker_ready, range(workers)))
+        start = time.perf_counter()
+        list(executor.map(ocr_image_bytes, images, [langs] * len(images)))
+        return time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_dir')
+    parser.add_argument('--langs', default='eng')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    images = load_images(args.image_dir)
+    if not images:
+        sys.exit(f"No images found in {args.image_dir}")
+    langs = args.langs.split(',')
+
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>10} {'images/s':>10} {'speedup':>8}")
+    for workers in range(1, args.max_workers + 1):
+        elapsed = run_pass(images, langs, workers)
+        throughput = len(images) / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>8} {elapsed:>10.2f} {throughput:>10.2f} {throughput / baseline:>8.2f}")
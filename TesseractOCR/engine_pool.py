@@ -0,0 +1,277 @@
+import os
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from PIL import Image
+import pytesseract
+
+# tesserocr keeps an initialised engine in-process; without it we fall back
+# to pytesseract, which forks a new tesseract process per call
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Path to tessdata directory
+TESSDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tessdata')
+
+# Memory budget for resident engines and combinations to load at startup,
+# e.g. TESSERACT_WARMUP_LANGS="eng;chi_sim,jpn,eng"
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get('TESSERACT_POOL_MEMORY_MB', '1024'))
+DEFAULT_WARMUP_LANGS = os.environ.get('TESSERACT_WARMUP_LANGS', 'eng')
+# Engines per language combination, so requests for one combination run in parallel
+DEFAULT_ENGINES_PER_KEY = int(os.environ.get('TESSERACT_ENGINES_PER_KEY', min(4, os.cpu_count() or 1)))
+
+# Function to normalise a language list into the pool key; the order is
+# kept, the first language is tesseract's primary one
+def normalize_langs(langs):
+    if isinstance(langs, str):
+        langs = langs.replace('+', ',').split(',')
+    key = []
+    for lang in langs:
+        if lang.strip() and lang.strip() not in key:
+            key.append(lang.strip())
+    return tuple(key)
+
+# Function to parse the warm-up setting into a list of language keys
+def parse_warmup_langs(value):
+    return [normalize_langs(combo) for combo in value.split(';') if combo.strip()]
+
+
+# A long-lived tesseract engine for one language combination. PyTessBaseAPI
+# is not thread-safe: an engine is used by one caller at a time, between
+# EngineGroup.acquire() and release().
+class TesseractEngine:
+    def __init__(self, langs, tessdata_dir):
+        self.langs = langs
+        self.lang = '+'.join(langs)
+        self.api = None
+        # Languages missing from the bundled tessdata resolve against the
+        # system tessdata, the same way pytesseract does
+        search_dirs = [tessdata_dir]
+        if tesserocr is not None:
+            search_dirs.append(tesserocr.get_languages()[0])
+        self.tessdata_path = None
+        for path in search_dirs:
+            if all(os.path.exists(os.path.join(path, lang + '.traineddata')) for lang in langs):
+                self.tessdata_path = path
+                break
+        self.size_bytes = self._estimate_size(search_dirs)
+        if tesserocr is not None:
+            if self.tessdata_path is not None:
+                self.api = tesserocr.PyTessBaseAPI(path=self.tessdata_path, lang=self.lang)
+            else:
+                self.api = tesserocr.PyTessBaseAPI(lang=self.lang)
+
+    # The resident size of an engine is dominated by its traineddata files
+    def _estimate_size(self, search_dirs):
+        size = 0
+        for lang in self.langs:
+            for tessdata_dir in search_dirs:
+                path = os.path.join(tessdata_dir, lang + '.traineddata')
+                if os.path.exists(path):
+                    size += os.path.getsize(path)
+                    break
+        return size
+
+    def image_to_string(self, image):
+        if self.api is None:
+            return pytesseract.image_to_string(image, lang=self.lang)
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(image)
+        self.api.SetImage(image)
+        return self.api.GetUTF8Text()
+
+    # Function to recognise text lines with boxes and confidences in [0, 1]
+    def image_to_lines(self, image):
+        if self.api is None:
+            return self._pytesseract_lines(image)
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(image)
+        lines = []
+        self.api.SetImage(image)
+        self.api.Recognize()
+        iterator = self.api.GetIterator()
+        level = tesserocr.RIL.TEXTLINE
+        if iterator is not None:
+            while True:
+                text = (iterator.GetUTF8Text(level) or '').strip()
+                box = iterator.BoundingBox(level)
+                if text and box is not None:
+                    x0, y0, x1, y1 = box
+                    lines.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, iterator.Confidence(level) / 100.0))
+                if not iterator.Next(level):
+                    break
+        return lines
+
+    def _pytesseract_lines(self, image):
+        data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+        grouped = {}
+        for i, word in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            if not word.strip() or conf < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            grouped.setdefault(key, []).append((word, conf, data['left'][i], data['top'][i], data['width'][i], data['height'][i]))
+        lines = []
+        for words in grouped.values():
+            x0 = min(w[2] for w in words)
+            y0 = min(w[3] for w in words)
+            x1 = max(w[2] + w[4] for w in words)
+            y1 = max(w[3] + w[5] for w in words)
+            text = ' '.join(w[0] for w in words)
+            confidence = sum(w[1] for w in words) / len(words) / 100.0
+            lines.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, confidence))
+        return lines
+
+    def close(self):
+        if self.api is not None:
+            self.api.End()
+            self.api = None
+
+
+# Engines of one language combination. Idle engines are handed out to one
+# caller at a time and more are created up to max_engines. A retired
+# (evicted) group ends idle engines at once and busy ones when they come
+# back, so no caller ever sees an engine closed under it.
+class EngineGroup:
+    def __init__(self, key, tessdata_dir, max_engines=DEFAULT_ENGINES_PER_KEY):
+        self.key = key
+        self.tessdata_dir = tessdata_dir
+        self.max_engines = max(1, max_engines)
+        self.condition = threading.Condition()
+        first = TesseractEngine(key, tessdata_dir)
+        self.engine_bytes = first.size_bytes
+        # pytesseract engines hold no state, every call runs its own process
+        self.shared = first if tesserocr is None else None
+        self.idle = [first]
+        self.count = 1
+        self.retired = False
+
+    def size_bytes(self):
+        return self.engine_bytes * self.count
+
+    def acquire(self):
+        if self.shared is not None:
+            return self.shared
+        with self.condition:
+            while not self.idle and self.count >= self.max_engines:
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.count += 1
+        # A new engine loads its traineddata outside the lock
+        try:
+            return TesseractEngine(self.key, self.tessdata_dir)
+        except Exception:
+            with self.condition:
+                self.count -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, engine):
+        if engine is self.shared:
+            return
+        with self.condition:
+            if self.retired:
+                self.count -= 1
+                engine.close()
+            else:
+                self.idle.append(engine)
+            self.condition.notify()
+
+    def retire(self):
+        with self.condition:
+            self.retired = True
+            for engine in self.idle:
+                engine.close()
+            self.count -= len(self.idle)
+            self.idle = []
+
+
+# LRU pool of engine groups keyed by the requested language combination. A
+# new group loads its first engine outside the pool lock, so a cold language
+# set does not hold up the others; concurrent requests for it wait on that
+# set's lock and the group is built once.
+class TesseractEnginePool:
+    def __init__(self, tessdata_dir=TESSDATA_DIR, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                 engines_per_key=DEFAULT_ENGINES_PER_KEY):
+        self.tessdata_dir = tessdata_dir
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.engines_per_key = engines_per_key
+        self.groups = OrderedDict()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resident_bytes(self):
+        return sum(group.size_bytes() for group in self.groups.values())
+
+    def _group(self, langs):
+        key = normalize_langs(langs)
+        if not key:
+            raise ValueError('At least one language is required')
+        with self.lock:
+            group = self.groups.get(key)
+            if group is not None:
+                self.groups.move_to_end(key)
+                self.hits += 1
+                return group
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another request may have built it while this one waited
+            with self.lock:
+                group = self.groups.get(key)
+                if group is not None:
+                    self.groups.move_to_end(key)
+                    self.hits += 1
+                    return group
+                self.misses += 1
+            try:
+                group = EngineGroup(key, self.tessdata_dir, self.engines_per_key)
+            except BaseException:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+                raise
+            with self.lock:
+                self.key_locks.pop(key, None)
+                self.groups[key] = group
+                self._evict()
+            return group
+
+    # Drop least recently used groups until the pool fits the budget,
+    # always keeping the most recent one
+    def _evict(self):
+        while len(self.groups) > 1 and self.resident_bytes() > self.memory_budget:
+            _, group = self.groups.popitem(last=False)
+            group.retire()
+
+    # Context manager lending an engine for the given languages to the caller
+    @contextmanager
+    def engine(self, langs):
+        group = self._group(langs)
+        engine = group.acquire()
+        try:
+            # A group that grew may have pushed the pool over its budget
+            with self.lock:
+                self._evict()
+            yield engine
+        finally:
+            group.release(engine)
+
+    def warm_up(self, combos):
+        for langs in combos:
+            try:
+                self._group(langs)
+            except Exception as e:
+                print(f"Failed to warm up tesseract engine for {'+'.join(langs)}: {e}")
+
+    def image_to_string(self, image, langs):
+        with self.engine(langs) as engine:
+            return engine.image_to_string(image)
+
+    def image_to_lines(self, image, langs):
+        with self.engine(langs) as engine:
+            return engine.image_to_lines(image)
@@ -1,16 +1,20 @@
 import streamlit as st
 import pytesseract
 from PIL import Image
-import uuid
 import os
+import sys
 import base64
-import cv2
-import numpy as np
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.preprocessing import get_pipeline, PRESETS
+from ocr_common.result_cache import digest_bytes
 
 # Path to tessdata directory
 TESSDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tessdata')
 
+# Recognised texts kept in memory across reruns and sessions
+RESULT_CACHE_ENTRIES = int(os.environ.get('ST_RESULT_CACHE_ENTRIES', '32'))
+
 # Function to get all language models in tessdata directory
 def get_language_models(tessdata_dir):
     lang_files = [f for f in os.listdir(tessdata_dir) if f.endswith('.traineddata')]
@@ -18,23 +22,26 @@ def get_language_models(tessdata_dir):
     return languages
 
 # Function to preprocess the image for better OCR results
-def preprocess_image(image_path):
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    _, binary_image = cv2.threshold(image, 150, 255, cv2.THRESH_BINARY_INV)
-    return binary_image
+def preprocess_image(image_data, preprocess=None):
+    return get_pipeline('tesseract', preprocess).run(image_data)
 
 # Function to run inference using multiple language models
-def inference(img_path, langs):
-    image = Image.open(img_path)
-    result = pytesseract.image_to_string(image, lang='+'.join(langs))
+def inference(image, langs):
+    result = pytesseract.image_to_string(Image.fromarray(image), lang='+'.join(langs))
     return result
 
+# Function to preprocess and recognise an upload, memoised by its hash and the
+# settings so reruns (buttons, file name edits) skip OCR; the bytes themselves
+# are not hashed again by Streamlit
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def recognize(content_digest, langs, preprocess, _image_data):
+    return inference(preprocess_image(_image_data, preprocess), list(langs))
+
 # Function to create a download link
-def create_download_link(file_path, file_name):
-    with open(file_path, "rb") as file:
-        b64 = base64.b64encode(file.read()).decode()
-        href = f'<a href="data:file/markdown;base64,{b64}" download="{file_name}">Download {file_name}</a>'
-        return href
+def create_download_link(text, file_name):
+    b64 = base64.b64encode(text.encode('utf-8')).decode()
+    href = f'<a href="data:file/markdown;base64,{b64}" download="{file_name}">Download {file_name}</a>'
+    return href
 
 # Streamlit web app
 st.title('TesseractOCR Web App V1.0')
@@ -47,41 +54,28 @@ uploaded_file = st.sidebar.file_uploader("Choose an image...", type=["jpg", "jpe
 # Get available language models
 available_langs = get_language_models(TESSDATA_DIR)
 langs = st.sidebar.multiselect('Select languages for OCR', available_langs, default=['eng'])
+preprocess = st.sidebar.selectbox('Preprocessing', ['default'] + list(PRESETS))
 
 paragraph_file_name = st.sidebar.text_input("Enter the file name for recognized text download:", "recognized_text.md")
 
 if uploaded_file is not None:
-    with TemporaryDirectory() as temp_dir:
-        bytes_data = uploaded_file.getvalue()
-        unique_filename = os.path.join(temp_dir, str(uuid.uuid4()) + '.jpg')
-        with open(unique_filename, 'wb') as f:
-            f.write(bytes_data)
-        st.image(bytes_data, caption='Uploaded Image.', use_column_width=True)
-
-        # Preprocess image
-        binary_image = preprocess_image(unique_filename)
-        processed_image_path = unique_filename.replace('.jpg', '_processed.jpg')
-        cv2.imwrite(processed_image_path, binary_image)
-
-        if not langs:
-            st.error("Please select at least one language for OCR.")
-        else:
-            # Run inference
-            st.write("Recognizing text from image...")
-            try:
-                raw_results = inference(processed_image_path, langs)
-                
-                with st.expander("Raw OCR results"):
-                    st.write(raw_results)
-                
-                if st.sidebar.button("Generate recognized text as markdown"):
-                    with st.spinner('Processing...'):
-                        with NamedTemporaryFile(delete=False, suffix=".md", dir=temp_dir) as tmp_file:
-                            tmp_file.write(raw_results.encode('utf-8'))
-                            tmp_file.flush()
-                            tmp_file.seek(0)
-                            href = create_download_link(tmp_file.name, paragraph_file_name)
-                            st.sidebar.markdown(href, unsafe_allow_html=True)
-            
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
+    bytes_data = uploaded_file.getvalue()
+    st.image(bytes_data, caption='Uploaded Image.', use_column_width=True)
+
+    if not langs:
+        st.error("Please select at least one language for OCR.")
+    else:
+        # Preprocess and run inference in memory, unless this upload and these settings were seen before
+        st.write("Recognizing text from image...")
+        try:
+            raw_results = recognize(digest_bytes(bytes_data), tuple(langs), preprocess, bytes_data)
+
+            with st.expander("Raw OCR results"):
+                st.write(raw_results)
+
+            if st.sidebar.button("Generate recognized text as markdown"):
+                href = create_download_link(raw_results, paragraph_file_name)
+                st.sidebar.markdown(href, unsafe_allow_html=True)
+
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
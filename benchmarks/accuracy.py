@@ -0,0 +1,45 @@
+import numpy as np
+
+# Function to compute the edit distance between two sequences
+def levenshtein(reference, hypothesis):
+    if len(reference) < len(hypothesis):
+        reference, hypothesis = hypothesis, reference
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_item != hyp_item)))
+        previous = current
+    return previous[-1]
+
+# Function to collapse whitespace so line breaks and paragraph spacing are not counted as errors
+def normalize_text(text):
+    return ' '.join(text.split())
+
+# Function to compute the character error rate
+def cer(reference, hypothesis):
+    reference, hypothesis = normalize_text(reference), normalize_text(hypothesis)
+    if not reference:
+        return float(bool(hypothesis))
+    return levenshtein(reference, hypothesis) / len(reference)
+
+# Function to compute the word error rate
+def wer(reference, hypothesis):
+    reference, hypothesis = normalize_text(reference).split(), normalize_text(hypothesis).split()
+    if not reference:
+        return float(bool(hypothesis))
+    return levenshtein(reference, hypothesis) / len(reference)
+
+# Function to summarise latencies in milliseconds
+def latency_summary(seconds):
+    if not seconds:
+        return None
+    values = np.asarray(seconds) * 1000.0
+    return {
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
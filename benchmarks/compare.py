@@ -0,0 +1,78 @@
+import sys
+import json
+import argparse
+
+# Compare two benchmark or load test result files and flag regressions
+# Usage: python compare.py results/baseline.json results/candidate.json --tolerance 0.05
+
+# (metric, label, True when a larger value is better)
+METRICS = (
+    (('images_per_sec',), 'images/s', True),
+    (('requests_per_sec',), 'req/s', True),
+    (('latency', 'total', 'p50_ms'), 'p50 ms', False),
+    (('latency', 'total', 'p95_ms'), 'p95 ms', False),
+    (('latency', 'total', 'p99_ms'), 'p99 ms', False),
+    (('cer',), 'CER', False),
+    (('wer',), 'WER', False),
+    (('peak_rss_mb',), 'peak RSS MB', False),
+    (('error_rate',), 'error rate', False),
+)
+ERROR_RATES = ('CER', 'WER', 'error rate')
+
+# Absolute slack for error rates, so 0.000 -> 0.001 is not reported as an infinite regression
+MIN_ERROR_DELTA = 0.005
+
+def load_results(path):
+    with open(path, 'r') as f:
+        report = json.load(f)
+    return report, {result['id']: result for result in report['results'] if 'error' not in result}
+
+def lookup(result, path):
+    value = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+# Function to decide whether a change is worse than the tolerance allows
+def is_regression(label, old, new, higher_is_better, tolerance):
+    if label in ERROR_RATES:
+        return new - old > max(MIN_ERROR_DELTA, old * tolerance)
+    if higher_is_better:
+        return new < old * (1 - tolerance)
+    return new > old * (1 + tolerance)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='relative change allowed before flagging')
+    args = parser.parse_args()
+
+    baseline_report, baseline = load_results(args.baseline)
+    candidate_report, candidate = load_results(args.candidate)
+    print(f"baseline {baseline_report['commit']} ({baseline_report['created']}) -> "
+          f"candidate {candidate_report['commit']} ({candidate_report['created']})")
+    if baseline_report['corpus']['signature'] != candidate_report['corpus']['signature']:
+        print("warning: the two runs used different corpora, accuracy is not directly comparable")
+
+    regressions = 0
+    for result_id in sorted(set(baseline) & set(candidate)):
+        print(f"\n{result_id}")
+        for path, label, higher_is_better in METRICS:
+            old, new = lookup(baseline[result_id], path), lookup(candidate[result_id], path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            flag = ''
+            if is_regression(label, old, new, higher_is_better, args.tolerance):
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"  {label:>12} {old:>10.3f} -> {new:>10.3f} ({change:+.1f}%){flag}")
+
+    for result_id in sorted(set(baseline) ^ set(candidate)):
+        print(f"\n{result_id}: only in {'baseline' if result_id in baseline else 'candidate'}")
+
+    print(f"\n{regressions} regression(s)")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,158 @@
+import os
+import sys
+import glob
+import json
+import random
+import hashlib
+import argparse
+import itertools
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Deterministic ground-truth corpus: every sample is rendered locally from a
+# fixed text list, so two runs with the same settings produce identical images
+# Usage: python corpus.py --out corpus --seed 0
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_FONT = os.path.join(ROOT_DIR, 'TesseractOCR', 'tessdata', 'pdf.ttf')
+SYSTEM_FONT_PATTERNS = (
+    '/usr/share/fonts/**/*.ttf',
+    '/usr/local/share/fonts/**/*.ttf',
+    '/Library/Fonts/*.ttf',
+    '/System/Library/Fonts/*.ttf',
+    'C:/Windows/Fonts/*.ttf',
+)
+MAX_SYSTEM_FONTS = 3
+
+TEXTS = [
+    'The quick brown fox jumps over the lazy dog.',
+    'Invoice 2023-0417 total due: $1,284.50 by 30 June.',
+    'Pack my box with five dozen liquor jugs!',
+    'Section 4.2: Results were measured over 12 runs (p < 0.05).',
+    'Call +1 (555) 010-7788 or email support@example.com',
+    'Sphinx of black quartz, judge my vow.',
+    'Item  Qty  Price\nWidget  3  9.99\nGadget  12  4.25',
+    'Optical character recognition converts images of text into machine-encoded text.',
+    'Order #A7X-993 shipped on 2024/02/29 via ground freight.',
+    'How vexingly quick daft zebras jump; 0123456789',
+]
+
+# Rendering variations, the corpus is their full cross product
+FONT_SIZES = (14, 20, 32)
+NOISE_LEVELS = (0.0, 0.08, 0.2)
+ROTATIONS = (0.0, 2.0, -6.0)
+SCALES = (1.0, 0.5)
+
+# Function to check that a font loads and actually draws glyphs; pdf.ttf is
+# tesseract's glyphless font for searchable PDFs and renders nothing visible
+def font_has_ink(font_path):
+    try:
+        font = ImageFont.truetype(font_path, 24)
+    except (OSError, ValueError):
+        return False
+    image = Image.new('L', (200, 40), 255)
+    ImageDraw.Draw(image).text((4, 4), 'Hg0', font=font, fill=0)
+    return bool((np.asarray(image) < 128).any())
+
+# Function to pick the usable fonts: the bundled one, then a few system fonts,
+# then Pillow's built-in font when nothing else is available
+def find_fonts():
+    fonts = []
+    if font_has_ink(BUNDLED_FONT):
+        fonts.append(BUNDLED_FONT)
+    else:
+        print(f"Skipping {BUNDLED_FONT}: font has no visible glyphs", file=sys.stderr)
+    system_fonts = sorted({path for pattern in SYSTEM_FONT_PATTERNS for path in glob.glob(pattern, recursive=True)})
+    usable = []
+    for path in system_fonts:
+        if len(usable) >= MAX_SYSTEM_FONTS:
+            break
+        if font_has_ink(path):
+            usable.append(path)
+    return fonts + usable or ['default']
+
+def load_font(font_path, size):
+    if font_path == 'default':
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(font_path, size)
+
+# Function to render one sample as a grayscale page, black text on white
+def render_sample(text, font_path, size, noise, rotation, scale, rng):
+    font = load_font(font_path, size)
+    margin = size
+    probe = ImageDraw.Draw(Image.new('L', (1, 1), 255))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), text, font=font, spacing=size // 2)
+    image = Image.new('L', (right - left + 2 * margin, bottom - top + 2 * margin), 255)
+    ImageDraw.Draw(image).multiline_text((margin - left, margin - top), text, font=font, fill=0, spacing=size // 2)
+    page = np.asarray(image, dtype=np.uint8)
+
+    if rotation:
+        h, w = page.shape
+        matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), rotation, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        new_w, new_h = int(h * sin + w * cos), int(h * cos + w * sin)
+        matrix[0, 2] += new_w / 2.0 - w / 2.0
+        matrix[1, 2] += new_h / 2.0 - h / 2.0
+        page = cv2.warpAffine(page, matrix, (new_w, new_h), flags=cv2.INTER_LINEAR, borderValue=255)
+
+    if noise:
+        # Gaussian sensor noise plus salt-and-pepper specks, both seeded
+        np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+        noisy = page.astype(np.float32) + np_rng.normal(0, noise * 255, page.shape)
+        specks = np_rng.random(page.shape)
+        noisy[specks < noise / 20] = 0
+        noisy[specks > 1 - noise / 20] = 255
+        page = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    if scale != 1.0:
+        page = cv2.resize(page, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return page
+
+# Function to fingerprint everything that determines the corpus contents
+def corpus_signature(fonts, seed):
+    settings = {
+        'texts': TEXTS, 'fonts': [os.path.basename(f) for f in fonts], 'seed': seed,
+        'sizes': FONT_SIZES, 'noise': NOISE_LEVELS, 'rotations': ROTATIONS, 'scales': SCALES,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+# Function to render the corpus into out_dir, reusing it when it is already up to date
+def build_corpus(out_dir, seed=0):
+    fonts = find_fonts()
+    signature = corpus_signature(fonts, seed)
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('signature') == signature:
+            return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    samples = []
+    for index, (font_path, size, noise, rotation, scale) in enumerate(
+            itertools.product(fonts, FONT_SIZES, NOISE_LEVELS, ROTATIONS, SCALES)):
+        text = TEXTS[rng.randrange(len(TEXTS))]
+        page = render_sample(text, font_path, size, noise, rotation, scale, rng)
+        filename = f'sample_{index:04d}.png'
+        cv2.imwrite(os.path.join(out_dir, filename), page)
+        samples.append({
+            'file': filename, 'text': text, 'font': os.path.basename(font_path),
+            'size': size, 'noise': noise, 'rotation': rotation, 'scale': scale,
+        })
+
+    manifest = {'signature': signature, 'seed': seed, 'samples': samples}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = build_corpus(args.out, args.seed)
+    fonts = sorted({sample['font'] for sample in manifest['samples']})
+    print(f"{len(manifest['samples'])} samples in {args.out} (fonts: {', '.join(fonts)})", file=sys.stderr)
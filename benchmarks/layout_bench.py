@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.layout import analyze, layout_paragraphs
+
+# Speed and reading-order quality of ocr_common.layout on dense synthetic
+# pages, against the per-engine paragraph loops it replaced. Pages have a
+# spanning title over several columns of word boxes with jittered heights,
+# so the true reading order and paragraphs are known.
+# Usage: python layout_bench.py --sizes 1000,10000,50000 --columns 3
+
+LINE_HEIGHT = 20
+LINE_PITCH = 28
+WORD_WIDTH = 48
+WORD_PITCH = 60
+
+# Function to build one page of word boxes in true reading order; returns
+# (boxes, texts, paragraph count)
+def synthetic_page(boxes_wanted, columns, words_per_line=10, lines_per_paragraph=6, seed=0):
+    rng = random.Random(seed)
+    column_width = words_per_line * WORD_PITCH + 60
+    boxes, texts = [], []
+
+    def add_line(x, y, words, prefix):
+        for word in range(words):
+            left = x + word * WORD_PITCH + rng.uniform(-2, 2)
+            top = y + rng.uniform(-2, 2)
+            height = LINE_HEIGHT + rng.uniform(-2, 2)
+            boxes.append([[left, top], [left + WORD_WIDTH, top], [left + WORD_WIDTH, top + height], [left, top + height]])
+            texts.append(f'{prefix}w{word}')
+
+    add_line(40, 20, columns * words_per_line // 2, 'title')
+    lines_per_column = max(1, (boxes_wanted - len(boxes)) // (columns * words_per_line))
+    paragraphs = 1
+    for column in range(columns):
+        y = 80
+        for line in range(lines_per_column):
+            if line and line % lines_per_paragraph == 0:
+                y += LINE_PITCH  # blank line between paragraphs
+            first = line % lines_per_paragraph == 0
+            add_line(40 + column * column_width + (40 if first else 0), y, words_per_line - (1 if first else 0),
+                     f'c{column}l{line}')
+            paragraphs += first
+            y += LINE_PITCH
+    return boxes, texts, paragraphs
+
+# The three implementations the layout module replaced, kept here as the baseline
+
+# PaddleOCR/st.py: sort by the top-left corner, split on a 10 px jump in top y
+def legacy_paddle_st(ocr_result):
+    text_info = sorted([(line[0], line[1][0], line[1][1]) for line in ocr_result],
+                       key=lambda x: (x[0][0][1], x[0][0][0]))
+    paragraphs, current, last_y = [], [], None
+    for box, text, confidence in text_info:
+        if last_y is not None and box[0][1] - last_y > 10:
+            paragraphs.append(' '.join(current))
+            current = []
+        current.append(text)
+        last_y = box[0][1]
+    if current:
+        paragraphs.append(' '.join(current))
+    return [text for _, text, _ in text_info], paragraphs
+
+# EasyOCR/easyocr_core.py: engine order, split on a 15 px change in bottom y
+def legacy_easyocr(results):
+    paragraphs, current, last_bottom = [], [], None
+    for bbox, text, prob in results:
+        bottom = max(bbox, key=lambda x: x[1])[1]
+        if last_bottom is not None and abs(bottom - last_bottom) > 15:
+            paragraphs.append(' '.join(current))
+            current = []
+        current.append(text)
+        last_bottom = bottom
+    if current:
+        paragraphs.append(' '.join(current))
+    return [text for _, text, _ in results], paragraphs
+
+# PaddleOCR/PaddleAPI.py: engine order, everything joined with spaces
+def legacy_paddle_api(ocr_result):
+    texts = [line[1][0] for line in ocr_result]
+    return texts, [' '.join(texts)]
+
+# Function to run the layout module the way the apps call it
+def layout_module(boxes, texts):
+    layout = analyze(boxes)
+    return [texts[index] for index in layout['order']], layout_paragraphs(texts, layout)
+
+# Function to score an order: the share of words followed by the same word as in the true order
+def order_accuracy(truth, predicted):
+    successor = dict(zip(truth, truth[1:]))
+    hits = sum(1 for a, b in zip(predicted, predicted[1:]) if successor.get(a) == b)
+    return hits / max(1, len(truth) - 1)
+
+def best_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(sizes, columns, repeat, seed):
+    rows = []
+    for size in sizes:
+        boxes, texts, true_paragraphs = synthetic_page(size, columns, seed=seed)
+        # Engines report detections roughly top to bottom; mimic that order
+        engine_order = sorted(range(len(boxes)), key=lambda index: (round(boxes[index][0][1]), boxes[index][0][0]))
+        engine_boxes = [boxes[index] for index in engine_order]
+        engine_texts = [texts[index] for index in engine_order]
+        paddle_result = [(box, (text, 0.9)) for box, text in zip(engine_boxes, engine_texts)]
+        easyocr_result = [(box, text, 0.9) for box, text in zip(engine_boxes, engine_texts)]
+
+        for name, function in (
+                ('layout', lambda: layout_module(engine_boxes, engine_texts)),
+                ('legacy_paddle_st', lambda: legacy_paddle_st(paddle_result)),
+                ('legacy_easyocr', lambda: legacy_easyocr(easyocr_result)),
+                ('legacy_paddle_api', lambda: legacy_paddle_api(paddle_result))):
+            seconds, (ordered, paragraphs) = best_time(function, repeat)
+            rows.append({
+                'implementation': name,
+                'boxes': len(boxes),
+                'columns': columns,
+                'ms': round(seconds * 1000, 2),
+                'us_per_box': round(seconds * 1e6 / len(boxes), 3),
+                'order_accuracy': round(order_accuracy(texts, ordered), 4),
+                'paragraphs': len(paragraphs),
+                'true_paragraphs': true_paragraphs,
+            })
+    return rows
+
+def print_table(rows):
+    print(f"{'implementation':<20}{'boxes':>8}{'ms':>10}{'us/box':>9}{'order':>8}{'paras':>8}{'truth':>7}")
+    for row in rows:
+        print(f"{row['implementation']:<20}{row['boxes']:>8}{row['ms']:>10.2f}{row['us_per_box']:>9.3f}"
+              f"{row['order_accuracy']:>8.3f}{row['paragraphs']:>8}{row['true_paragraphs']:>7}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark reading order and paragraph reconstruction')
+    parser.add_argument('--sizes', default='1000,5000,20000,50000', help='boxes per page, comma separated')
+    parser.add_argument('--columns', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='optional JSON results file')
+    args = parser.parse_args()
+
+    rows = run([int(size) for size in args.sizes.split(',')], args.columns, args.repeat, args.seed)
+    print_table(rows)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(rows, f, indent=1)
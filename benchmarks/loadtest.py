@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import hashlib
+import platform
+import argparse
+import itertools
+import mimetypes
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from accuracy import latency_summary
+from run_benchmarks import git_commit
+
+# Replay a corpus of images or PDFs against the OCR APIs at stepped
+# concurrency (closed loop) or request rate (open loop), and report throughput,
+# latency percentiles, error rates and the load at which latency degrades.
+# Services are started locally with --start, optionally on the stand-in
+# engines in stubs/ (--stub) so the HTTP, preprocessing and queueing paths can
+# be saturated without the models; the result cache is disabled in services
+# started here so repeated files are really processed.
+# Usage: python loadtest.py --targets tesseract,easyocr --start --stub --concurrency 1,2,4,8,16
+#        python loadtest.py --targets deepdoc --url http://127.0.0.1:8000 --corpus pdfs/ --rps 0.5,1,2
+#        python compare.py results/loadtest-old.json results/loadtest-new.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+STUBS_DIR = os.path.join(BENCH_DIR, 'stubs')
+DEFAULT_CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# Each API's upload route and form field, what it accepts, how it is started
+# locally (its own __main__, or uvicorn when it has none) and a route that
+# answers 200 once it is ready
+TARGETS = {
+    'tesseract': {'port': 5000, 'path': '/ocr', 'field': 'image', 'kind': 'image', 'dir': 'TesseractOCR',
+                  'command': ['TesseractAPI.py'], 'ready': '/languages'},
+    'paddle': {'port': 5001, 'path': '/ocr', 'field': 'image', 'kind': 'image', 'dir': 'PaddleOCR',
+               'command': ['PaddleAPI.py'], 'ready': '/models'},
+    'easyocr': {'port': 5002, 'path': '/ocr', 'field': 'image', 'kind': 'image', 'dir': 'EasyOCR',
+                'command': ['EasyOCRAPI.py'], 'ready': '/languages'},
+    'gateway': {'port': 5003, 'path': '/ocr', 'field': 'image', 'kind': 'image', 'dir': 'Gateway',
+                'command': ['GatewayAPI.py'], 'ready': '/engines'},
+    'deepdoc': {'port': 8000, 'path': '/process-pdf/', 'field': 'file', 'kind': 'pdf', 'dir': 'DeepDoc',
+                'command': ['DeepDocAPI.py'], 'ready': '/ready'},
+    'deepdoc_api': {'port': 8001, 'path': '/deepdoc-api/', 'field': 'file', 'kind': 'pdf', 'dir': 'DeepDoc',
+                    'command': ['-m', 'uvicorn', 'st_api:app', '--host', '127.0.0.1', '--port', '8001'],
+                    'ready': '/ready'},
+}
+
+# Function to list the files of one kind under a directory, recursively
+def find_files(corpus_dir, kind):
+    extensions = ('.pdf',) if kind == 'pdf' else IMAGE_EXTENSIONS
+    paths = []
+    for root, _, names in os.walk(corpus_dir):
+        paths += [os.path.join(root, name) for name in names if name.lower().endswith(extensions)]
+    return sorted(paths)
+
+# Function to turn the synthetic corpus images into small multi-page scanned PDFs
+def build_pdfs(image_paths, out_dir, pages_per_pdf):
+    from PIL import Image
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for index in range(0, len(image_paths), pages_per_pdf):
+        pages = [Image.open(path).convert('RGB') for path in image_paths[index:index + pages_per_pdf]]
+        path = os.path.join(out_dir, f'document_{index // pages_per_pdf:04d}.pdf')
+        if not os.path.exists(path):
+            pages[0].save(path, save_all=True, append_images=pages[1:], resolution=150)
+        paths.append(path)
+    return paths
+
+# Function to pick the files to replay for one kind of target; without a
+# corpus directory the benchmark corpus is rendered (and PDFs built from it)
+def load_corpus(corpus_dir, kind, pages_per_pdf):
+    if corpus_dir is None:
+        from corpus import build_corpus
+        manifest = build_corpus(DEFAULT_CORPUS_DIR)
+        paths = [os.path.join(DEFAULT_CORPUS_DIR, sample['file']) for sample in manifest['samples']]
+        if kind == 'pdf':
+            paths = build_pdfs(paths, os.path.join(DEFAULT_CORPUS_DIR, f'pdf-{pages_per_pdf}'), pages_per_pdf)
+        return paths
+    return find_files(corpus_dir, kind)
+
+# Function to build a multipart/form-data body with one file field and any extra fields
+def encode_multipart(path, field, form):
+    boundary = uuid.uuid4().hex
+    with open(path, 'rb') as f:
+        data = f.read()
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    body = b''.join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in form.items())
+    body += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{os.path.basename(path)}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}', data
+
+# Function to fingerprint the replayed files so runs on different corpora are flagged
+def corpus_signature(contents):
+    digests = sorted(hashlib.sha256(data).hexdigest() for data in contents)
+    return hashlib.sha256(''.join(digests).encode()).hexdigest()[:16]
+
+# Function to send one request and read the whole response; returns
+# (seconds, outcome) where outcome is 'ok', an HTTP status, 'timeout' or 'connection'
+def send(url, body, content_type, timeout, started=None):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    started = time.perf_counter() if started is None else started
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        outcome = 'ok'
+    except urllib.error.HTTPError as e:
+        e.read()
+        outcome = str(e.code)
+    except TimeoutError:
+        outcome = 'timeout'
+    except (urllib.error.URLError, ConnectionError, OSError) as e:
+        outcome = 'timeout' if isinstance(getattr(e, 'reason', None), TimeoutError) else 'connection'
+    return time.perf_counter() - started, outcome
+
+# Function to keep `concurrency` requests in flight for `duration` seconds
+def run_closed_loop(url, bodies, concurrency, duration, timeout):
+    counter = itertools.count()
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            body, content_type = bodies[next(counter) % len(bodies)]
+            samples.append(send(url, body, content_type, timeout))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+# Function to send requests at a fixed rate for `duration` seconds whatever
+# the response times; latency counts from the scheduled send time, so time
+# spent waiting for a free client thread is not hidden
+def run_open_loop(url, bodies, rps, duration, timeout, max_in_flight):
+    total = max(1, int(round(rps * duration)))
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for index in range(total):
+            scheduled = start + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            body, content_type = bodies[index % len(bodies)]
+            futures.append(executor.submit(send, url, body, content_type, timeout, scheduled))
+        samples = [future.result() for future in futures]
+    return samples, time.perf_counter() - start
+
+# Function to summarise one load step in the shape compare.py reads
+def summarize_step(target, mode, load, samples, elapsed):
+    errors = {}
+    for _, outcome in samples:
+        if outcome != 'ok':
+            errors[outcome] = errors.get(outcome, 0) + 1
+    ok = [seconds for seconds, outcome in samples if outcome == 'ok']
+    return {
+        'id': f'{target}:{mode}={load:g}',
+        'target': target,
+        'mode': mode,
+        'load': load,
+        'seconds': round(elapsed, 3),
+        'requests': len(samples),
+        'ok': len(ok),
+        'errors': errors,
+        'error_rate': round(1 - len(ok) / len(samples), 4) if samples else None,
+        'requests_per_sec': round(len(ok) / elapsed, 3) if elapsed else None,
+        'latency': {'total': latency_summary(ok)},
+    }
+
+# Function to find the first step where p95 latency exceeds knee_factor times
+# the lightest step's, or the error rate exceeds max_error_rate
+def find_saturation(steps, knee_factor, max_error_rate):
+    measured = [step for step in steps if step['latency']['total'] is not None]
+    if not measured:
+        return None
+    baseline_p95 = measured[0]['latency']['total']['p95_ms']
+    peak = max(measured, key=lambda step: step['requests_per_sec'])
+    saturation = {
+        'baseline_p95_ms': baseline_p95,
+        'peak_requests_per_sec': peak['requests_per_sec'],
+        'peak_at': peak['load'],
+        'degrades_at': None,
+        'last_good': steps[-1]['load'],
+        'reason': None,
+    }
+    for previous, step in zip([None] + steps, steps):
+        reasons = []
+        if step['error_rate'] is not None and step['error_rate'] > max_error_rate:
+            reasons.append(f"error rate {step['error_rate']:.1%}")
+        summary = step['latency']['total']
+        if summary is not None and summary['p95_ms'] > knee_factor * baseline_p95:
+            reasons.append(f"p95 {summary['p95_ms']:.0f} ms > {knee_factor:g}x {baseline_p95:.0f} ms")
+        if reasons:
+            saturation.update(degrades_at=step['load'], last_good=previous['load'] if previous else None,
+                              reason='; '.join(reasons))
+            break
+    return saturation
+
+# Function to wait until a started service answers 200 on its ready route
+def wait_ready(url, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(1)
+    return False
+
+def is_listening(url):
+    try:
+        urllib.request.urlopen(url, timeout=2).read()
+        return True
+    except urllib.error.HTTPError:
+        return True
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+# Function to start a service in its own process group, with the result
+# cache off and, for --stub, the stand-in engines ahead of the real ones
+def start_service(name, stub, log_path):
+    target = TARGETS[name]
+    env = dict(os.environ, OCR_CACHE_ENABLED='0', PYTHONUNBUFFERED='1')
+    if stub:
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [STUBS_DIR, os.environ.get('PYTHONPATH')]))
+        env['DEEPDOC_RAGFLOW_DIR'] = STUBS_DIR
+    log = open(log_path, 'ab')
+    return subprocess.Popen([sys.executable] + target['command'], cwd=os.path.join(ROOT_DIR, target['dir']),
+                            env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+# Function to stop a started service and any worker processes it forked or spawned
+def stop_service(server):
+    for sig, wait in ((signal.SIGTERM, 30), (signal.SIGKILL, 10)):
+        try:
+            os.killpg(server.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            server.wait(timeout=wait)
+            break
+        except subprocess.TimeoutExpired:
+            continue
+
+def print_step(step):
+    summary = step['latency']['total'] or {}
+    print(f"{step['load']:>11g} {step['requests']:>8} {step['requests_per_sec'] or 0:>9.2f} "
+          f"{summary.get('p50_ms', float('nan')):>9.1f} {summary.get('p95_ms', float('nan')):>9.1f} "
+          f"{summary.get('p99_ms', float('nan')):>9.1f} {step['error_rate'] or 0:>7.1%}", file=sys.stderr)
+
+# Function to run the whole load ramp against one target
+def run_target(name, args, loads, mode, form, log_path):
+    target = TARGETS[name]
+    base_url = args.url.rstrip('/') if args.url else f'http://127.0.0.1:{target["port"]}'
+    paths = load_corpus(args.corpus, target['kind'], args.pdf_pages)[:args.max_files or None]
+    if not paths:
+        return {'error': f"no {target['kind']} files to replay"}, []
+    encoded = [encode_multipart(path, target['field'], form) for path in paths]
+    bodies = [(body, content_type) for body, content_type, _ in encoded]
+    info = {
+        'url': base_url + target['path'],
+        'started': args.start,
+        'stub': args.start and args.stub,
+        'corpus': {'files': len(paths), 'bytes': sum(len(data) for _, _, data in encoded),
+                   'signature': corpus_signature([data for _, _, data in encoded])},
+    }
+
+    server = None
+    if args.start:
+        if is_listening(base_url + target['ready']):
+            return dict(info, error=f'something already listens on {base_url}, pass --url to test it'), []
+        server = start_service(name, args.stub, log_path)
+    try:
+        if not wait_ready(base_url + target['ready'], server, args.ready_timeout):
+            return dict(info, error=f'not ready, see {log_path}' if server else 'not ready'), []
+
+        # First requests load lazily created models and pools, keep them out of the numbers
+        for body, content_type in bodies[:args.warmup]:
+            send(info['url'], body, content_type, args.timeout)
+
+        print(f"{mode:>11} {'requests':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}",
+              file=sys.stderr)
+        steps = []
+        for load in loads:
+            if mode == 'concurrency':
+                samples, elapsed = run_closed_loop(info['url'], bodies, int(load), args.duration, args.timeout)
+            else:
+                samples, elapsed = run_open_loop(info['url'], bodies, load, args.duration, args.timeout,
+                                                 args.max_in_flight)
+            step = summarize_step(name, mode, load, samples, elapsed)
+            print_step(step)
+            steps.append(step)
+            if step['error_rate'] is not None and step['error_rate'] >= args.abort_error_rate:
+                print(f"  stopping the ramp, {step['error_rate']:.0%} of requests failed", file=sys.stderr)
+                break
+    finally:
+        if server is not None:
+            stop_service(server)
+
+    info['saturation'] = find_saturation(steps, args.knee_factor, args.max_error_rate)
+    return info, steps
+
+def parse_loads(value):
+    return [float(load) for load in value.split(',') if load.strip()]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the OCR APIs')
+    parser.add_argument('--targets', default=','.join(TARGETS), help=f"comma separated, from {', '.join(TARGETS)}")
+    parser.add_argument('--url', default=None, help='base URL of an already running service (single target)')
+    parser.add_argument('--start', action='store_true', help='start each service locally for the run')
+    parser.add_argument('--stub', action='store_true', help='with --start, use the stand-in engines in stubs/')
+    parser.add_argument('--corpus', default=None, help='directory of images/PDFs, defaults to the benchmark corpus')
+    parser.add_argument('--max-files', type=int, default=0, help='replay at most this many files')
+    parser.add_argument('--pdf-pages', type=int, default=3, help='pages per PDF built from the benchmark corpus')
+    parser.add_argument('--form', action='append', default=[], help='extra form field, e.g. --form langs=eng')
+    load_group = parser.add_mutually_exclusive_group()
+    load_group.add_argument('--concurrency', default=None, help='closed-loop steps, e.g. 1,2,4,8,16')
+    load_group.add_argument('--rps', default=None, help='open-loop request rates, e.g. 1,2,5,10')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per step')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured requests before the ramp')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--max-in-flight', type=int, default=256, help='client threads for --rps')
+    parser.add_argument('--ready-timeout', type=float, default=600)
+    parser.add_argument('--knee-factor', type=float, default=2.0, help='p95 growth over the first step that counts as degraded')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='error rate that counts as degraded')
+    parser.add_argument('--abort-error-rate', type=float, default=0.5, help='stop a ramp once this many requests fail')
+    parser.add_argument('--out', default=None, help='results file, defaults to results/loadtest-<time>-<commit>.json')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.targets.split(',') if name.strip()]
+    unknown = [name for name in names if name not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target(s) {', '.join(unknown)}, choose from {', '.join(TARGETS)}")
+    if args.url and (args.start or len(names) != 1):
+        parser.error('--url needs exactly one target and no --start')
+    mode, loads = ('rps', parse_loads(args.rps)) if args.rps else ('concurrency', parse_loads(args.concurrency or '1,2,4,8,16'))
+    form = dict(field.split('=', 1) for field in args.form)
+
+    commit = git_commit()
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    out_path = args.out or os.path.join(DEFAULT_RESULTS_DIR, f'loadtest-{stamp}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+
+    targets, results = {}, []
+    for name in names:
+        print(f"Load testing {name}", file=sys.stderr)
+        log_path = os.path.splitext(os.path.abspath(out_path))[0] + f'-{name}.log'
+        info, steps = run_target(name, args, loads, mode, form, log_path)
+        targets[name] = info
+        results += steps
+        if 'error' in info:
+            print(f"  {info['error']}", file=sys.stderr)
+        elif info['saturation'] and info['saturation']['degrades_at'] is not None:
+            saturation = info['saturation']
+            print(f"  degrades at {mode} {saturation['degrades_at']:g} ({saturation['reason']}), "
+                  f"peak {saturation['peak_requests_per_sec']} req/s at {saturation['peak_at']:g}", file=sys.stderr)
+        elif info['saturation']:
+            print(f"  no degradation up to {mode} {loads[-1]:g}, "
+                  f"peak {info['saturation']['peak_requests_per_sec']} req/s", file=sys.stderr)
+
+    signatures = sorted({info['corpus']['signature'] for info in targets.values() if 'corpus' in info})
+    report = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpu_count': os.cpu_count()},
+        'corpus': {'signature': ','.join(signatures)},
+        'settings': {'mode': mode, 'loads': loads, 'duration': args.duration, 'warmup': args.warmup, 'form': form,
+                     'knee_factor': args.knee_factor, 'max_error_rate': args.max_error_rate},
+        'targets': targets,
+        'results': results,
+    }
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {out_path}", file=sys.stderr)
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+from corpus import build_corpus
+from run_benchmarks import run_worker, config_id, DEFAULT_CORPUS_DIR, DEFAULT_RESULTS_DIR, ENGINES, git_commit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.preprocessing import PRESETS, ENGINE_DEFAULTS
+
+# Latency saved versus accuracy for each preprocessing pipeline, per engine.
+# Every pipeline runs over the same corpus; numbers are relative to 'legacy',
+# the fixed threshold at full resolution every app used before.
+# Usage: python preprocess_sweep.py --engines tesseract,easyocr --upsample 4
+#        python preprocess_sweep.py --pipelines legacy,fast,resize:1024,otsu
+
+# Function to write an upsampled JPEG copy of the corpus, standing in for
+# high-resolution phone photos where resolution normalisation matters most
+def upsampled_corpus(corpus_dir, factor):
+    out_dir = f'{corpus_dir}_x{factor}'
+    with open(os.path.join(corpus_dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            if json.load(f).get('signature') == manifest['signature']:
+                return out_dir
+    os.makedirs(out_dir, exist_ok=True)
+    for sample in manifest['samples']:
+        image = cv2.imread(os.path.join(corpus_dir, sample['file']), cv2.IMREAD_GRAYSCALE)
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+        sample['file'] = os.path.splitext(sample['file'])[0] + '.jpg'
+        cv2.imwrite(os.path.join(out_dir, sample['file']), image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return out_dir
+
+# Function to sum the decode and preprocessing stage means of one result
+def preprocess_ms(result):
+    return sum(summary['mean_ms'] for name, summary in result['latency'].items()
+               if summary and name not in ('total', 'inference'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--pipelines', default=None, help="';'-separated presets or stage lists, defaults to every preset")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--upsample', type=int, default=1, help='enlarge the corpus N times before the sweep')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus)
+    build_corpus(corpus_dir)
+    if args.upsample > 1:
+        corpus_dir = upsampled_corpus(corpus_dir, args.upsample)
+    pipelines = args.pipelines.split(';') if args.pipelines else ['legacy', 'default'] + [name for name in PRESETS if name != 'legacy']
+
+    results = []
+    for engine in [name.strip() for name in args.engines.split(',') if name.strip()]:
+        configs = run_worker(['--list-configs', engine])
+        if not configs:
+            print(f"{engine}: could not list configurations, is it installed?", file=sys.stderr)
+            continue
+        # The sweep varies preprocessing only, so one model configuration per engine is enough
+        base = configs[0]
+        rows = []
+        for pipeline in pipelines:
+            config = dict(base, preprocess=pipeline)
+            result = run_worker(['--worker', json.dumps(config), '--corpus', corpus_dir, '--warmup', str(args.warmup)])
+            if result is None:
+                print(f"{config_id(config)} failed, see output above", file=sys.stderr)
+                continue
+            rows.append((pipeline, result))
+            results.append(result)
+
+        baseline = next((result for pipeline, result in rows if pipeline == 'legacy'), None)
+        print(f"\n{config_id(base)} (default: {ENGINE_DEFAULTS.get('paddleocr' if engine == 'paddle' else engine)})")
+        print(f"{'pipeline':<40} {'prep ms':>9} {'infer ms':>9} {'total ms':>9} {'saved ms':>9} {'CER':>7} {'dCER':>7}")
+        for pipeline, result in rows:
+            total = result['latency']['total']['mean_ms']
+            saved = baseline['latency']['total']['mean_ms'] - total if baseline else 0.0
+            delta_cer = result['cer'] - baseline['cer'] if baseline else 0.0
+            print(f"{result['preprocess'] or pipeline:<40} {preprocess_ms(result):>9.2f} "
+                  f"{result['latency']['inference']['mean_ms']:>9.2f} {total:>9.2f} {saved:>9.2f} "
+                  f"{result['cer']:>7.4f} {delta_cer:>+7.4f}")
+
+    report = {'commit': git_commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'upsample': args.upsample, 'results': results}
+    out_path = args.out or os.path.join(DEFAULT_RESULTS_DIR, f"preprocess-{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nResults written to {out_path}", file=sys.stderr)
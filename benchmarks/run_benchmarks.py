@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import resource
+import platform
+import argparse
+import subprocess
+from accuracy import cer, wer, latency_summary
+from corpus import build_corpus
+
+# Run every engine over the synthetic corpus and store throughput, per-stage
+# latency, peak RSS and CER/WER as JSON. Each engine configuration runs in its
+# own process so model loads and peak memory do not leak between them.
+# Usage: python run_benchmarks.py --engines tesseract,paddle,easyocr
+#        python compare.py results/old.json results/new.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+DEFAULT_CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+ENGINES = ('tesseract', 'paddle', 'easyocr')
+
+# Function to describe one configuration as a stable id for comparisons
+def config_id(config):
+    return ':'.join(f'{key}={config[key]}' for key in sorted(config))
+
+# Function to import an engine's modules the way its own apps do
+def use_engine_dir(name):
+    os.chdir(os.path.join(ROOT_DIR, name))
+    sys.path.insert(0, os.path.join(ROOT_DIR, name))
+
+# Function to build the preprocessing pipeline and inference call for one configuration
+def load_pipeline(config):
+    from ocr_common.preprocessing import get_pipeline
+    engine = config['engine']
+    if engine == 'tesseract':
+        use_engine_dir('TesseractOCR')
+        import TesseractAPI
+        langs = config['langs'].split(',')
+        return get_pipeline('tesseract', config.get('preprocess')), lambda image: TesseractAPI.inference(image, langs)
+    if engine == 'paddle':
+        use_engine_dir('PaddleOCR')
+        from profiles import resolve_profile
+        profile = resolve_profile(config['profile']) if config.get('profile') else None
+        det = config.get('det') or (profile and profile['det'])
+        rec = config.get('rec') or (profile and profile['rec'])
+        # The benchmarked pair becomes the default so PaddleAPI loads only that model
+        if det:
+            os.environ['PADDLE_DET_MODEL'] = det
+        if rec:
+            os.environ['PADDLE_REC_MODEL'] = rec
+        import PaddleAPI
+        return get_pipeline('paddleocr', config.get('preprocess')), lambda image: PaddleAPI.inference(image, det, rec, profile=profile)
+    if engine == 'easyocr':
+        use_engine_dir('EasyOCR')
+        import easyocr_core
+        langs = config['langs'].split(',')
+        return get_pipeline('easyocr', config.get('preprocess')), lambda image: easyocr_core.inference_with_formatting(image, langs)
+    raise KeyError(f"Unknown engine '{engine}', choose from {list(ENGINES)}")
+
+# Function to list the configurations of one engine; Paddle gets one per bundled
+# det and rec model and one per request profile whose models are bundled
+def list_configs(engine):
+    if engine == 'tesseract':
+        return [{'engine': 'tesseract', 'langs': 'eng'}]
+    if engine == 'easyocr':
+        return [{'engine': 'easyocr', 'langs': 'en'}]
+    if engine == 'paddle':
+        use_engine_dir('PaddleOCR')
+        from model_store import ensure_models, is_complete
+        from model_cache import DET_MODELS, REC_MODELS, DEFAULT_DET_MODEL, DEFAULT_REC_MODEL
+        from profiles import PROFILES
+        ensure_models()
+        dets = [det for det, path in DET_MODELS.items() if is_complete(path)]
+        recs = [rec for rec, spec in REC_MODELS.items() if is_complete(spec['dir'])]
+        if not dets or not recs:
+            return []
+        # Each model is paired with the default of the other kind, or the
+        # first bundled one when the default's files are not on disk
+        base_det = DEFAULT_DET_MODEL if DEFAULT_DET_MODEL in dets else dets[0]
+        base_rec = DEFAULT_REC_MODEL if DEFAULT_REC_MODEL in recs else recs[0]
+        configs = [{'engine': 'paddle', 'det': det, 'rec': base_rec} for det in dets]
+        configs += [{'engine': 'paddle', 'det': base_det, 'rec': rec} for rec in recs if rec != base_rec]
+        configs += [{'engine': 'paddle', 'profile': name} for name, profile in PROFILES.items()
+                    if is_complete(DET_MODELS[profile['det'] or DEFAULT_DET_MODEL])
+                    and is_complete(REC_MODELS[profile['rec'] or DEFAULT_REC_MODEL]['dir'])]
+        return configs
+    raise KeyError(f"Unknown engine '{engine}', choose from {list(ENGINES)}")
+
+# Function to read this process's peak resident set size in MB
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+# Function to run one configuration over the corpus, inside a worker process
+def run_config(config, corpus_dir, warmup):
+    with open(os.path.join(corpus_dir, 'manifest.json'), 'r') as f:
+        samples = json.load(f)['samples']
+
+    start = time.perf_counter()
+    pipeline, infer = load_pipeline(config)
+    load_seconds = time.perf_counter() - start
+
+    images = []
+    for sample in samples:
+        with open(os.path.join(corpus_dir, sample['file']), 'rb') as f:
+            images.append(f.read())
+
+    # First calls allocate buffers and pick kernels, keep them out of the numbers
+    for image_data in images[:warmup]:
+        infer(pipeline.run(image_data))
+
+    # Decode and every preprocessing stage are timed separately, then inference
+    timings = {}
+    totals = []
+    errors = []
+    for sample, image_data in zip(samples, images):
+        stage_timings = {}
+        image = pipeline.run(image_data, stage_timings)
+        start = time.perf_counter()
+        value = infer(image)
+        stage_timings['inference'] = time.perf_counter() - start
+        for name, elapsed in stage_timings.items():
+            timings.setdefault(name, []).append(elapsed)
+        totals.append(sum(stage_timings.values()))
+        errors.append({'cer': cer(sample['text'], value), 'wer': wer(sample['text'], value), 'sample': sample})
+
+    # Accuracy broken down by each rendering variation
+    breakdown = {}
+    for variation in ('font', 'size', 'noise', 'rotation', 'scale'):
+        groups = {}
+        for error in errors:
+            groups.setdefault(str(error['sample'][variation]), []).append(error['cer'])
+        breakdown[variation] = {value: round(sum(cers) / len(cers), 4) for value, cers in sorted(groups.items())}
+
+    return {
+        'id': config_id(config),
+        'config': config,
+        'preprocess': pipeline.spec,
+        'images': len(samples),
+        'load_seconds': round(load_seconds, 3),
+        'images_per_sec': round(len(samples) / sum(totals), 3) if sum(totals) else None,
+        'latency': {'total': latency_summary(totals), **{name: latency_summary(values) for name, values in timings.items()}},
+        'cer': round(sum(e['cer'] for e in errors) / len(errors), 4),
+        'wer': round(sum(e['wer'] for e in errors) / len(errors), 4),
+        'cer_by_variation': breakdown,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+# Function to run a worker subprocess and read its JSON result from the last line of stdout
+def run_worker(args):
+    env = dict(os.environ, OCR_CACHE_ENABLED='0')
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__)] + args,
+                          cwd=BENCH_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.strip()]
+    if proc.returncode != 0 or not lines:
+        return None
+    return json.loads(lines[-1])
+
+# Function to get the current commit for labelling results
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--out', default=None, help='results file, defaults to results/<time>-<commit>.json')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--list-configs', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.list_configs:
+        print(json.dumps(list_configs(args.list_configs)))
+        sys.exit(0)
+    if args.worker:
+        print(json.dumps(run_config(json.loads(args.worker), os.path.abspath(args.corpus), args.warmup)))
+        sys.exit(0)
+
+    corpus_dir = os.path.abspath(args.corpus)
+    manifest = build_corpus(corpus_dir, args.seed)
+    print(f"Corpus: {len(manifest['samples'])} samples in {corpus_dir}", file=sys.stderr)
+
+    results = []
+    for engine in [name.strip() for name in args.engines.split(',') if name.strip()]:
+        configs = run_worker(['--list-configs', engine])
+        if configs is None:
+            print(f"{engine}: could not list configurations, is it installed?", file=sys.stderr)
+            continue
+        for config in configs:
+            print(f"Running {config_id(config)}", file=sys.stderr)
+            result = run_worker(['--worker', json.dumps(config), '--corpus', corpus_dir, '--warmup', str(args.warmup)])
+            if result is None:
+                print("  failed, see output above", file=sys.stderr)
+                results.append({'id': config_id(config), 'config': config, 'error': 'worker failed'})
+                continue
+            print(f"  {result['images_per_sec']} images/s, p50 {result['latency']['total']['p50_ms']} ms, "
+                  f"CER {result['cer']}, WER {result['wer']}, peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+            results.append(result)
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpu_count': os.cpu_count()},
+        'corpus': {'signature': manifest['signature'], 'samples': len(manifest['samples'])},
+        'results': results,
+    }
+    out_path = args.out or os.path.join(DEFAULT_RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {out_path}", file=sys.stderr)
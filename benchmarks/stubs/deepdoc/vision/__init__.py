@@ -0,0 +1,30 @@
+import os
+from PIL import Image
+from stub_timing import detect_lines, recognize_lines, load_model
+
+# Stand-in for ragflow's deepdoc.vision; loadtest.py --stub points
+# DEEPDOC_RAGFLOW_DIR at benchmarks/stubs so the DeepDoc workers load it
+
+
+class OCR:
+    def __init__(self):
+        load_model()
+
+    def __call__(self, image):
+        lines = detect_lines(image)
+        recognize_lines(len(lines))
+        return [(box, (text, confidence)) for box, text, confidence in lines]
+
+
+# Function to load the pages of a PDF or an image, named the way t_ocr.py names its outputs
+def init_in_out(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = os.path.basename(args.inputs)
+    if name.lower().endswith('.pdf'):
+        import pdfplumber
+        with pdfplumber.open(args.inputs) as pdf:
+            images = [page.to_image(resolution=72 * 3).annotated.convert('RGB') for page in pdf.pages]
+    else:
+        images = [Image.open(args.inputs).convert('RGB')]
+    outputs = [os.path.join(args.output_dir, f'{name}_{index}.jpg') for index in range(len(images))]
+    return images, outputs
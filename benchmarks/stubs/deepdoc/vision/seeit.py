@@ -0,0 +1,3 @@
+# Stand-in for deepdoc.vision.seeit; pages are saved without the box overlay
+def draw_box(image, boxes, labels, threshold=0.):
+    return image
@@ -0,0 +1,32 @@
+from stub_timing import detect_lines, recognize_lines
+
+# Stand-in for pytesseract with the calls engine_pool.py makes
+
+
+class Output:
+    STRING = 'string'
+    DICT = 'dict'
+
+
+def image_to_string(image, lang=None, **kwargs):
+    lines = detect_lines(image)
+    recognize_lines(len(lines))
+    return '\n'.join(text for _, text, _ in lines) + '\n'
+
+
+# One word per line, with tesseract's block/paragraph/line numbering
+def image_to_data(image, lang=None, output_type=None, **kwargs):
+    lines = detect_lines(image)
+    recognize_lines(len(lines))
+    data = {key: [] for key in ('text', 'conf', 'block_num', 'par_num', 'line_num', 'left', 'top', 'width', 'height')}
+    for index, (box, text, confidence) in enumerate(lines):
+        data['text'].append(text)
+        data['conf'].append(confidence * 100)
+        data['block_num'].append(1)
+        data['par_num'].append(1)
+        data['line_num'].append(index + 1)
+        data['left'].append(int(box[0][0]))
+        data['top'].append(int(box[0][1]))
+        data['width'].append(int(box[1][0] - box[0][0]))
+        data['height'].append(int(box[2][1] - box[0][1]))
+    return data
@@ -0,0 +1,59 @@
+import os
+import time
+
+# Shared cost model of the stand-in engines in this directory. loadtest.py
+# --stub puts the directory first on PYTHONPATH, so the services import these
+# modules instead of pytesseract, tesserocr, paddleocr, easyocr and ragflow's
+# deepdoc, and everything around the models (HTTP, decoding, preprocessing,
+# queues, batching, layout, zipping) runs for real.
+#   STUB_OCR_DETECT_MS  detection cost per image megapixel, at least one (default 30)
+#   STUB_OCR_LINE_MS    recognition cost per text line (default 3)
+#   STUB_OCR_LOAD_S     model load time (default 0.5)
+#   STUB_OCR_BUSY       1 to spin the CPU instead of sleeping; sleeping
+#                       releases the GIL the way native inference does
+DETECT_MS = float(os.environ.get('STUB_OCR_DETECT_MS', '30'))
+LINE_MS = float(os.environ.get('STUB_OCR_LINE_MS', '3'))
+LOAD_SECONDS = float(os.environ.get('STUB_OCR_LOAD_S', '0.5'))
+BUSY = os.environ.get('STUB_OCR_BUSY', '0') == '1'
+LINE_PITCH = 32
+MAX_LINES = 60
+
+# Function to spend the given time like a model call would
+def spend(ms):
+    if ms <= 0:
+        return
+    if not BUSY:
+        time.sleep(ms / 1000.0)
+        return
+    deadline = time.perf_counter() + ms / 1000.0
+    while time.perf_counter() < deadline:
+        pass
+
+def load_model():
+    time.sleep(LOAD_SECONDS)
+
+# Function to get (height, width) of a numpy array or PIL image
+def image_size(image):
+    if hasattr(image, 'shape'):
+        return image.shape[0], image.shape[1]
+    width, height = image.size
+    return height, width
+
+# Function to pay for detection and lay out one full-width line per LINE_PITCH
+# pixels; returns (box, text, confidence) tuples. Detection is charged for the
+# image downscaled to limit_side_len, as the real detectors resize it
+def detect_lines(image, limit_side_len=None):
+    height, width = image_size(image)
+    scale = min(1.0, limit_side_len / max(height, width)) if limit_side_len else 1.0
+    spend(DETECT_MS * max(1.0, height * width * scale * scale / 1e6))
+    count = max(1, min(height // LINE_PITCH, MAX_LINES))
+    pitch = height / count
+    lines = []
+    for index in range(count):
+        x0, y0 = width * 0.05, index * pitch + pitch * 0.2
+        x1, y1 = width * 0.95, index * pitch + pitch * 0.8
+        lines.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], f'stub line {index}', 0.95))
+    return lines
+
+def recognize_lines(count):
+    spend(LINE_MS * count)
@@ -0,0 +1,2 @@
+# Hides an installed tesserocr so engine_pool.py falls back to the pytesseract stub
+raise ImportError('tesserocr is replaced by the pytesseract stub during load tests')
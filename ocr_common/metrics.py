@@ -0,0 +1,298 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Per-stage latency, request and resource metrics in the Prometheus text
+# format, without a client library. Stages (decode, preprocessing steps,
+# detection, recognition, zip, ...) are timed with stage() or record_stages()
+# into one histogram labelled by stage; gauges such as queue depth and cache
+# hits are read from callbacks when /metrics is scraped. Each process keeps
+# its own registry, so with pre-forked workers a scrape sees one worker.
+#   OCR_TIMING_HEADER  1 to add a Server-Timing header with the request's
+#                      stage breakdown to every response; clients can also ask
+#                      for it per request with an 'X-Timing: 1' header
+TIMING_HEADER = os.environ.get('OCR_TIMING_HEADER', '0') == '1'
+TIMING_REQUEST_HEADER = 'X-Timing'
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage timings of the request being handled, None outside a request
+current_timings = contextvars.ContextVar('ocr_stage_timings', default=None)
+
+# Function to read this process's resident set size in bytes
+def process_rss_bytes(pid='self'):
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if pid == 'self' else None
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Histogram keyed by label values; observe() only bumps one bucket under a lock
+class Histogram:
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, constant_labels):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = constant_labels + tuple(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", format_value(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total!r}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return lines
+
+
+# Counter or gauge keyed by label values, set by the service
+class Metric:
+    def __init__(self, name, help, kind, label_names=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, amount, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, constant_labels):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            labels = constant_labels + tuple(zip(self.label_names, label_values))
+            lines.append(f'{self.name}{format_labels(labels)} {format_value(value)}')
+        return lines
+
+
+# Counter or gauge read from a callback at scrape time; the callback returns
+# a number, or a dict of label-value tuples to numbers
+class CallbackMetric:
+    def __init__(self, name, help, kind, function, label_names=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.function = function
+        self.label_names = tuple(label_names)
+
+    def render(self, constant_labels):
+        try:
+            values = self.function()
+        except Exception:
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in sorted(values.items()):
+            if value is None:
+                continue
+            labels = constant_labels + tuple(zip(self.label_names, label_values))
+            lines.append(f'{self.name}{format_labels(labels)} {format_value(value)}')
+        return lines
+
+
+# The process-wide set of metrics; every series carries the service label
+class MetricsRegistry:
+    def __init__(self):
+        self.service = 'ocr'
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.stages = self.add(Histogram('ocr_stage_duration_seconds', 'Time spent in each processing stage',
+                                         ('stage',), STAGE_BUCKETS))
+        self.requests = self.add(Histogram('ocr_request_duration_seconds', 'Time to produce a response',
+                                           ('endpoint',), REQUEST_BUCKETS))
+        self.responses = self.add(Metric('ocr_requests_total', 'Requests handled', 'counter',
+                                         ('endpoint', 'method', 'status')))
+        self.in_flight = self.add(Metric('ocr_requests_in_flight', 'Requests being handled', 'gauge'))
+        self.in_flight.add(0)
+        self.add(CallbackMetric('ocr_process_resident_memory_bytes', 'Resident set size of this process',
+                                'gauge', process_rss_bytes))
+        self.add(CallbackMetric('ocr_result_cache_lookups_total', 'Result cache lookups by outcome', 'counter',
+                                result_cache_lookups, ('result',)))
+
+    def add(self, metric):
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        constant_labels = (('service', self.service),)
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(constant_labels))
+        return '\n'.join(lines) + '\n'
+
+
+# Function to report result cache hits by tier; the cache is only touched once a service created it
+def result_cache_lookups():
+    from ocr_common import result_cache
+    if result_cache.result_cache is None:
+        return None
+    stats = result_cache.result_cache.stats()
+    return {('memory_hit',): stats['memory_hits'], ('disk_hit',): stats['disk_hits'], ('miss',): stats['misses']}
+
+
+registry = MetricsRegistry()
+
+# Function to add a gauge or counter read from a callback at scrape time,
+# e.g. a queue depth or a model cache's hit counter
+def register_callback(name, help, function, kind='gauge', label_names=()):
+    return registry.add(CallbackMetric(name, help, kind, function, label_names))
+
+# Function to record one stage duration in the histogram and, inside a
+# request, in that request's breakdown
+def record_stage(name, seconds):
+    registry.stages.observe(seconds, name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+# Function to record a dict of stage durations, such as Pipeline.run's timings
+def record_stages(timings):
+    for name, seconds in timings.items():
+        record_stage(name, seconds)
+
+# Context manager timing the enclosed block as one stage
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+# Function to pass an iterator through, timing only the work of producing
+# each item, not the time the consumer (e.g. a slow client) takes between them
+def timed_iter(name, items):
+    elapsed = 0.0
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            elapsed += time.perf_counter() - start
+        yield item
+    record_stage(name, elapsed)
+
+# Function to format a breakdown as a Server-Timing header value, in milliseconds
+def server_timing(timings):
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+
+def wants_timing_header(headers):
+    return TIMING_HEADER or headers.get(TIMING_REQUEST_HEADER, '') == '1'
+
+# Function to add /metrics and per-request metrics to a Flask app
+def instrument_flask(app, service):
+    from flask import Response, request, g
+    registry.service = service
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = current_timings.set({})
+        registry.in_flight.add(1)
+
+    @app.after_request
+    def finish_response(response):
+        g.metrics_status = response.status_code
+        timings = current_timings.get()
+        if timings and wants_timing_header(request.headers):
+            response.headers['Server-Timing'] = server_timing(timings)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error=None):
+        if 'metrics_start' not in g:
+            return
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = 500 if error is not None else g.get('metrics_status', 500)
+        registry.requests.observe(time.perf_counter() - g.pop('metrics_start'), endpoint)
+        registry.responses.add(1, endpoint, request.method, str(status))
+        registry.in_flight.add(-1)
+        current_timings.reset(g.metrics_token)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return app
+
+# Function to add /metrics and per-request metrics to a FastAPI app
+def instrument_fastapi(app, service):
+    from fastapi import Request
+    from fastapi.responses import Response
+    registry.service = service
+
+    @app.middleware('http')
+    async def request_metrics(request: Request, call_next):
+        start = time.perf_counter()
+        token = current_timings.set({})
+        registry.in_flight.add(1)
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            timings = current_timings.get()
+            if timings and wants_timing_header(request.headers):
+                response.headers['Server-Timing'] = server_timing(timings)
+            return response
+        finally:
+            route = request.scope.get('route')
+            endpoint = getattr(route, 'path', 'unmatched')
+            registry.requests.observe(time.perf_counter() - start, endpoint)
+            registry.in_flight.add(-1)
+            registry.responses.add(1, endpoint, request.method, str(status))
+            current_timings.reset(token)
+
+    @app.get('/metrics')
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,241 @@
+import io
+import os
+import time
+import cv2
+import numpy as np
+
+# Pillow reads image dimensions from the header without decoding pixels
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Composable preprocessing shared by every engine. A pipeline is a comma
+# separated list of stages applied in order, each with an optional numeric
+# parameter, e.g. "resize:2048,deskew:10,otsu,crop:8":
+#   resize:N    cap the longest side at N pixels, decoding at reduced resolution when possible
+#   upscale:N   enlarge small images (up to 3x) towards N pixels on the longest side
+#   fixed:T     inverted binary threshold at T (the original preprocessing)
+#   otsu        inverted binary threshold chosen per image
+#   adaptive:B  inverted local threshold over BxB blocks, for uneven lighting
+#   deskew:A    rotate text upright when it is skewed by at most A degrees
+#   crop:M      crop empty borders, keeping M pixels of margin
+STAGE_DEFAULTS = {'resize': 2048, 'upscale': 1000, 'fixed': 150, 'otsu': None, 'adaptive': 31, 'deskew': 10, 'crop': 8}
+# Accepted parameter range of each stage, values outside it are refused
+STAGE_LIMITS = {'resize': (32, 32768), 'upscale': (32, 16384), 'fixed': (0, 255), 'adaptive': (3, 255), 'deskew': (0, 45), 'crop': (0, 1024)}
+
+# Named pipelines selectable per request
+PRESETS = {
+    'legacy': 'fixed:150',
+    'fast': 'resize:1600,otsu',
+    'document': 'resize:3000,deskew:10,otsu,crop:8',
+    'photo': 'resize:2048,adaptive:31,crop:8',
+    'none': '',
+}
+
+# Per-engine defaults. Detectors resize internally anyway (Paddle to 960 px,
+# EasyOCR's CRAFT to 2560 px), so pixels beyond that only cost decode time;
+# Tesseract works on the full page and keeps more resolution.
+ENGINE_DEFAULTS = {
+    'tesseract': os.environ.get('OCR_PREPROCESS_TESSERACT', 'resize:4096,fixed:150'),
+    'paddleocr': os.environ.get('OCR_PREPROCESS_PADDLEOCR', 'resize:2048,fixed:150'),
+    # Pages detected tile by tile keep their resolution, the cap only bounds memory
+    'paddleocr_tiled': os.environ.get('OCR_PREPROCESS_PADDLEOCR_TILED', 'resize:16384,fixed:150'),
+    'easyocr': os.environ.get('OCR_PREPROCESS_EASYOCR', 'resize:2560,fixed:150'),
+    'cascade': os.environ.get('OCR_PREPROCESS_CASCADE', 'resize:4096,fixed:150'),
+}
+
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+# Function to read the image dimensions from the encoded header, None when unknown
+def encoded_size(image_data):
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+# Function to decode bytes into a grayscale array, letting the decoder skip
+# resolution the pipeline would throw away (JPEG decodes natively at 1/2, 1/4, 1/8)
+def decode_image(image_data, max_side=None):
+    buffer = np.frombuffer(image_data, dtype=np.uint8)
+    flag = cv2.IMREAD_GRAYSCALE
+    size = encoded_size(image_data) if max_side else None
+    if size:
+        for factor, reduced_flag in REDUCED_FLAGS:
+            if max(size) / factor >= max_side:
+                flag = reduced_flag
+                break
+    return cv2.imdecode(buffer, flag)
+
+# Function to downscale so the longest side is at most max_side
+def resize(image, max_side):
+    h, w = image.shape[:2]
+    if max(h, w) <= max_side:
+        return image
+    scale = max_side / float(max(h, w))
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+# Function to enlarge low-resolution images so small text reaches a readable size
+def upscale(image, min_side, max_factor=3.0):
+    h, w = image.shape[:2]
+    if max(h, w) >= min_side:
+        return image
+    scale = min(min_side / float(max(h, w)), max_factor)
+    return cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+
+def binarize_fixed(image, threshold):
+    _, binary_image = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY_INV)
+    return binary_image
+
+def binarize_otsu(image, _=None):
+    _, binary_image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return binary_image
+
+def binarize_adaptive(image, block_size):
+    block_size = max(3, int(block_size) | 1)  # must be odd
+    return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block_size, 15)
+
+# Function to separate text from background; works before and after the
+# inverted binarisation since the background is whichever side dominates
+def foreground_mask(image):
+    threshold, _ = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    light_background = np.count_nonzero(image > threshold) > image.size // 2
+    mask = image <= threshold if light_background else image > threshold
+    return mask, (255 if light_background else 0)
+
+# Function to rotate text upright using the minimum-area rectangle around all text pixels
+def deskew(image, max_angle, max_points=50000):
+    mask, background = foreground_mask(image)
+    ys, xs = np.nonzero(mask)
+    if len(xs) < 50:
+        return image
+    if len(xs) > max_points:
+        keep = np.linspace(0, len(xs) - 1, max_points).astype(np.int64)
+        xs, ys = xs[keep], ys[keep]
+    angle = cv2.minAreaRect(np.column_stack((xs, ys)).astype(np.float32))[-1]
+    # OpenCV versions disagree on the angle range, fold it into [-45, 45]
+    while angle > 45:
+        angle -= 90
+    while angle < -45:
+        angle += 90
+    if abs(angle) < 0.1 or abs(angle) > max_angle:
+        return image
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (w, h), flags=cv2.INTER_LINEAR, borderValue=background)
+
+# Function to crop empty borders; isolated specks are ignored so scanner noise does not defeat it
+def crop_borders(image, margin):
+    mask, _ = foreground_mask(image)
+    mask = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0 or len(cols) == 0:
+        return image
+    margin = int(margin)
+    h, w = image.shape[:2]
+    return image[max(rows[0] - margin, 0):min(rows[-1] + margin + 1, h),
+                 max(cols[0] - margin, 0):min(cols[-1] + margin + 1, w)]
+
+STAGE_FUNCTIONS = {
+    'resize': lambda image, value: resize(image, int(value)),
+    'upscale': lambda image, value: upscale(image, int(value)),
+    'fixed': binarize_fixed,
+    'otsu': binarize_otsu,
+    'adaptive': binarize_adaptive,
+    'deskew': deskew,
+    'crop': crop_borders,
+}
+
+# Function to parse a stage list into (name, value) pairs
+def parse_spec(spec):
+    stages = []
+    for item in [item.strip() for item in spec.split(',') if item.strip()]:
+        name, _, value = item.partition(':')
+        name = name.strip().lower()
+        if name not in STAGE_FUNCTIONS:
+            raise ValueError(f"Unknown preprocessing stage '{name}', choose from {sorted(STAGE_FUNCTIONS)}")
+        if value.strip():
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"Invalid value for preprocessing stage '{name}': {value}")
+            if name not in STAGE_LIMITS:
+                raise ValueError(f"Preprocessing stage '{name}' takes no value")
+            low, high = STAGE_LIMITS[name]
+            if not low <= value <= high:
+                raise ValueError(f"Value for preprocessing stage '{name}' must be between {low} and {high}: {format_value(value)}")
+        else:
+            value = STAGE_DEFAULTS[name]
+        stages.append((name, value))
+    return stages
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+# A parsed pipeline; spec is canonical so it can go into result cache keys.
+# Raises ValueError for unknown stages and out-of-range values.
+class Pipeline:
+    def __init__(self, spec):
+        self.stages = parse_spec(spec)
+        self.spec = ','.join(name if value is None else f'{name}:{format_value(value)}' for name, value in self.stages)
+        resize_values = [value for name, value in self.stages if name == 'resize']
+        # Reduced decoding only applies when the first stage is the resize
+        self.max_side = int(resize_values[0]) if self.stages and self.stages[0][0] == 'resize' else None
+
+    def apply(self, image, timings=None):
+        for name, value in self.stages:
+            start = time.perf_counter()
+            image = STAGE_FUNCTIONS[name](image, value)
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        return image
+
+    # Function to predict the longest side after the resize and upscale stages
+    def output_side(self, longest):
+        for name, value in self.stages:
+            if name == 'resize':
+                longest = min(longest, int(value))
+            elif name == 'upscale' and longest < value:
+                longest = int(longest * min(value / float(longest), 3.0))
+        return longest
+
+    # Function to decode and preprocess encoded image bytes, raising ValueError when undecodable
+    def run(self, image_data, timings=None):
+        start = time.perf_counter()
+        image = decode_image(image_data, self.max_side)
+        if timings is not None:
+            timings['decode'] = timings.get('decode', 0.0) + time.perf_counter() - start
+        if image is None:
+            raise ValueError('Could not decode image file')
+        return self.apply(image, timings)
+
+
+# Parsed presets and engine defaults; stage lists sent by clients are cheap
+# to parse and parsed per request, so the cache stays bounded
+pipelines = {}
+
+# Function to resolve a request's preprocess setting: empty or 'default' means
+# the engine default, otherwise a preset name or an explicit stage list
+def get_pipeline(engine, requested=None):
+    if isinstance(requested, Pipeline):
+        return requested
+    requested = (requested or '').strip()
+    if not requested or requested == 'default':
+        spec = ENGINE_DEFAULTS[engine]
+    else:
+        spec = PRESETS.get(requested, requested)
+    if spec not in PRESETS.values() and spec not in ENGINE_DEFAULTS.values():
+        return Pipeline(spec)
+    pipeline = pipelines.get(spec)
+    if pipeline is None:
+        pipeline = pipelines[spec] = Pipeline(spec)
+    return pipeline
+
+# Function to describe the available presets and defaults, for the API listings
+def list_pipelines(engine):
+    return {'default': ENGINE_DEFAULTS[engine], 'presets': dict(PRESETS), 'stages': sorted(STAGE_FUNCTIONS)}
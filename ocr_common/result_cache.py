@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Content-addressed OCR result cache shared by every engine. Keys are built
+# from a hash of the input bytes plus everything that changes the output
+# (engine, models, languages, preprocessing). Results live in a small
+# in-memory LRU in front of an SQLite file with size-based eviction and TTL.
+CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', '1') == '1'
+CACHE_DIR = os.environ.get('OCR_CACHE_DIR', os.path.expanduser('~/.cache/ocr_results'))
+CACHE_TTL_SECONDS = int(os.environ.get('OCR_CACHE_TTL', str(7 * 24 * 3600)))
+CACHE_MEMORY_MB = int(os.environ.get('OCR_CACHE_MEMORY_MB', '64'))
+CACHE_DISK_MB = int(os.environ.get('OCR_CACHE_DISK_MB', '1024'))
+
+# Function to hash input bytes
+def digest_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+# Function to hash a file in chunks, for uploads already saved to disk
+def digest_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to build a cache key from the input digest and the settings that affect the result
+def make_key(engine, content_digest, **params):
+    settings = json.dumps(params, sort_keys=True, default=str)
+    return f"{engine}:{content_digest}:{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]}"
+
+# Function to serialise a value; bytes are stored as-is, everything else as JSON
+def encode_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return 'bytes', bytes(value)
+    return 'json', json.dumps(value).encode('utf-8')
+
+def decode_value(kind, blob):
+    if kind == 'bytes':
+        return bytes(blob)
+    return json.loads(bytes(blob).decode('utf-8'))
+
+
+class ResultCache:
+    def __init__(self, path=None, memory_mb=CACHE_MEMORY_MB, disk_mb=CACHE_DISK_MB, ttl_seconds=CACHE_TTL_SECONDS):
+        self.path = path or os.path.join(CACHE_DIR, 'results.sqlite3')
+        self.memory_limit = memory_mb * 1024 * 1024
+        self.disk_limit = disk_mb * 1024 * 1024
+        self.ttl = ttl_seconds
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    # SQLite connections must not cross a fork, each process opens its own
+    def _db(self):
+        if self.connection is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, kind TEXT NOT NULL, value BLOB NOT NULL, '
+                'size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            self.pid = os.getpid()
+        return self.connection
+
+    def _remember(self, key, kind, blob, created):
+        if len(blob) > self.memory_limit:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key)[1])
+        self.memory[key] = (kind, blob, created)
+        self.memory_bytes += len(blob)
+        while self.memory_bytes > self.memory_limit:
+            _, (_, old_blob, _) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(old_blob)
+
+    def get(self, key):
+        if not CACHE_ENABLED:
+            return None
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[2] <= self.ttl:
+                self.memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return decode_value(entry[0], entry[1])
+            try:
+                db = self._db()
+                row = db.execute('SELECT kind, value, created FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[2] <= self.ttl:
+                    db.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+                    db.commit()
+                    self._remember(key, row[0], bytes(row[1]), row[2])
+                    self.counters['disk_hits'] += 1
+                    return decode_value(row[0], row[1])
+            except sqlite3.Error as e:
+                print(f"Result cache read failed: {e}")
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        if not CACHE_ENABLED:
+            return
+        kind, blob = encode_value(value)
+        now = time.time()
+        with self.lock:
+            self._remember(key, kind, blob, now)
+            try:
+                db = self._db()
+                db.execute(
+                    'INSERT OR REPLACE INTO results (key, kind, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, kind, blob, len(blob), now, now))
+                self._evict(db, now)
+                db.commit()
+                self.counters['writes'] += 1
+            except sqlite3.Error as e:
+                print(f"Result cache write failed: {e}")
+
+    # Drop expired rows, then least recently used rows until under the size limit
+    def _evict(self, db, now):
+        removed = db.execute('DELETE FROM results WHERE created < ?', (now - self.ttl,)).rowcount
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        while total > self.disk_limit:
+            row = db.execute('SELECT key, size FROM results ORDER BY accessed LIMIT 1').fetchone()
+            if row is None:
+                break
+            db.execute('DELETE FROM results WHERE key = ?', (row[0],))
+            total -= row[1]
+            removed += 1
+        self.counters['evictions'] += max(removed, 0)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self.memory)
+            stats['memory_bytes'] = self.memory_bytes
+            lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+            stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+            try:
+                row = self._db().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+                stats['disk_entries'], stats['disk_bytes'] = row
+            except sqlite3.Error:
+                pass
+            return stats
+
+
+result_cache = None
+
+# Function to get the process-wide cache, created on first use
+def get_result_cache():
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache()
+    return result_cache
@@ -0,0 +1,81 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'PaddleOCR'))
+from batching import RecognitionBatcher
+
+# Stand-in for the recogniser: reads the number a crop is filled with
+class Recognizer:
+    def __init__(self):
+        self.rec_batch_num = 6
+        self.calls = []
+
+    def __call__(self, crops):
+        self.calls.append((len(crops), self.rec_batch_num))
+        return [(f'crop{int(crop[0, 0])}', 0.9) for crop in crops], 0.0
+
+# Stand-in for the angle classifier: turns the number it reads negative
+class Classifier:
+    def __call__(self, crops):
+        return [-crop for crop in crops], [('180', 1.0)] * len(crops), 0.0
+
+class Pipeline:
+    def __init__(self):
+        self.use_angle_cls = True
+        self.text_recognizer = Recognizer()
+        self.text_classifier = Classifier()
+
+def crops(*numbers):
+    return [np.full((2, 2), number, dtype=np.int64) for number in numbers]
+
+@pytest.fixture
+def batcher():
+    batcher = RecognitionBatcher(Pipeline(), max_batch_size=32, max_wait_ms=200)
+    yield batcher
+    batcher.close()
+
+def test_results_are_routed_back_to_each_request(batcher):
+    futures = [batcher.submit(crops(*range(start, start + count)), use_cls=False)
+               for start, count in ((1, 3), (10, 1), (20, 4))]
+    assert [future.result(5) for future in futures] == [
+        [('crop1', 0.9), ('crop2', 0.9), ('crop3', 0.9)],
+        [('crop10', 0.9)],
+        [('crop20', 0.9), ('crop21', 0.9), ('crop22', 0.9), ('crop23', 0.9)],
+    ]
+    # The three requests shared one recognition pass
+    assert batcher.pipeline.text_recognizer.calls == [(8, 6)]
+
+def test_only_requested_crops_are_classified(batcher):
+    futures = [batcher.submit(crops(1, 2), use_cls=True),
+               batcher.submit(crops(3, 4), use_cls=False),
+               batcher.submit(crops(5, 6, 7), use_cls=[False, True, False])]
+    texts = [[text for text, _ in future.result(5)] for future in futures]
+    assert texts == [['crop-1', 'crop-2'], ['crop3', 'crop4'], ['crop5', 'crop-6', 'crop7']]
+
+def test_smallest_requested_batch_size_applies_and_is_restored(batcher):
+    futures = [batcher.submit(crops(1), use_cls=False, rec_batch=16),
+               batcher.submit(crops(2), use_cls=False, rec_batch=4),
+               batcher.submit(crops(3), use_cls=False)]
+    for future in futures:
+        future.result(5)
+    recognizer = batcher.pipeline.text_recognizer
+    assert recognizer.calls == [(3, 4)]
+    assert recognizer.rec_batch_num == 6
+
+def test_a_failed_batch_fails_every_request_in_it(batcher):
+    def fail(crops):
+        raise RuntimeError('recogniser failed')
+    batcher.pipeline.text_recognizer = fail
+    futures = [batcher.submit(crops(1), use_cls=False), batcher.submit(crops(2), use_cls=False)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match='recogniser failed'):
+            future.result(5)
+
+def test_full_batches_are_flushed_without_waiting(batcher):
+    batcher.max_batch_size = 4
+    batcher.max_wait = 60
+    futures = [batcher.submit(crops(number, number), use_cls=False) for number in range(4)]
+    assert [len(future.result(5)) for future in futures] == [2, 2, 2, 2]
+    assert batcher.pipeline.text_recognizer.calls == [(4, 6), (4, 6)]
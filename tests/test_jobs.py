@@ -0,0 +1,93 @@
+import os
+import sys
+import subprocess
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DeepDoc'))
+from jobs import JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(root=str(tmp_path / 'jobs'), ttl_seconds=60)
+
+def upload(store, tmp_path, name='a.pdf'):
+    path = tmp_path / name
+    path.write_bytes(b'%PDF-1.4')
+    return store.create(name, str(path), cache_key='key', page_range='1-2')
+
+def owner(store, job_id):
+    return store._db().execute('SELECT owner FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+def test_new_job_is_queued_with_its_upload(store, tmp_path):
+    job = upload(store, tmp_path)
+    assert job['status'] == 'queued'
+    assert (job['filename'], job['cache_key'], job['page_range']) == ('a.pdf', 'key', '1-2')
+    assert os.path.exists(store.input_path(job['id']))
+    assert not (tmp_path / 'a.pdf').exists()
+    assert 'owner' not in job
+
+def test_cached_result_finishes_the_job_at_once(store):
+    job = store.create('a.pdf', None, result=b'PK')
+    assert job['status'] == 'done'
+    assert job['expires'] == job['finished'] + 60
+    with open(store.result_path(job['id']), 'rb') as f:
+        assert f.read() == b'PK'
+    assert store.claim_next() is None
+
+def test_jobs_are_claimed_oldest_first_by_this_process(store, tmp_path):
+    first = upload(store, tmp_path, 'a.pdf')
+    second = upload(store, tmp_path, 'b.pdf')
+    claimed = store.claim_next()
+    assert (claimed['id'], claimed['status']) == (first['id'], 'running')
+    assert claimed['started'] is not None
+    assert owner(store, first['id']) == os.getpid()
+    assert store.claim_next()['id'] == second['id']
+    assert store.claim_next() is None
+
+def test_running_job_finishes(store, tmp_path):
+    job = upload(store, tmp_path)
+    store.claim_next()
+    store.finish(job['id'], 'failed', 'broken page')
+    job = store.get(job['id'])
+    assert (job['status'], job['error']) == ('failed', 'broken page')
+    assert job['finished'] is not None
+
+def test_cancelled_job_stays_cancelled(store, tmp_path):
+    queued = upload(store, tmp_path, 'a.pdf')
+    running = upload(store, tmp_path, 'b.pdf')
+    assert store.cancel(queued['id'])['status'] == 'cancelled'
+    assert store.claim_next()['id'] == running['id']
+    store.cancel(running['id'])
+    store.finish(running['id'], 'done')
+    assert store.get(running['id'])['status'] == 'cancelled'
+    # Finished jobs cannot be cancelled again
+    store.cancel(running['id'])
+    assert store.cancel('unknown') is None
+    assert store.counts() == {'cancelled': 2}
+
+def test_only_orphaned_running_jobs_are_requeued(store, tmp_path):
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    jobs = [upload(store, tmp_path, f'{i}.pdf') for i in range(4)]
+    for job in jobs:
+        store.claim_next()
+    owners = [None, os.getpid(), dead.pid, os.getppid()]
+    for job, pid in zip(jobs, owners):
+        store.update(job['id'], owner=pid, pages_done=1)
+    assert store.requeue_running() == 3
+    assert [store.get(job['id'])['status'] for job in jobs] == ['queued', 'queued', 'queued', 'running']
+    requeued = store.get(jobs[2]['id'])
+    assert (requeued['pages_done'], requeued['started']) == (0, None)
+    assert owner(store, jobs[3]['id']) == os.getppid()
+
+def test_finished_jobs_expire_with_their_files(store, tmp_path):
+    finished = upload(store, tmp_path, 'a.pdf')
+    queued = upload(store, tmp_path, 'b.pdf')
+    store.claim_next()
+    store.finish(finished['id'], 'done')
+    done_at = store.get(finished['id'])['finished']
+    assert store.expire(now=done_at + 30) == 0
+    assert store.expire(now=done_at + 61) == 1
+    assert store.get(finished['id']) is None
+    assert not os.path.exists(store.job_dir(finished['id']))
+    assert store.get(queued['id'])['status'] == 'queued'
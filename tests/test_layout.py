@@ -0,0 +1,67 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common.layout import analyze, paragraphs, box_rects
+
+# Function to build one text line of word rectangles, 10 px high
+def words(x0, y, count, width=40, gap=4):
+    return [(x0 + i * (width + gap), y, x0 + i * (width + gap) + width, y + 10) for i in range(count)]
+
+def test_empty_page():
+    layout = analyze([])
+    assert layout['columns'] == 0
+    assert len(layout['order']) == 0
+    assert paragraphs([], []) == []
+
+def test_words_of_a_line_read_left_to_right():
+    boxes = words(0, 0, 4)
+    shuffled = [boxes[2], boxes[0], boxes[3], boxes[1]]
+    layout = analyze(shuffled)
+    assert layout['order'].tolist() == [1, 3, 0, 2]
+    assert len(set(layout['line'].tolist())) == 1
+
+def test_points_and_rectangles_agree():
+    rects = words(0, 0, 3) + words(0, 14, 3)
+    quads = [[(x0, y0), (x1, y0), (x1, y1), (x0, y1)] for x0, y0, x1, y1 in rects]
+    assert np.array_equal(box_rects(quads), np.asarray(rects, dtype=np.float64))
+    assert analyze(quads)['order'].tolist() == analyze(rects)['order'].tolist()
+
+def test_columns_are_read_one_after_the_other():
+    left = [box for row in range(5) for box in words(0, row * 14, 3)]
+    right = [box for row in range(5) for box in words(300, row * 14, 3)]
+    texts = [f'L{i}' for i in range(len(left))] + [f'R{i}' for i in range(len(right))]
+    layout = analyze(left + right)
+    assert layout['columns'] == 2
+    order = layout['order'].tolist()
+    assert order == list(range(len(left + right)))
+    assert paragraphs(left + right, texts) == [' '.join(texts[:15]), ' '.join(texts[15:])]
+
+def test_spanning_title_is_read_before_the_columns():
+    # A gutter may be crossed by a few lines, so the columns need enough rows
+    title = words(0, 0, 9)
+    left = [box for row in range(10) for box in words(0, 30 + row * 14, 3)]
+    right = [box for row in range(10) for box in words(300, 30 + row * 14, 3)]
+    boxes = right + left + title
+    layout = analyze(boxes)
+    assert layout['columns'] == 2
+    order = layout['order'].tolist()
+    first_title = len(right) + len(left)
+    assert order[:len(title)] == list(range(first_title, first_title + len(title)))
+    assert order[len(title):len(title) + len(left)] == list(range(len(right), len(right) + len(left)))
+
+def test_columns_can_be_turned_off():
+    left = [box for row in range(5) for box in words(0, row * 14, 3)]
+    right = [box for row in range(5) for box in words(300, row * 14, 3)]
+    layout = analyze(left + right, columns=False)
+    assert layout['columns'] == 1
+    # Without columns each row is one line across the page
+    assert layout['order'].tolist()[:6] == [0, 1, 2, 15, 16, 17]
+
+def test_paragraphs_split_on_gaps_and_indents():
+    boxes = words(0, 0, 3) + words(0, 14, 3) + words(0, 60, 3) + words(40, 74, 3)
+    texts = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l']
+    layout = analyze(boxes)
+    assert layout['paragraph'].tolist() == [0] * 6 + [1] * 3 + [2] * 3
+    assert paragraphs(boxes, texts, line_separator='\n') == ['a b c\nd e f', 'g h i', 'j k l']
@@ -0,0 +1,105 @@
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'PaddleOCR'))
+pytest.importorskip('paddleocr')
+import model_cache
+from model_cache import ModelCache
+
+MB = 1024 * 1024
+
+# Loads are replaced by a stand-in pipeline; each one grows the measured RSS
+# by the size given for its detector, in MB, and each extra tile detector by
+# sizes['tile'] MB
+@pytest.fixture
+def loads(monkeypatch):
+    sizes = {'tile': 0}
+    rss = [100 * MB]
+    loaded = []
+
+    class Detector:
+        def __init__(self, args):
+            rss[0] += sizes['tile'] * MB
+
+    def create_ocr(det, rec, cls, backend='paddle', **kwargs):
+        rss[0] += sizes.get(det, 10) * MB
+        loaded.append(det)
+        pipeline = SimpleNamespace(args=SimpleNamespace())
+        pipeline.text_detector = object.__new__(Detector)
+        return pipeline
+
+    monkeypatch.setattr(model_cache, 'resolve_models', lambda det=None, rec=None, cls=None, backend=None: (det, rec, cls, backend or 'paddle'))
+    monkeypatch.setattr(model_cache, 'create_ocr', create_ocr)
+    monkeypatch.setattr(model_cache, 'current_rss_bytes', lambda: rss[0])
+    return sizes, loaded
+
+def test_hits_reuse_the_loaded_pipeline(loads):
+    _, loaded = loads
+    cache = ModelCache(rss_budget_mb=1000, max_entries=4)
+    first = cache.get('a')
+    assert cache.get('a') is first
+    assert loaded == ['a']
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert first.size_bytes == 10 * MB
+
+def test_least_recently_used_entry_is_evicted_past_max_entries(loads):
+    cache = ModelCache(rss_budget_mb=1000, max_entries=2)
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')
+    cache.get('c')
+    assert [key[0] for key in cache.keys()] == ['a', 'c']
+
+def test_entries_are_evicted_to_stay_within_the_rss_budget(loads):
+    sizes, _ = loads
+    sizes.update(a=300, b=300, c=500)
+    cache = ModelCache(rss_budget_mb=1000, max_entries=10)
+    cache.get('a')
+    cache.get('b')
+    assert [key[0] for key in cache.keys()] == ['a', 'b']
+    cache.get('c')
+    assert [key[0] for key in cache.keys()] == ['b', 'c']
+
+def test_the_newest_entry_is_kept_even_over_budget(loads):
+    sizes, _ = loads
+    sizes.update(a=100, huge=5000)
+    cache = ModelCache(rss_budget_mb=1000, max_entries=10)
+    cache.get('a')
+    entry = cache.get('huge')
+    assert [key[0] for key in cache.keys()] == ['huge']
+    assert cache.get('huge') is entry
+
+def test_evicted_pipelines_are_loaded_again(loads):
+    _, loaded = loads
+    cache = ModelCache(rss_budget_mb=1000, max_entries=1)
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')
+    assert loaded == ['a', 'b', 'a']
+    assert cache.misses == 3
+
+def test_tile_detectors_are_charged_to_their_entry(loads):
+    sizes, _ = loads
+    sizes.update(a=100, tile=50)
+    cache = ModelCache(rss_budget_mb=1000, max_entries=10)
+    entry = cache.get('a')
+    workers = entry.batcher.tiler.workers
+    assert entry.size_bytes == (100 + 50 * workers) * MB
+    assert entry.batcher.tiler.detectors.qsize() == workers
+
+def test_entries_in_use_are_closed_when_released(loads):
+    cache = ModelCache(rss_budget_mb=1000, max_entries=1)
+    closed = []
+    with cache.use('a') as entry:
+        entry.close = lambda: closed.append('a')
+        cache.get('b')
+        assert [key[0] for key in cache.keys()] == ['b']
+        assert entry.retired and closed == []
+    assert closed == ['a']
+    # An entry nobody uses is closed as soon as it is evicted
+    idle = cache.get('b')
+    idle.close = lambda: closed.append('b')
+    cache.get('c')
+    assert closed == ['a', 'b']
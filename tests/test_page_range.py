@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DeepDoc'))
+from streaming import parse_page_range, select_pages
+
+@pytest.mark.parametrize('spec', [None, '', '   '])
+def test_empty_selection_means_every_page(spec):
+    assert parse_page_range(spec) is None
+    assert select_pages(parse_page_range(spec), 3) == [0, 1, 2]
+
+def test_ranges_become_sorted_zero_based_indices():
+    assert parse_page_range('1-3,7') == [0, 1, 2, 6]
+    assert parse_page_range(' 7 , 2-3 ') == [1, 2, 6]
+    assert parse_page_range('2,2,1-2') == [0, 1]
+    assert parse_page_range(4) == [3]
+
+@pytest.mark.parametrize('spec', ['0', '3-1', 'a', '1-', '-2', '1,,2', '1-2-3', '1.5'])
+def test_invalid_ranges_are_refused(spec):
+    with pytest.raises(ValueError):
+        parse_page_range(spec)
+
+def test_selection_must_fit_the_document():
+    assert select_pages(parse_page_range('1,3'), 3) == [0, 2]
+    with pytest.raises(ValueError, match='Page 4 is out of range'):
+        select_pages(parse_page_range('2-4'), 3)
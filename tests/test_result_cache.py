@@ -0,0 +1,83 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ocr_common import result_cache
+from ocr_common.result_cache import ResultCache, make_key
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'CACHE_ENABLED', True)
+    return ResultCache(path=str(tmp_path / 'results.sqlite3'))
+
+def test_keys_depend_on_every_setting():
+    assert make_key('tesseract', 'abc', langs=['eng'], preprocess='otsu') == make_key('tesseract', 'abc', preprocess='otsu', langs=['eng'])
+    assert make_key('tesseract', 'abc', langs=['eng']) != make_key('tesseract', 'abc', langs=['deu'])
+    assert make_key('tesseract', 'abc') != make_key('easyocr', 'abc')
+
+def test_values_round_trip_through_memory_and_disk(cache, tmp_path):
+    cache.put('text', 'hello')
+    cache.put('zip', b'PK\x03\x04')
+    assert cache.get('text') == 'hello'
+    fresh = ResultCache(path=cache.path)
+    assert fresh.get('zip') == b'PK\x03\x04'
+    assert fresh.get('text') == 'hello'
+    assert fresh.get('missing') is None
+    stats = fresh.stats()
+    assert (stats['disk_hits'], stats['misses']) == (2, 1)
+
+def test_memory_keeps_the_most_recently_used_entries(cache):
+    cache.memory_limit = 25
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key * 8)  # 10 bytes of JSON each
+    assert list(cache.memory) == ['b', 'c']
+    cache.get('b')
+    cache.put('d', 'd' * 8)
+    assert list(cache.memory) == ['b', 'd']
+    assert cache.memory_bytes == 20
+    # Evicted from memory, still on disk
+    assert cache.get('a') == 'a' * 8
+    assert cache.stats()['disk_hits'] == 1
+
+def test_values_larger_than_memory_stay_on_disk_only(cache):
+    cache.memory_limit = 4
+    cache.put('big', 'x' * 100)
+    assert 'big' not in cache.memory
+    assert cache.get('big') == 'x' * 100
+
+def test_disk_drops_least_recently_accessed_rows(cache, monkeypatch):
+    cache.disk_limit = 250
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(result_cache.time, 'time', lambda: next(clock))
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key * 98)  # 100 bytes each
+    cache.memory.clear()
+    assert cache.get('a') is None
+    assert cache.get('b') == 'b' * 98
+    cache.put('d', 'd' * 98)
+    cache.memory.clear()
+    # 'c' was accessed less recently than 'b'
+    assert cache.get('c') is None
+    assert cache.get('b') == 'b' * 98
+    assert cache.stats()['disk_entries'] == 2
+    assert cache.counters['evictions'] == 2
+
+def test_entries_expire_after_the_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    cache.ttl = 60
+    cache.put('old', 'value')
+    now[0] += 30
+    assert cache.get('old') == 'value'
+    now[0] += 31
+    assert cache.get('old') is None
+    # The expired row is removed by the next write
+    cache.put('new', 'value')
+    assert cache.stats()['disk_entries'] == 1
+
+def test_disabled_cache_stores_nothing(cache, monkeypatch):
+    monkeypatch.setattr(result_cache, 'CACHE_ENABLED', False)
+    cache.put('key', 'value')
+    assert cache.get('key') is None
+    assert len(cache.memory) == 0
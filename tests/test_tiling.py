@@ -0,0 +1,47 @@
+import os
+import sys
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'PaddleOCR'))
+from tiling import TiledDetector, tiles_needed
+
+# Stand-in for the ONNX detector: one shared session, and the input limit it
+# was called with recorded per call
+class Detector:
+    def __init__(self):
+        self.session = object()
+        self.limit_side_len = 960
+        self.seen = []
+        self.lock = threading.Lock()
+
+    def __call__(self, image):
+        with self.lock:
+            self.seen.append(self.limit_side_len)
+        return [], 0.0
+
+class Pipeline:
+    def __init__(self):
+        self.text_detector = Detector()
+
+def test_auto_mode_tiles_pages_the_detector_would_shrink():
+    assert tiles_needed(3000, 'auto', min_side=2000)
+    assert not tiles_needed(1800, 'auto', min_side=2000)
+    assert not tiles_needed(3000, 'auto', det_limit=3200, min_side=2000)
+    assert tiles_needed(1000, 'on', tile_size=960)
+    assert not tiles_needed(3000, 'off')
+
+def test_onnx_tiles_keep_their_own_limit():
+    pipeline = Pipeline()
+    tiler = TiledDetector(pipeline, tile_size=960, overlap=96, workers=2, min_side=2000)
+    tiler.preload()
+    detectors = [tiler.detectors.get() for _ in range(2)]
+    assert all(detector is not pipeline.text_detector for detector in detectors)
+    assert all(detector.session is pipeline.text_detector.session for detector in detectors)
+    for detector in detectors:
+        tiler.detectors.put(detector)
+    # A request with a det_limit changes the pipeline's own detector meanwhile
+    pipeline.text_detector.limit_side_len = 640
+    tiler.detect(np.zeros((2500, 2500, 3), dtype=np.uint8))
+    tiler.close()
+    assert set(pipeline.text_detector.seen) == {960}